@@ -1,9 +1,19 @@
 import os
 import sys
+import time
+import asyncio
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from dotenv import load_dotenv
 from abc import ABC, abstractmethod
 from models.llm_model import get_llm
+from models.agent_profiles import get_agent_profile
+from models.prompt_registry import get_prompt, aget_prompt
+from models.admission import admit, aadmit
+from models.llm_metrics import LLMMetricsHandler
+from langchain_core.runnables.config import ensure_config, merge_configs
+from utils.token_count import count_tokens
+from utils.run_control import track_llm_call
+from models.resilience import call_llm, acall_llm, current_deadline
 
 # Charger les variables d'environnement depuis le fichier .env
 load_dotenv()
@@ -13,7 +23,22 @@ class BaseAgent(ABC):
     """
     Abstract base class for agents using an LLM model.
     Provides initialization and invocation logic for subclasses.
+    Subclasses set profile to pick their model settings (see agent_profiles.json),
+    cache_responses to opt in to the shared LLM response cache, and
+    priority / estimated_output_tokens for admission control (see models/admission.py),
+    and stream_part to tag their streamed tokens with a distinct part.
+    Calls go through models/resilience.py (retries, deadline, hedging, circuit breaker).
     """
+    # Profil de modèle (agent_profiles.json) : modèle, température, max_tokens, timeout, streaming
+    profile = "default"
+    cache_responses = False
+    # Voie d'admission : 'high' pour les appels courts (routeur, réponses), 'normal' sinon
+    priority = "normal"
+    # Estimation des tokens de complétion, facturée au seau de tokens avant l'appel
+    estimated_output_tokens = 1000
+    # Partie des événements 'token' diffusés pour cet agent (ex. 'patch'), None = sortie ordinaire du nœud
+    stream_part = None
+
     def __init__(self, name: str, description: str):
         """
         Initialize the agent with a name, description, and LLM model.
@@ -23,13 +48,19 @@ class BaseAgent(ABC):
         """
         self.name = name
         self.description = description
+        self.model_profile = get_agent_profile(self.profile)
+        self.model_name = self.model_profile["model"]
         self.llm = get_llm(
-            model_name="gpt-3.5-turbo",
-            temperature=1.0,
+            model_name=self.model_name,
+            temperature=self.model_profile["temperature"],
             api_key=api_key,
-            max_tokens=4024,
-            timeout=60
+            max_tokens=self.model_profile["max_tokens"],
+            timeout=self.model_profile["timeout"],
+            cache_responses=self.cache_responses,
+            streaming=self.model_profile["streaming"]
         )
+        # Temps passé à charger les prompts vs. temps passé dans le LLM (secondes)
+        self.timings = {"prompt_load": 0.0, "llm": 0.0, "admission_wait": 0.0}
 
     @abstractmethod
     def run(self, input: str) -> str:
@@ -42,12 +73,131 @@ class BaseAgent(ABC):
         """
         pass
 
-    def invoke(self, input: str) -> str:
+    def invoke(self, input: str, llm=None) -> str:
         """
         Invoke the LLM model with the given input and return its response.
+        Transient errors are retried within the request deadline (see models/resilience.py).
         Args:
             input (str): The input to send to the LLM.
+            llm: Runnable built on self.llm to call instead (e.g. structured output).
         Returns:
             str: The LLM's response.
         """
-        return self.llm.invoke(input)
+        prompt_tokens = self._prompt_tokens(input)
+        deadline = current_deadline()
+
+        def attempt(callbacks):
+            start = time.perf_counter()
+            with admit(self.model_name, self.priority, prompt_tokens + self.estimated_output_tokens, deadline) as ticket:
+                admitted = time.perf_counter()
+                self.timings["admission_wait"] += admitted - start
+                handler = self._metrics_handler(prompt_tokens)
+                try:
+                    with track_llm_call(handler, self.estimated_output_tokens):
+                        response = (llm or self.llm).invoke(input, self._call_config(handler, *callbacks))
+                finally:
+                    self.timings["llm"] += time.perf_counter() - admitted
+                self._settle(ticket, prompt_tokens, response)
+                return response
+
+        return call_llm(type(self).__name__, self.model_name, attempt)
+
+    def _prompt_tokens(self, input) -> int:
+        text = input.to_string() if hasattr(input, "to_string") else str(input)
+        return count_tokens(text, self.model_name)
+
+    def _metrics_handler(self, prompt_tokens: int) -> LLMMetricsHandler:
+        return LLMMetricsHandler(type(self).__name__, self.model_name, prompt_tokens)
+
+    def _call_config(self, *handlers) -> dict:
+        # Les handlers s'ajoutent aux callbacks hérités du nœud (streaming 'messages', traces)
+        config = {"callbacks": list(handlers)}
+        if self.stream_part is not None:
+            # Lu par l'encodeur SSE dans les métadonnées du flux 'messages'
+            config["metadata"] = {"stream_part": self.stream_part}
+        return merge_configs(ensure_config(), config)
+
+    def _settle(self, ticket, prompt_tokens: int, response) -> None:
+        """
+        Reports the call's real token usage to the admission layer
+        (usage metadata when available, tokenizer count otherwise).
+        """
+        if ticket is None:
+            return
+        if isinstance(response, dict) and "raw" in response:
+            response = response["raw"]  # Sortie structurée (include_raw=True)
+        usage = getattr(response, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            ticket.actual_tokens = usage["total_tokens"]
+        else:
+            content = getattr(response, "content", "")
+            ticket.actual_tokens = prompt_tokens + count_tokens(content if isinstance(content, str) else "", self.model_name)
+
+    def load_prompt(self, name: str):
+        """
+        Load a prompt from the local prompt registry, tracking load time.
+        Args:
+            name (str): Hub name of the prompt.
+        Returns:
+            The prompt template.
+        """
+        start = time.perf_counter()
+        try:
+            return get_prompt(name)
+        finally:
+            self.timings["prompt_load"] += time.perf_counter() - start
+
+    async def aload_prompt(self, name: str):
+        """
+        Async version of load_prompt.
+        Args:
+            name (str): Hub name of the prompt.
+        Returns:
+            The prompt template.
+        """
+        start = time.perf_counter()
+        try:
+            return await aget_prompt(name)
+        finally:
+            self.timings["prompt_load"] += time.perf_counter() - start
+
+    async def arun(self, *args, **kwargs) -> str:
+        """
+        Async counterpart of run. Subclasses override it with a native async
+        implementation; the default runs the sync version in a worker thread
+        so it never blocks the event loop.
+        Returns:
+            str: The agent's response.
+        """
+        return await asyncio.to_thread(self.run, *args, **kwargs)
+
+    async def ainvoke(self, input: str, llm=None) -> str:
+        """
+        Asynchronously invoke the LLM model with the given input.
+        Transient errors are retried within the request deadline and slow
+        first tokens may be hedged (see models/resilience.py).
+        Args:
+            input (str): The input to send to the LLM.
+            llm: Runnable built on self.llm to call instead (e.g. structured output).
+        Returns:
+            str: The LLM's response.
+        """
+        prompt_tokens = self._prompt_tokens(input)
+        deadline = current_deadline()
+
+        async def attempt(callbacks):
+            start = time.perf_counter()
+            async with aadmit(self.model_name, self.priority, prompt_tokens + self.estimated_output_tokens, deadline) as ticket:
+                admitted = time.perf_counter()
+                self.timings["admission_wait"] += admitted - start
+                handler = self._metrics_handler(prompt_tokens)
+                try:
+                    # Annulation de l'exécution (déconnexion, message plus récent) : la requête HTTP est interrompue ici
+                    with track_llm_call(handler, self.estimated_output_tokens):
+                        response = await (llm or self.llm).ainvoke(input, self._call_config(handler, *callbacks))
+                finally:
+                    self.timings["llm"] += time.perf_counter() - admitted
+                self._settle(ticket, prompt_tokens, response)
+                return response
+
+        return await acall_llm(type(self).__name__, self.model_name, attempt)
@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Marqueur placé dans les prompts de benchmark (voir bench/load.py) : identifie l'agent appelant
+PROMPT_MARKER = "[bench:"
+# Mots qui font choisir le chemin "code" au faux routeur
+_CODE_WORDS = ("create", "build", "make", "add", "change", "page", "section", "style", "color", "button")
+_WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do")
+
+
+class FakeModelConfig:
+    """
+    Latency profile of the fake model: time to first token, streaming rate
+    and completion size per agent (in tokens, ~one word each), plus injected
+    faults: a share of requests answered with a 500 error, and a share whose
+    first token is delayed by stall_ms.
+    """
+    def __init__(
+        self,
+        ttft_ms: float = 200,
+        tokens_per_second: float = 200,
+        plan_tokens: int = 150,
+        html_tokens: int = 600,
+        reply_tokens: int = 60,
+        error_rate: float = 0.0,
+        stall_rate: float = 0.0,
+        stall_ms: float = 5000,
+    ):
+        self.ttft = ttft_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.plan_tokens = plan_tokens
+        self.html_tokens = html_tokens
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall = stall_ms / 1000
+
+
+def _words(count: int) -> list:
+    return [_WORDS[i % len(_WORDS)] + " " for i in range(count)]
+
+
+def _html_tokens(count: int) -> list:
+    tokens = ["```html\n", "<!DOCTYPE html>\n", "<html lang=\"en\">\n", "<head><title>Bench</title></head>\n", "<body>\n"]
+    i = 0
+    while len(tokens) < count - 3:
+        tokens += [f"<section id=\"s{i}\">", f"<h2>Section {i}</h2>", "<p>", *_words(8), "</p>", "</section>\n"]
+        i += 1
+    return tokens + ["</body>\n", "</html>\n", "```"]
+
+
+def completion_tokens(prompt: str, config: FakeModelConfig) -> list:
+    """
+    Picks the completion for a prompt from the agent marker it contains.
+    Args:
+        prompt (str): Concatenated message contents of the request.
+        config (FakeModelConfig): Completion sizes.
+    Returns:
+        list: Completion split into tokens.
+    """
+    if "<plan>" in prompt:
+        # Variante fusionnée (prompt local, sans marqueur) : plan puis page dans la même sortie
+        return ["<plan>\n", "Plan: "] + _words(config.plan_tokens - 1) + ["\n</plan>\n"] + _html_tokens(config.html_tokens)
+    if "@@ REPLACE" in prompt:
+        return ["@@ INSERT 0\n", "<!-- bench edit -->\n", "@@ END"]
+    marker_start = prompt.find(PROMPT_MARKER)
+    agent = prompt[marker_start + len(PROMPT_MARKER):prompt.find("]", marker_start)] if marker_start != -1 else ""
+    if agent == "determine_user_intent":
+        # Le message utilisateur suit le marqueur sur la même ligne (la page n'est pas prise en compte)
+        message = prompt[marker_start:].split("\n", 1)[0].lower()
+        return ["WRITE_CODE"] if any(word in message for word in _CODE_WORDS) else ["RESPOND_NATURALLY"]
+    if agent == "desing_and_planing":
+        return ["Plan: "] + _words(config.plan_tokens - 1)
+    if agent == "html_generator":
+        return _html_tokens(config.html_tokens)
+    return _words(config.reply_tokens)
+
+
+def create_app(config: FakeModelConfig) -> FastAPI:
+    """
+    Builds the OpenAI-compatible stub (POST /v1/chat/completions, streamed or not).
+    Args:
+        config (FakeModelConfig): Latency profile.
+    Returns:
+        FastAPI: The stub application.
+    """
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.errors = 0
+    app.state.stalls = 0
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "requests": app.state.requests, "errors": app.state.errors, "stalls": app.state.stalls}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        if random.random() < config.error_rate:
+            app.state.errors += 1
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error", "code": None}}, status_code=500)
+        ttft = config.ttft
+        if random.random() < config.stall_rate:
+            # Connexion bloquée avant le premier token (amont lent)
+            app.state.stalls += 1
+            ttft += config.stall
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        tokens = completion_tokens(prompt, config)
+        model = body.get("model", "fake")
+        completion_id = f"chatcmpl-bench-{app.state.requests}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": max(1, len(prompt) // 4),
+            "completion_tokens": len(tokens),
+            "total_tokens": max(1, len(prompt) // 4) + len(tokens),
+        }
+        interval = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+        # Sortie structurée (routeur) : la réponse est renvoyée comme appel de la fonction imposée
+        tools = body.get("tools") or []
+        tool_call = None
+        if tools:
+            tool_call = {
+                "id": f"call_bench_{app.state.requests}",
+                "type": "function",
+                "function": {"name": tools[0]["function"]["name"], "arguments": json.dumps({"intent": "".join(tokens)})},
+            }
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + interval * len(tokens))
+            message = {"role": "assistant", "content": "".join(tokens)}
+            if tool_call is not None:
+                message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+                "usage": usage,
+            })
+
+        def chunk(delta: dict, finish_reason=None, **extra) -> bytes:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return b"data: " + json.dumps(data).encode() + b"\n\n"
+
+        async def stream():
+            await asyncio.sleep(ttft)
+            if tool_call is not None:
+                yield chunk({"role": "assistant", "content": None, "tool_calls": [{"index": 0, **tool_call}]})
+                yield chunk({}, "tool_calls")
+            else:
+                yield chunk({"role": "assistant", "content": ""})
+                for token in tokens:
+                    yield chunk({"content": token})
+                    if interval:
+                        await asyncio.sleep(interval)
+                yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield b"data: " + json.dumps({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                    "model": model, "choices": [], "usage": usage,
+                }).encode() + b"\n\n"
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible streaming stub for benchmarks.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ttft-ms", type=float, default=200, help="Delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="Streaming rate (0 = no delay)")
+    parser.add_argument("--plan-tokens", type=int, default=150)
+    parser.add_argument("--html-tokens", type=int, default=600)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500 error")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Share of requests whose first token is delayed")
+    parser.add_argument("--stall-ms", type=float, default=5000, help="Extra delay before the first token of a stalled request")
+    args = parser.parse_args()
+    config = FakeModelConfig(
+        args.ttft_ms, args.tokens_per_second, args.plan_tokens, args.html_tokens, args.reply_tokens,
+        args.error_rate, args.stall_rate, args.stall_ms
+    )
+    print(f"==> [OK]: Fake OpenAI server on http://127.0.0.1:{args.port}/v1")
+    uvicorn.run(create_app(config), host="127.0.0.1", port=args.port, log_level="warning")
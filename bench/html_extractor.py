@@ -0,0 +1,130 @@
+import os
+import sys
+import re
+import json
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.html_extractor import StreamingHtmlExtractor, extract_html_only
+
+
+def legacy_extract_html_only(text):
+    """
+    Previous regex-based extractor, kept here as the benchmark baseline.
+    """
+    match = re.search(r'<html[\s\S]*?</html>', text, re.IGNORECASE)
+    if match:
+        html_code = match.group(0)
+        html_code = re.sub(r'```html\s*', '', html_code)
+        html_code = re.sub(r'```', '', html_code)
+        return html_code.strip()
+    return ''
+
+
+# Cas de régression (sortie du modèle, page attendue), vérifiés avant chaque mesure
+REGRESSION_CASES = [
+    # Clôture ``` dans une page non délimitée (exemple de code dans un <pre>) : ce n'est pas la fin
+    (
+        "<!DOCTYPE html><html><body><h1>Docs</h1><pre>```js\nconsole.log(1);\n```</pre></body></html>",
+        "<!DOCTYPE html><html><body><h1>Docs</h1><pre>```js\nconsole.log(1);\n```</pre></body></html>",
+    ),
+    # Bloc ```css avant le bloc ```html : le premier bloc n'est pas la page
+    (
+        "Styles:\n```css\nbody{color:red}\n```\nPage:\n```html\n<!DOCTYPE html>\n<html><body><p>Hi</p></body></html>\n```\nDone!",
+        "<!DOCTYPE html>\n<html><body><p>Hi</p></body></html>",
+    ),
+]
+
+
+def check_regressions(chunk_size: int) -> None:
+    """
+    Checks the regression cases, whole and streamed chunk by chunk.
+    """
+    for text, expected in REGRESSION_CASES:
+        assert extract_html_only(text) == expected, text
+        assert stream(text, chunk_size) == expected, text
+        assert stream(text, 1) == expected, text
+
+
+def make_output(size_kb: int) -> str:
+    """
+    Builds a model-like output of roughly size_kb kilobytes: prose, a fenced
+    document with styles, sections and a script, then trailing prose.
+    """
+    section = (
+        '    <section id="s{i}" class="card">\n'
+        '      <h2>Section {i}</h2>\n'
+        '      <p>Lorem ipsum dolor sit amet &amp; consectetur, <a href="#s{i}">link {i}</a>.</p>\n'
+        '      <ul><li>One</li><li>Two</li><li>Three</li></ul>\n'
+        '    </section>\n'
+    )
+    head = (
+        "Sure! Here is the updated page:\n\n```html\n<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n"
+        "  <meta charset=\"utf-8\">\n  <title>Bench</title>\n"
+        "  <style>body { font-family: Arial; } .card { padding: 1rem; }</style>\n</head>\n<body>\n"
+    )
+    tail = "  <script>document.title = `Bench`;</script>\n</body>\n</html>\n```\n\nLet me know if you want changes!"
+    body = []
+    size = len(head) + len(tail)
+    i = 0
+    while size < size_kb * 1024:
+        block = section.format(i=i)
+        body.append(block)
+        size += len(block)
+        i += 1
+    return head + "".join(body) + tail
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def stream(text: str, chunk_size: int) -> str:
+    extractor = StreamingHtmlExtractor()
+    for i in range(0, len(text), chunk_size):
+        extractor.feed(text[i:i + chunk_size])
+    return extractor.close()
+
+
+def run(sizes: list, chunk_size: int, repeat: int) -> list:
+    check_regressions(chunk_size)
+    results = []
+    for size_kb in sizes:
+        text = make_output(size_kb)
+        expected = extract_html_only(text)
+        assert stream(text, chunk_size) == expected
+        assert legacy_extract_html_only(text) in expected
+        timings = {
+            "legacy_regex": timeit(lambda: legacy_extract_html_only(text), repeat),
+            "extract_html_only": timeit(lambda: extract_html_only(text), repeat),
+            f"streaming_{chunk_size}_char_chunks": timeit(lambda: stream(text, chunk_size), repeat),
+        }
+        results.append({
+            "size_kb": round(len(text) / 1024, 1),
+            **{name: {"ms": round(seconds * 1000, 3), "mb_per_s": round(len(text) / seconds / 1e6, 1)}
+               for name, seconds in timings.items()},
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the HTML extractor on large model outputs.")
+    parser.add_argument("--sizes", default="100,300,800", help="Output sizes in KB (comma separated)")
+    parser.add_argument("--chunk-size", type=int, default=4, help="Characters per streamed chunk (~1 token)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is kept)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    results = run([int(size) for size in args.sizes.split(",")], args.chunk_size, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"==> [INFO]: {result['size_kb']} KB")
+            for name, value in result.items():
+                if name != "size_kb":
+                    print(f"    {name:<28} {value['ms']:>10.3f} ms  {value['mb_per_s']:>8.1f} MB/s")
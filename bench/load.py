@@ -0,0 +1,359 @@
+import os
+import sys
+import glob
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+import httpx
+from utils.stats import percentiles
+
+# Messages envoyés à tour de rôle : chemin "code" et réponses naturelles
+DEFAULT_MESSAGES = [
+    "Create a landing page for a coffee shop with a menu section",
+    "hello, how are you today?",
+    "Build a portfolio page for a photographer with a gallery",
+    "what can you do for me?",
+    "Make a pricing page with three plans and a signup button",
+    "thanks, that's great",
+]
+# Prompts servis localement : le marqueur [bench:<nom>] indique au serveur factice quel agent appelle
+BENCH_PROMPTS = {
+    "dev-assistant/determine_user_intent": "[bench:determine_user_intent] {user_message}\n{existing_html_content}",
+    "dev-assistant/respond_to_user": "[bench:respond_to_user] {user_message}\n{existing_html_content}",
+    "dev-assistant/desing_and_planing": "[bench:desing_and_planing] {user_message}\n{existing_html_content}",
+    "dev-assistant/html_generator": "[bench:html_generator] {user_message}\n{design_plan}\n{existing_html_content}",
+}
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+# Métriques comparées à la référence : (chemin, True si une valeur plus haute est pire)
+REGRESSION_METRICS = [
+    (("latency_ms", "p50"), True),
+    (("latency_ms", "p95"), True),
+    (("ttft_ms", "p95"), True),
+    (("requests_per_second",), False),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare_prompts(cache_dir: str) -> None:
+    """
+    Writes the benchmark prompts into a local prompt cache (never the hub).
+    Args:
+        cache_dir (str): Prompt cache directory used by the app under test.
+    """
+    os.environ["PROMPT_CACHE_DIR"] = cache_dir
+    from langchain_core.prompts import ChatPromptTemplate
+    from models.prompt_registry import save_prompt
+    for name, template in BENCH_PROMPTS.items():
+        save_prompt(name, ChatPromptTemplate.from_messages([("human", template)]))
+
+
+def start_process(args: list, env: dict, health_url: str, timeout: float = 60) -> subprocess.Popen:
+    """
+    Starts a server process and waits until its health URL answers.
+    """
+    process = subprocess.Popen([sys.executable] + args, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{args[0]} exited: {process.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            if httpx.get(health_url, timeout=1).status_code < 500:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{args[0]} did not start within {timeout:g}s")
+
+
+async def send_message(client: httpx.AsyncClient, app_url: str, message: str, session_id: str, graph: str) -> dict:
+    """
+    Sends one /chat-message request and measures it from its SSE events.
+    Returns:
+        dict: status, latency_ms, ttft_ms (first token event), per-node durations and error.
+    """
+    result = {"status": None, "latency_ms": None, "ttft_ms": None, "nodes": {}, "tokens": 0, "error": None}
+    start = time.perf_counter()
+    try:
+        async with client.stream("POST", f"{app_url}/chat-message", json={
+            "message": message, "session_id": session_id, "graph": graph,
+        }) as response:
+            result["status"] = response.status_code
+            if response.status_code != 200:
+                await response.aread()
+                result["error"] = f"HTTP {response.status_code}"
+                return result
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:") and event is not None:
+                    data = json.loads(line[5:])
+                    if event == "token":
+                        if result["ttft_ms"] is None:
+                            result["ttft_ms"] = (time.perf_counter() - start) * 1000
+                        result["tokens"] += 1
+                    elif event == "node_end":
+                        result["nodes"][data["node"]] = result["nodes"].get(data["node"], 0.0) + data["duration_ms"]
+                    elif event == "error":
+                        result["error"] = data.get("code") or data.get("message")
+                elif not line:
+                    event = None
+    except httpx.HTTPError as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        result["latency_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+async def drive(app_url: str, messages: list, requests: int, concurrency: int, sessions: int, graph: str, run_id: str) -> tuple:
+    """
+    Sends `requests` messages with at most `concurrency` in flight.
+    Returns:
+        tuple: (per-request results, wall time in seconds)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        async def one(index):
+            async with semaphore:
+                session_id = f"bench-{run_id}-{index % sessions}"
+                return await send_message(client, app_url, messages[index % len(messages)], session_id, graph)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(requests)))
+        return results, time.perf_counter() - start
+
+
+def summarize(results: list, wall_seconds: float) -> dict:
+    """
+    Aggregates per-request results into the benchmark report.
+    """
+    ok = [r for r in results if r["error"] is None]
+    nodes = {}
+    for result in ok:
+        for node, duration in result["nodes"].items():
+            nodes.setdefault(node, []).append(duration)
+    errors = {}
+    for result in results:
+        if result["error"] is not None:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_second": round(len(ok) / wall_seconds, 2) if wall_seconds else None,
+        "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+        "ttft_ms": percentiles([r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]),
+        "tokens_per_request": round(sum(r["tokens"] for r in ok) / len(ok), 1) if ok else None,
+        "nodes_ms": {node: {"count": len(values), **percentiles(values)} for node, values in sorted(nodes.items())},
+    }
+
+
+def compare(summary: dict, baseline: dict, max_regression: float) -> list:
+    """
+    Compares a run to a baseline report.
+    Returns:
+        list: Regressions beyond max_regression percent, as readable strings.
+    """
+    regressions = []
+    for path, higher_is_worse in REGRESSION_METRICS:
+        current, previous = summary, baseline["summary"]
+        for key in path:
+            current, previous = (current or {}).get(key), (previous or {}).get(key)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous * 100
+        worse = change > max_regression if higher_is_worse else -change > max_regression
+        print(f"    {'.'.join(path):<24} {previous:>10} -> {current:<10} ({change:+.1f}%)")
+        if worse:
+            regressions.append(f"{'.'.join(path)} {change:+.1f}%")
+    return regressions
+
+
+def print_comparison(variants: dict) -> None:
+    """
+    Prints the main metrics of each workflow variant side by side.
+    """
+    graphs = list(variants)
+    print("==> [INFO]: Variant comparison")
+    print(f"    {'metric':<24}" + "".join(f"{graph:>14}" for graph in graphs))
+    for path, _ in REGRESSION_METRICS:
+        values = []
+        for graph in graphs:
+            value = variants[graph]
+            for key in path:
+                value = (value or {}).get(key)
+            values.append(value)
+        print(f"    {'.'.join(path):<24}" + "".join(f"{str(value):>14}" for value in values))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args) -> int:
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+    messages = DEFAULT_MESSAGES
+    if args.messages:
+        with open(args.messages, encoding="utf-8") as f:
+            messages = [line.strip() for line in f if line.strip()]
+    graphs = [graph.strip() for graph in args.graph.split(",") if graph.strip()]
+    variants = {}
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    app_url = args.app_url
+    try:
+        if app_url is None:
+            prepare_prompts(os.path.join(workdir, "prompts"))
+            fake_port, app_port = free_port(), free_port()
+            processes.append(start_process([
+                "bench/fake_openai.py", "--port", str(fake_port),
+                "--ttft-ms", str(args.ttft_ms), "--tokens-per-second", str(args.tokens_per_second),
+                "--plan-tokens", str(args.plan_tokens), "--html-tokens", str(args.html_tokens),
+                "--reply-tokens", str(args.reply_tokens),
+                "--error-rate", str(args.error_rate), "--stall-rate", str(args.stall_rate), "--stall-ms", str(args.stall_ms),
+            ], dict(os.environ), f"http://127.0.0.1:{fake_port}/health"))
+            env = {
+                **os.environ,
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+                "OPENAI_API_KEY": "bench",
+                "PROMPT_CACHE_DIR": os.path.join(workdir, "prompts"),
+                "PROMPTS_OFFLINE": "1",
+                "CHECKPOINT_DB_PATH": os.path.join(workdir, "checkpoints.sqlite"),
+                "LLM_CACHE_ENABLED": "0",
+                # Avec --sessions, des messages concurrents d'une même session ne doivent pas s'annuler
+                "SESSION_PREEMPTION": "0",
+                **env_overrides,
+            }
+            if args.workers > 1:
+                env["WORKER_STATE_PATH"] = os.path.join(workdir, "workers.sqlite")
+                env["SESSION_LOCK_DIR"] = os.path.join(workdir, "session_locks")
+                server = ["run.py", "--host", "127.0.0.1", "--port", str(app_port), "--workers", str(args.workers)]
+            else:
+                server = ["-m", "uvicorn", "script.app:app", "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"]
+            processes.append(start_process(server, env, f"http://127.0.0.1:{app_port}/stats"))
+            app_url = f"http://127.0.0.1:{app_port}"
+
+        # Variantes mesurées l'une après l'autre sur le même serveur, avec les mêmes messages
+        for graph in graphs:
+            if args.warmup:
+                asyncio.run(drive(app_url, messages, args.warmup, args.concurrency, args.warmup, graph, f"{run_id}-{graph}-warmup"))
+            results, wall_seconds = asyncio.run(
+                drive(app_url, messages, args.requests, args.concurrency, args.sessions or args.requests, graph, f"{run_id}-{graph}")
+            )
+            variants[graph] = summarize(results, wall_seconds)
+        try:
+            server_stats = httpx.get(f"{app_url}/stats", timeout=5).json()
+        except (httpx.HTTPError, ValueError):
+            server_stats = None
+    finally:
+        for process in processes:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for path in glob.glob(os.path.join(ROOT, "templates", "generated", "sessions", f"bench-{run_id}*.html")):
+            os.remove(path)
+
+    report = {
+        "run_id": run_id,
+        "git_commit": git_commit(),
+        "config": {
+            "graph": graphs[0],
+            "graphs": graphs,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "sessions": args.sessions or args.requests,
+            "fake_model": None if args.app_url else {
+                "ttft_ms": args.ttft_ms,
+                "tokens_per_second": args.tokens_per_second,
+                "plan_tokens": args.plan_tokens,
+                "html_tokens": args.html_tokens,
+                "reply_tokens": args.reply_tokens,
+                "error_rate": args.error_rate,
+                "stall_rate": args.stall_rate,
+                "stall_ms": args.stall_ms,
+            },
+            "workers": args.workers,
+            "env": env_overrides,
+        },
+        # Première variante : c'est elle que compare un rapport de base à une seule variante
+        "summary": variants[graphs[0]],
+        "variants": variants,
+        "server_stats": server_stats,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"load-{run_id}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for graph, summary in variants.items():
+        print(f"==> [INFO]: [{graph}] {summary['succeeded']}/{summary['requests']} requests in {summary['wall_seconds']}s "
+              f"({summary['requests_per_second']} req/s), errors: {summary['errors'] or 'none'}")
+        for name in ("latency_ms", "ttft_ms"):
+            values = summary[name]
+            print(f"    {name:<24} p50 {values['p50']}  p95 {values['p95']}  p99 {values['p99']}")
+        for node, values in summary["nodes_ms"].items():
+            print(f"    node {node:<28} p50 {values['p50']}  p95 {values['p95']}  (n={values['count']})")
+    if len(variants) > 1:
+        print_comparison(variants)
+    print(f"==> [OK]: Results saved to {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"==> [INFO]: Comparison with {args.baseline} (commit {baseline.get('git_commit')})")
+        regressions = []
+        for graph, summary in variants.items():
+            # Rapport de base d'une autre variante (ou ancien format) : seule la première est comparée
+            previous = (baseline.get("variants") or {}).get(graph)
+            if previous is None and graph != graphs[0]:
+                continue
+            print(f"    [{graph}]")
+            regressions += [f"{graph} {r}" for r in compare(summary, {"summary": previous or baseline["summary"]}, args.max_regression)]
+        if regressions:
+            print(f"==> [ERROR]: Regressions beyond {args.max_regression:g}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load/latency benchmark of /chat-message against a local fake OpenAI server.")
+    parser.add_argument("--requests", type=int, default=30, help="Measured requests")
+    parser.add_argument("--concurrency", type=int, default=5, help="Requests in flight")
+    parser.add_argument("--sessions", type=int, default=0, help="Distinct sessions (default: one per request; fewer sessions means follow-up edits)")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests sent first")
+    parser.add_argument("--graph", default="chat", help="Workflow variant(s), comma-separated to compare them (e.g. chat,chat_fused)")
+    parser.add_argument("--messages", help="Text file with one message per line (default: built-in mix)")
+    parser.add_argument("--ttft-ms", type=float, default=200, help="Fake model time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="Fake model streaming rate")
+    parser.add_argument("--plan-tokens", type=int, default=150)
+    parser.add_argument("--html-tokens", type=int, default=600)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake model: share of requests failing with a 500")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fake model: share of requests stalling before the first token")
+    parser.add_argument("--stall-ms", type=float, default=5000, help="Fake model: stall duration")
+    parser.add_argument("--workers", type=int, default=1, help="Start the app with run.py --workers N (preforked workers)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra environment for the app (repeatable)")
+    parser.add_argument("--app-url", help="Benchmark an already running app instead of starting one (no fake server)")
+    parser.add_argument("--out", help="Result file (default: bench/results/load-<timestamp>.json)")
+    parser.add_argument("--baseline", help="Previous result file to compare with")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="Allowed regression in percent before failing")
+    sys.exit(main(parser.parse_args()))
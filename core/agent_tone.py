@@ -1,15 +1,22 @@
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from langchain import hub
 from base.state import State
 from base.base_agent import BaseAgent
+from utils.page_outline import page_context_for
 from langchain.schema import HumanMessage
 
 class RespondNaturally(BaseAgent):
     """
-    Agent that responds naturally to a user's message using a prompt from the LangChain hub.
+    Agent that responds naturally to a user's message using a prompt from the prompt registry.
     """
+    profile = "respond"
+    # Réponse conversationnelle : jamais mise en cache
+    cache_responses = False
+    # Réponse courte : voie prioritaire de l'admission
+    priority = "high"
+    estimated_output_tokens = 300
+
     def __init__(self):
         super().__init__("Respond Naturally Agent", "An agent that responds naturally to a user's message.")
 
@@ -22,11 +29,25 @@ class RespondNaturally(BaseAgent):
         Returns:
             str: The agent's response message.
         """
-        prompt = hub.pull("dev-assistant/respond_to_user")
+        prompt = self.load_prompt("dev-assistant/respond_to_user")
         prompt_value = prompt.invoke({"user_message": user_message, "existing_html_content": existing_html_content})
         intent_response = self.invoke(prompt_value)
         return intent_response.content
-    
+
+    async def arun(self, user_message: str, existing_html_content: str) -> str:
+        """
+        Async version of run, awaiting the LLM instead of blocking the event loop.
+        Args:
+            user_message (str): The user's input message.
+            existing_html_content (str): The current HTML content to consider.
+        Returns:
+            str: The agent's response message.
+        """
+        prompt = await self.aload_prompt("dev-assistant/respond_to_user")
+        prompt_value = await prompt.ainvoke({"user_message": user_message, "existing_html_content": existing_html_content})
+        intent_response = await self.ainvoke(prompt_value)
+        return intent_response.content
+
 def respond_naturally_node(state: State) -> State:
     """
     Node function to generate a natural response and update the workflow state with the new message.
@@ -36,7 +57,24 @@ def respond_naturally_node(state: State) -> State:
         State: Updated state with the new message appended.
     """
     agent = RespondNaturally()
-    return_response = agent.run(state.get("initial_user_message"), state.get("existing_html_content"))
+    page_context = page_context_for("respond_naturally", state.get("existing_html_content"))
+    return_response = agent.run(state.get("initial_user_message"), page_context)
+    existing_messages = state.get("messages", [])
+    return {
+        "messages": existing_messages + [HumanMessage(content=return_response)]
+    }
+
+async def arespond_naturally_node(state: State) -> State:
+    """
+    Async node function used by graph.astream / graph.ainvoke.
+    Args:
+        state (State): The current workflow state.
+    Returns:
+        State: Updated state with the new message appended.
+    """
+    agent = RespondNaturally()
+    page_context = page_context_for("respond_naturally", state.get("existing_html_content"))
+    return_response = await agent.arun(state.get("initial_user_message"), page_context)
     existing_messages = state.get("messages", [])
     return {
         "messages": existing_messages + [HumanMessage(content=return_response)]
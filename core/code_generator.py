@@ -1,45 +1,70 @@
 # agents/write_html_code.py
 import os
 import sys
-import tempfile
+import time
+import asyncio
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from langchain import hub
 from base.state import State
 from base.base_agent import BaseAgent
 from langchain.schema import HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
+from models.prompt_registry import register_local_prompt
+from utils.get_numbered_code import get_numbered_code
+from utils.html_extractor import extract_html_only
+from utils.patch_engine import parse_patch, apply_patch, PatchError
+from utils.token_count import count_tokens
+from utils.page_store import atomic_write  # ré-exporté pour compatibilité
+from utils.session import get_run_page_store
+from utils.run_control import write_run_page
+from utils.metrics import metrics_suppressed
 
-# Charger le prompt une seule fois pour éviter un pull à chaque run
-PROMPT_AFTER_PLANNING = hub.pull("dev-assistant/html_generator")
+# Mode patch : pour une page existante, le modèle renvoie des opérations par lignes
+# au lieu de régénérer tout le document (retour à la régénération complète si échec)
+HTML_PATCH_MODE = os.getenv("HTML_PATCH_MODE", "1") == "1"
 
-def atomic_write(path: str, data: str) -> None:
-    """
-    Atomically writes data to a file to prevent corruption.
-    Args:
-        path (str): The target file path.
-        data (str): The data to write.
-    """
-    directory = os.path.dirname(path) or "."
-    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".html")
-    try:
-        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
-            tmp_file.write(data)
-        os.replace(tmp_path, path)  # Atomically replace the existing file
-    finally:
-        # Clean up if os.replace was not called
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+register_local_prompt("local/html_patch", ChatPromptTemplate.from_messages([
+    ("system",
+     "You edit an existing HTML page. The page is shown with numbered lines (00001: ...).\n"
+     "Reply ONLY with line-addressed edit operations, using the original line numbers:\n"
+     "@@ REPLACE <start>-<end>   followed by the new lines replacing lines start..end\n"
+     "@@ INSERT <line>           followed by the lines to insert after <line> (0 = top of file)\n"
+     "@@ DELETE <start>-<end>    with no content\n"
+     "@@ END                     after the last operation\n"
+     "Never repeat unchanged lines, never include the line-number prefixes, "
+     "and do not add any explanation."),
+    ("human",
+     "User request:\n{user_message}\n\n"
+     "Design plan:\n{design_plan}\n\n"
+     "Current page:\n{numbered_html}"),
+]))
 
+# Coût des éditions : tokens de sortie et temps réel, par mode
+_EDIT_STATS = {
+    "full": {"edits": 0, "output_tokens": 0, "seconds": 0.0},
+    "patch": {"edits": 0, "output_tokens": 0, "seconds": 0.0},
+    # Variante chat_fused : plan et page en un seul appel (voir core/plan_and_generate.py)
+    "fused": {"edits": 0, "output_tokens": 0, "seconds": 0.0},
+    "patch_fallbacks": 0,
+}
 
 class WriteHtmlCode(BaseAgent):
     """
     Agent that generates HTML code based on user message, existing HTML, and design plan.
     """
+    profile = "html_writer"
+    # Même demande sur la même page : réponse réutilisable, mise en cache
+    cache_responses = True
+    # Page complète : la plus grosse complétion du workflow
+    estimated_output_tokens = 3000
+
     def __init__(self):
         super().__init__("Write Html Code Agent", "An agent that writes HTML code.")
 
     def run(self, user_message: str, existing_html_content: str, design_plan: str) -> str:
         """
-        Generates HTML code using a prompt from the LangChain hub.
+        Generates HTML code using a prompt from the prompt registry.
         Args:
             user_message (str): The user's input message.
             existing_html_content (str): The current HTML content to consider.
@@ -47,7 +72,8 @@ class WriteHtmlCode(BaseAgent):
         Returns:
             str: The generated HTML code.
         """
-        prompt_value = PROMPT_AFTER_PLANNING.invoke({
+        prompt = self.load_prompt("dev-assistant/html_generator")
+        prompt_value = prompt.invoke({
             "user_message": user_message,
             "existing_html_content": existing_html_content,
             "design_plan": design_plan
@@ -55,28 +81,235 @@ class WriteHtmlCode(BaseAgent):
         intent_response = self.invoke(prompt_value)
         return intent_response.content
 
+    async def arun(self, user_message: str, existing_html_content: str, design_plan: str) -> str:
+        """
+        Async version of run, awaiting the LLM instead of blocking the event loop.
+        Args:
+            user_message (str): The user's input message.
+            existing_html_content (str): The current HTML content to consider.
+            design_plan (str): The design plan for the HTML.
+        Returns:
+            str: The generated HTML code.
+        """
+        prompt = await self.aload_prompt("dev-assistant/html_generator")
+        prompt_value = await prompt.ainvoke({
+            "user_message": user_message,
+            "existing_html_content": existing_html_content,
+            "design_plan": design_plan
+        })
+        intent_response = await self.ainvoke(prompt_value)
+        return intent_response.content
+
+
+class PatchHtmlCode(BaseAgent):
+    """
+    Agent that edits an existing page by returning line-range operations.
+    """
+    profile = "html_patch"
+    # Même demande sur la même page : réponse réutilisable, mise en cache
+    cache_responses = True
+    estimated_output_tokens = 800
+    # Opérations de patch brutes : l'interface les distingue du HTML, l'aperçu les ignore
+    stream_part = "patch"
+
+    def __init__(self):
+        super().__init__("Patch Html Code Agent", "An agent that edits HTML code with line-addressed patches.")
+
+    def run(self, user_message: str, existing_html_content: str, design_plan: str) -> str:
+        """
+        Asks the model for patch operations against the numbered page.
+        Args:
+            user_message (str): The user's input message.
+            existing_html_content (str): The current HTML content to edit.
+            design_plan (str): The design plan for the edit.
+        Returns:
+            str: The patch text.
+        """
+        prompt = self.load_prompt("local/html_patch")
+        prompt_value = prompt.invoke({
+            "user_message": user_message,
+            "numbered_html": get_numbered_code(existing_html_content),
+            "design_plan": design_plan
+        })
+        return self.invoke(prompt_value).content
 
-def write_html_code_node(state: State) -> State:
+    async def arun(self, user_message: str, existing_html_content: str, design_plan: str) -> str:
+        """
+        Async version of run.
+        Args:
+            user_message (str): The user's input message.
+            existing_html_content (str): The current HTML content to edit.
+            design_plan (str): The design plan for the edit.
+        Returns:
+            str: The patch text.
+        """
+        prompt = await self.aload_prompt("local/html_patch")
+        prompt_value = await prompt.ainvoke({
+            "user_message": user_message,
+            "numbered_html": get_numbered_code(existing_html_content),
+            "design_plan": design_plan
+        })
+        return (await self.ainvoke(prompt_value)).content
+
+
+def record_edit(mode: str, output_text: str, seconds: float) -> None:
     """
-    Node function to generate HTML code and update the workflow state.
+    Records the output tokens and wall time of one page edit.
+    Args:
+        mode (str): 'full', 'patch' or 'fused'.
+        output_text (str): Raw model output.
+        seconds (float): Wall time of the edit.
+    """
+    if metrics_suppressed():
+        return
+    stats = _EDIT_STATS[mode]
+    stats["edits"] += 1
+    stats["output_tokens"] += count_tokens(output_text)
+    stats["seconds"] += seconds
+
+
+def get_edit_stats() -> dict:
+    """
+    Returns output tokens and wall time per edit for full regeneration, patch
+    mode and fused plan+generate calls.
+    Returns:
+        dict: Edit statistics with per-edit averages.
+    """
+    report = {"patch_mode": HTML_PATCH_MODE, "patch_fallbacks": _EDIT_STATS["patch_fallbacks"]}
+    for mode in ("full", "patch", "fused"):
+        stats = _EDIT_STATS[mode]
+        edits = stats["edits"] or 1
+        report[mode] = {
+            **stats,
+            "avg_output_tokens": stats["output_tokens"] / edits,
+            "avg_seconds": stats["seconds"] / edits,
+        }
+    return report
+
+
+def _announce_full_regeneration() -> None:
+    """
+    Tells the stream consumers (live preview) that the patch was rejected and
+    the whole page is now being generated in the same node.
+    """
+    get_stream_writer()({"event": "generation_restart", "node": "write_html_code"})
+
+
+def generate_html(user_message: str, existing_html_content: str, design_plan: str) -> str:
+    """
+    Produces the new page: patches the existing page when possible,
+    otherwise regenerates the whole document (extracted from the model output).
+    Args:
+        user_message (str): The user's input message.
+        existing_html_content (str): The current HTML content.
+        design_plan (str): The design plan.
+    Returns:
+        str: The new HTML document.
+    """
+    start = time.perf_counter()
+    if HTML_PATCH_MODE and existing_html_content.strip():
+        patch_text = PatchHtmlCode().run(user_message, existing_html_content, design_plan)
+        try:
+            html = apply_patch(existing_html_content, parse_patch(patch_text))
+            record_edit("patch", patch_text, time.perf_counter() - start)
+            return html
+        except PatchError:
+            if not metrics_suppressed():
+                _EDIT_STATS["patch_fallbacks"] += 1
+            _announce_full_regeneration()
+    output = WriteHtmlCode().run(user_message, existing_html_content, design_plan)
+    record_edit("full", output, time.perf_counter() - start)
+    # Artefact propre : aucun lecteur en aval n'a besoin de ré-extraire le HTML
+    return extract_html_only(output)
+
+
+async def agenerate_html(user_message: str, existing_html_content: str, design_plan: str) -> str:
+    """
+    Async version of generate_html.
+    Args:
+        user_message (str): The user's input message.
+        existing_html_content (str): The current HTML content.
+        design_plan (str): The design plan.
+    Returns:
+        str: The new HTML document.
+    """
+    start = time.perf_counter()
+    if HTML_PATCH_MODE and existing_html_content.strip():
+        patch_text = await PatchHtmlCode().arun(user_message, existing_html_content, design_plan)
+        try:
+            html = apply_patch(existing_html_content, parse_patch(patch_text))
+            record_edit("patch", patch_text, time.perf_counter() - start)
+            return html
+        except PatchError:
+            if not metrics_suppressed():
+                _EDIT_STATS["patch_fallbacks"] += 1
+            _announce_full_regeneration()
+    output = await WriteHtmlCode().arun(user_message, existing_html_content, design_plan)
+    record_edit("full", output, time.perf_counter() - start)
+    # Artefact propre : aucun lecteur en aval n'a besoin de ré-extraire le HTML
+    return extract_html_only(output)
+
+
+def page_update_message(version) -> HumanMessage:
+    """
+    Builds the chat message recording a page update. The page itself is not
+    copied into the conversation: it is already in existing_html_content and
+    in the page store, and the checkpointed messages would grow by a full
+    page per turn.
+    Args:
+        version (PageVersion): The written page version.
+    Returns:
+        HumanMessage: Short reference to the page version.
+    """
+    return HumanMessage(content=f"Page updated (version {version.version}, {len(version.body)} bytes).")
+
+
+def write_html_code_node(state: State, config: RunnableConfig = None) -> State:
+    """
+    Node function to generate (or patch) HTML code and update the workflow state.
+    The page is written to the store of the session (thread_id) being run,
+    or to the config's page_path when set (batch jobs),
+    and becomes the existing page for the session's next turn.
     Args:
         state (State): The current workflow state.
+        config (RunnableConfig): Run config carrying the session thread_id.
     Returns:
         State: Updated state with the final HTML content and message.
     """
-    agent = WriteHtmlCode()
-    return_response = agent.run(
+    return_response = generate_html(
+        state.get("initial_user_message", ""),
+        state.get("existing_html_content", ""),
+        state.get("design_plan", "")
+    )
+    version = write_run_page(get_run_page_store(config), return_response)
+    return {
+        "final_html_content": return_response,
+        "existing_html_content": return_response,
+        "messages": state.get("messages", []) + [page_update_message(version)]
+    }
+
+
+async def awrite_html_code_node(state: State, config: RunnableConfig = None) -> State:
+    """
+    Async node function used by graph.astream / graph.ainvoke.
+    The page is written from a worker thread to keep the event loop free.
+    Args:
+        state (State): The current workflow state.
+        config (RunnableConfig): Run config carrying the session thread_id.
+    Returns:
+        State: Updated state with the final HTML content and message.
+    """
+    return_response = await agenerate_html(
         state.get("initial_user_message", ""),
         state.get("existing_html_content", ""),
         state.get("design_plan", "")
     )
-    try:
-        atomic_write("templates/generated/page.html", return_response)
-    except Exception as write_error:
-        raise write_error
+    page_store = get_run_page_store(config)
+    version = await asyncio.to_thread(write_run_page, page_store, return_response)
     return {
         "final_html_content": return_response,
-        "messages": state.get("messages", []) + [HumanMessage(content=return_response)]
+        "existing_html_content": return_response,
+        "messages": state.get("messages", []) + [page_update_message(version)]
     }
 
 
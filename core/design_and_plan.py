@@ -1,31 +1,50 @@
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from langchain import hub
 from base.state import State
 from base.base_agent import BaseAgent
+from utils.page_outline import page_context_for
 
 class DesignAndPlan(BaseAgent):
     """
     Agent responsible for designing and planning a project based on user input and existing HTML content.
     """
+    profile = "planner"
+    # Même demande sur la même page : réponse réutilisable, mise en cache
+    cache_responses = True
+    estimated_output_tokens = 800
+
     def __init__(self):
         super().__init__("Design and Plan Agent", "A design and plan agent that designs and plans a project.")
 
     def run(self, user_message: str, existing_html_content: str) -> str:
         """
-        Executes the design and planning workflow using a prompt from the LangChain hub.
+        Executes the design and planning workflow using a prompt from the prompt registry.
         Args:
             user_message (str): The user's input message.
             existing_html_content (str): The current HTML content to consider.
         Returns:
             str: The agent's response with design and planning details.
         """
-        prompt = hub.pull("dev-assistant/desing_and_planing")
+        prompt = self.load_prompt("dev-assistant/desing_and_planing")
         prompt_value = prompt.invoke({"user_message": user_message, "existing_html_content": existing_html_content})
         intent_response = self.invoke(prompt_value)
         return intent_response.content
 
+    async def arun(self, user_message: str, existing_html_content: str) -> str:
+        """
+        Async version of run, awaiting the LLM instead of blocking the event loop.
+        Args:
+            user_message (str): The user's input message.
+            existing_html_content (str): The current HTML content to consider.
+        Returns:
+            str: The agent's response with design and planning details.
+        """
+        prompt = await self.aload_prompt("dev-assistant/desing_and_planing")
+        prompt_value = await prompt.ainvoke({"user_message": user_message, "existing_html_content": existing_html_content})
+        intent_response = await self.ainvoke(prompt_value)
+        return intent_response.content
+
 def design_and_plan_node(state: State) -> State:
     """
     Node function to execute the design and plan agent and update the workflow state.
@@ -35,7 +54,21 @@ def design_and_plan_node(state: State) -> State:
         State: Updated state with the design plan.
     """
     agent = DesignAndPlan()
-    design_plan = agent.run(state.get("initial_user_message"), state.get("existing_html_content"))
+    page_context = page_context_for("design_and_plan", state.get("existing_html_content"))
+    design_plan = agent.run(state.get("initial_user_message"), page_context)
+    return {"design_plan": design_plan}
+
+async def adesign_and_plan_node(state: State) -> State:
+    """
+    Async node function used by graph.astream / graph.ainvoke.
+    Args:
+        state (State): The current workflow state.
+    Returns:
+        State: Updated state with the design plan.
+    """
+    agent = DesignAndPlan()
+    page_context = page_context_for("design_and_plan", state.get("existing_html_content"))
+    design_plan = await agent.arun(state.get("initial_user_message"), page_context)
     return {"design_plan": design_plan}
 
 if __name__ == "__main__":
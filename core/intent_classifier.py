@@ -0,0 +1,230 @@
+import os
+import sys
+import re
+import json
+import math
+import time
+from collections import Counter
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.metrics import metrics_suppressed
+
+# Données étiquetées : entraînement du modèle local et jeu d'évaluation
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent")
+TRAIN_PATH = os.path.join(DATA_DIR, "train.jsonl")
+EVAL_PATH = os.path.join(DATA_DIR, "eval.jsonl")
+
+# Confiance minimale pour court-circuiter le routeur LLM
+FASTPATH_THRESHOLD = float(os.getenv("INTENT_FASTPATH_THRESHOLD", "0.9"))
+
+WRITE_CODE = "WRITE_CODE"
+RESPOND_NATURALLY = "RESPOND_NATURALLY"
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# Règles à haute précision : messages courts de politesse / questions, et demandes d'édition explicites
+_SMALL_TALK_RE = re.compile(
+    r"^\s*(hi|hello|hey|yo|thanks?( you)?( so much| a lot)?|thx|ty|cool|nice|great|awesome|perfect|"
+    r"bye|goodbye|see (you|ya)( later)?|good (morning|evening|night|job)|lol|haha)"
+    r"[\s!.,:)]*(thanks?|there)?[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+# Réponses courtes à une proposition ("Yes please do it", "No thanks") : le sens dépend
+# du tour précédent, que le modèle local ne voit pas -> confiance sous le seuil
+_CONFIRMATION_RE = re.compile(
+    r"^\s*(yes|yeah|yep|yup|sure|ok(ay)?|sounds good|go ahead|do it|please do|no|nope|not now)\b",
+    re.IGNORECASE,
+)
+_QUESTION_RE = re.compile(r"^\s*(what|why|how|who|which|when|where|is|are|does|do|did|was|were|has|have)\b.*\?\s*$", re.IGNORECASE)
+_WH_QUESTION_RE = re.compile(r"^\s*(what|why|how|who|which|when|where)\b", re.IGNORECASE)
+_NEGATION_RE = re.compile(r"\b(don'?t|do not|didn'?t|did not|never|shouldn'?t|should not|no need to)\b", re.IGNORECASE)
+# Questions et négations contenant un verbe d'édition ("How do I change...", "Don't change...") :
+# confiance sous le seuil, le routeur LLM tranche
+_AMBIGUOUS_CONFIDENCE = 0.5
+_EDIT_VERB_RE = re.compile(
+    r"\b(make|change|add|create|build|generate|remove|delete|replace|insert|put|use|increase|decrease|"
+    r"center|align|rename|swap|turn|update|fix|design|write|translate|give)\b",
+    re.IGNORECASE,
+)
+_WEB_NOUN_RE = re.compile(
+    r"\b(page|site|website|background|color|colour|font|header|footer|section|button|buttons|title|heading|"
+    r"image|images|form|nav|navigation|menu|layout|theme|logo|text|card|cards|link|links|sidebar|hero|grid|"
+    r"table|gallery|padding|margin|spacing|icon|icons)\b",
+    re.IGNORECASE,
+)
+
+
+def tokenize(text: str) -> list:
+    """
+    Lowercases and splits a message into word unigrams and bigrams.
+    Args:
+        text (str): The user message.
+    Returns:
+        list: Unigram and bigram features.
+    """
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+class NaiveBayesIntentModel:
+    """
+    Small multinomial Naive Bayes model over word unigrams/bigrams, trained
+    on the labeled examples in data/intent/train.jsonl.
+    """
+    def __init__(self, examples: list):
+        """
+        Train the model.
+        Args:
+            examples (list): List of {"text": str, "label": str} dicts.
+        """
+        self.labels = sorted({ex["label"] for ex in examples})
+        self.priors = {}
+        self.log_likelihoods = {}
+        self.unknown_log_likelihood = {}
+        vocabulary = set()
+        counts = {label: Counter() for label in self.labels}
+        for ex in examples:
+            features = tokenize(ex["text"])
+            counts[ex["label"]].update(features)
+            vocabulary.update(features)
+        for label in self.labels:
+            n_label = sum(1 for ex in examples if ex["label"] == label)
+            self.priors[label] = math.log(n_label / len(examples))
+            total = sum(counts[label].values()) + len(vocabulary)
+            self.log_likelihoods[label] = {
+                feature: math.log((counts[label][feature] + 1) / total) for feature in vocabulary
+            }
+            self.unknown_log_likelihood[label] = math.log(1 / total)
+
+    def predict_proba(self, text: str) -> dict:
+        """
+        Returns the posterior probability of each label for a message.
+        Args:
+            text (str): The user message.
+        Returns:
+            dict: Label -> probability.
+        """
+        features = [f for f in tokenize(text) if f in self.log_likelihoods[self.labels[0]]]
+        scores = {
+            label: self.priors[label] + sum(self.log_likelihoods[label][f] for f in features)
+            for label in self.labels
+        }
+        best = max(scores.values())
+        exp_scores = {label: math.exp(score - best) for label, score in scores.items()}
+        norm = sum(exp_scores.values())
+        return {label: value / norm for label, value in exp_scores.items()}
+
+
+def load_examples(path: str) -> list:
+    """
+    Loads labeled intent examples from a JSONL file.
+    Args:
+        path (str): Path to the JSONL file.
+    Returns:
+        list: List of {"text": str, "label": str} dicts.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_MODEL = NaiveBayesIntentModel(load_examples(TRAIN_PATH))
+_STATS = {"fast_path": 0, "llm_fallback": 0}
+
+
+def classify_intent(message: str) -> tuple:
+    """
+    Classifies a message as WRITE_CODE or RESPOND_NATURALLY without any LLM call.
+    Rules are tried first; otherwise the Naive Bayes model decides.
+    Questions and negations mentioning an edit ("How do I change the
+    background?", "Don't change the header") and short replies to a
+    proposal ("Yes please do it") are never confident enough for the
+    fast path.
+    Args:
+        message (str): The user message.
+    Returns:
+        tuple: (intent, confidence) with confidence in [0, 1].
+    """
+    text = (message or "").strip()
+    if not text:
+        return RESPOND_NATURALLY, 1.0
+    if _SMALL_TALK_RE.match(text):
+        return RESPOND_NATURALLY, 0.99
+    has_edit_verb = bool(_EDIT_VERB_RE.search(text))
+    is_question = bool(_QUESTION_RE.match(text) or _WH_QUESTION_RE.match(text))
+    if is_question and not has_edit_verb:
+        return RESPOND_NATURALLY, 0.95
+    proba = _MODEL.predict_proba(text)
+    intent = max(proba, key=proba.get)
+    if is_question or _NEGATION_RE.search(text) or _CONFIRMATION_RE.match(text):
+        return intent, min(proba[intent], _AMBIGUOUS_CONFIDENCE)
+    if has_edit_verb and _WEB_NOUN_RE.search(text):
+        return WRITE_CODE, 0.97
+    return intent, proba[intent]
+
+
+def fast_route(message: str, threshold: float = None):
+    """
+    Returns the intent when the local classifier is confident enough,
+    otherwise None so that the caller falls back to the LLM router.
+    Args:
+        message (str): The user message.
+        threshold (float): Minimum confidence, defaults to FASTPATH_THRESHOLD.
+    Returns:
+        str | None: The intent, or None when ambiguous.
+    """
+    intent, confidence = classify_intent(message)
+    path = "fast_path" if confidence >= (FASTPATH_THRESHOLD if threshold is None else threshold) else "llm_fallback"
+    if not metrics_suppressed():
+        _STATS[path] += 1
+    return intent if path == "fast_path" else None
+
+
+def get_router_stats() -> dict:
+    """
+    Returns fast-path vs. LLM fallback counters.
+    Returns:
+        dict: Router statistics.
+    """
+    return {**_STATS, "threshold": FASTPATH_THRESHOLD}
+
+
+def evaluate(examples: list, thresholds: list) -> list:
+    """
+    Evaluates the classifier on labeled examples for several thresholds.
+    Args:
+        examples (list): List of {"text": str, "label": str} dicts.
+        thresholds (list): Confidence thresholds to report.
+    Returns:
+        list: One report dict per threshold (coverage, accuracy, latency).
+    """
+    predictions = []
+    latencies = []
+    for ex in examples:
+        start = time.perf_counter()
+        intent, confidence = classify_intent(ex["text"])
+        latencies.append((time.perf_counter() - start) * 1e6)
+        predictions.append((intent, confidence, ex["label"]))
+    latencies.sort()
+    reports = []
+    for threshold in thresholds:
+        covered = [(intent, label) for intent, conf, label in predictions if conf >= threshold]
+        correct = sum(1 for intent, label in covered if intent == label)
+        reports.append({
+            "threshold": threshold,
+            "coverage": len(covered) / len(predictions),
+            "fast_path_accuracy": correct / len(covered) if covered else None,
+            "overall_accuracy": sum(1 for i, c, l in predictions if i == l) / len(predictions),
+            "latency_us_p50": latencies[len(latencies) // 2],
+            "latency_us_p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        })
+    return reports
+
+
+if __name__ == "__main__":
+    # Evaluate the fast-path router on the labeled eval set to tune the threshold
+    eval_examples = load_examples(EVAL_PATH)
+    for report in evaluate(eval_examples, [0.6, 0.7, 0.8, 0.9, 0.95, 0.99]):
+        print("==> [INFO]:", json.dumps(report))
+    for ex in eval_examples:
+        intent, confidence = classify_intent(ex["text"])
+        if intent != ex["label"]:
+            print(f"==> [MISS]: {ex['text']!r} -> {intent} ({confidence:.2f}), expected {ex['label']}")
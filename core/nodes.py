@@ -1,29 +1,99 @@
 import os
 import sys
+import time
+import inspect
+import threading
+from functools import partial
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from base.state import State
 from dotenv import load_dotenv
 from langchain.schema import HumanMessage
 from langgraph.graph import StateGraph, START
-from core.agent_tone import respond_naturally_node
-from core.code_generator import write_html_code_node
-from core.design_and_plan import design_and_plan_node
-from core.user_query_route import route_initial_user_message_node
+from langgraph.config import get_stream_writer
+from langchain_core.runnables import RunnableLambda, RunnableConfig
+from models.llm_model import override_llm
+from core.agent_tone import respond_naturally_node, arespond_naturally_node
+from core.code_generator import write_html_code_node, awrite_html_code_node
+from core.design_and_plan import design_and_plan_node, adesign_and_plan_node
+from core.user_query_route import route_initial_user_message_node, aroute_initial_user_message_node
+from core.speculation import SPECULATIVE_ROUTING, speculative_route_node, aspeculative_route_node
+from core.plan_and_generate import plan_and_write_html_node, aplan_and_write_html_node
+from utils.metrics import NODE_DURATION, suppress_metrics
 
 load_dotenv()
 
-def build_workflow():
+def _timed(node, name: str, is_async: bool):
     """
-    Constructs and compiles the workflow graph for handling user messages.
+    Wraps a node function so that it reports node_start / node_end (with its
+    duration) on the 'custom' stream (a no-op when that mode is not streamed)
+    and records its duration in the node_duration_seconds metric.
+    """
+    takes_config = "config" in inspect.signature(node).parameters
+
+    def call_args(state, config):
+        return (state, config) if takes_config else (state,)
+
+    if is_async:
+        async def timed_node(state: State, config: RunnableConfig):
+            writer = get_stream_writer()
+            writer({"event": "node_start", "node": name})
+            start = time.perf_counter()
+            try:
+                result = await node(*call_args(state, config))
+            finally:
+                duration = time.perf_counter() - start
+                NODE_DURATION.observe(duration, node=name)
+            writer({"event": "node_end", "node": name, "duration_ms": round(duration * 1000, 1)})
+            return result
+    else:
+        def timed_node(state: State, config: RunnableConfig):
+            writer = get_stream_writer()
+            writer({"event": "node_start", "node": name})
+            start = time.perf_counter()
+            try:
+                result = node(*call_args(state, config))
+            finally:
+                duration = time.perf_counter() - start
+                NODE_DURATION.observe(duration, node=name)
+            writer({"event": "node_end", "node": name, "duration_ms": round(duration * 1000, 1)})
+            return result
+    return timed_node
+
+def dual_node(sync_node, async_node, name: str) -> RunnableLambda:
+    """
+    Wraps a sync/async pair of node functions into a single runnable, so the
+    same compiled graph serves graph.invoke/stream (sync) and
+    graph.ainvoke/astream (async) without blocking the event loop.
+    Both report their start and end (with timings) on the 'custom' stream.
+    Args:
+        sync_node: Node function used by the sync execution path.
+        async_node: Coroutine node function used by the async execution path.
+        name (str): Name of the node.
     Returns:
-        StateGraph: The compiled workflow graph.
+        RunnableLambda: Runnable dispatching to the matching implementation.
+    """
+    return RunnableLambda(_timed(sync_node, name, False), afunc=_timed(async_node, name, True), name=name)
+
+def chat_graph_builder(speculative: bool = SPECULATIVE_ROUTING) -> StateGraph:
+    """
+    Constructs the (uncompiled) workflow graph for handling user messages.
+    Args:
+        speculative (bool): Start the planner in parallel with the LLM router;
+            when the router confirms the code path the graph skips straight to
+            write_html_code, otherwise the planner call is cancelled.
+    Returns:
+        StateGraph: The graph builder.
     """
     graph_builder = StateGraph(State)
     # Add nodes for each workflow step
-    graph_builder.add_node("route_initial_user_message", route_initial_user_message_node)
-    graph_builder.add_node("respond_naturally", respond_naturally_node)
-    graph_builder.add_node("design_and_plan", design_and_plan_node)
-    graph_builder.add_node("write_html_code", write_html_code_node)
+    if speculative:
+        route_node = dual_node(speculative_route_node, aspeculative_route_node, "route_initial_user_message")
+    else:
+        route_node = dual_node(route_initial_user_message_node, aroute_initial_user_message_node, "route_initial_user_message")
+    graph_builder.add_node("route_initial_user_message", route_node)
+    graph_builder.add_node("respond_naturally", dual_node(respond_naturally_node, arespond_naturally_node, "respond_naturally"))
+    graph_builder.add_node("design_and_plan", dual_node(design_and_plan_node, adesign_and_plan_node, "design_and_plan"))
+    graph_builder.add_node("write_html_code", dual_node(write_html_code_node, awrite_html_code_node, "write_html_code"))
     # Define edges between nodes
     graph_builder.add_edge(START, "route_initial_user_message")
     graph_builder.add_conditional_edges(
@@ -32,12 +102,143 @@ def build_workflow():
         {
             "respond_naturally": "respond_naturally",
             "design_and_plan": "design_and_plan",
+            # Plan déjà produit par la spéculation
+            "write_html_code": "write_html_code",
         }
     )
     graph_builder.add_edge("design_and_plan", "write_html_code")
-    graph = graph_builder.compile()
+    return graph_builder
+
+def fused_graph_builder() -> StateGraph:
+    """
+    Constructs the (uncompiled) fused workflow graph: the code path plans and
+    writes the page in a single LLM call (plan_and_write_html) instead of
+    design_and_plan followed by write_html_code.
+    Returns:
+        StateGraph: The graph builder.
+    """
+    graph_builder = StateGraph(State)
+    graph_builder.add_node("route_initial_user_message", dual_node(route_initial_user_message_node, aroute_initial_user_message_node, "route_initial_user_message"))
+    graph_builder.add_node("respond_naturally", dual_node(respond_naturally_node, arespond_naturally_node, "respond_naturally"))
+    graph_builder.add_node("plan_and_write_html", dual_node(plan_and_write_html_node, aplan_and_write_html_node, "plan_and_write_html"))
+    graph_builder.add_edge(START, "route_initial_user_message")
+    graph_builder.add_conditional_edges(
+        "route_initial_user_message",
+        lambda x: x["next"],
+        {
+            "respond_naturally": "respond_naturally",
+            "design_and_plan": "plan_and_write_html",
+        }
+    )
+    return graph_builder
+
+def build_workflow():
+    """
+    Constructs and compiles the workflow graph for handling user messages.
+    Returns:
+        StateGraph: The compiled workflow graph.
+    """
+    graph = chat_graph_builder().compile()
     return graph
 
+def build_speculative_workflow():
+    """
+    Constructs and compiles the workflow graph with speculative planning enabled.
+    Returns:
+        StateGraph: The compiled workflow graph.
+    """
+    return chat_graph_builder(speculative=True).compile()
+
+def build_fused_workflow():
+    """
+    Constructs and compiles the fused plan+generate workflow graph.
+    Returns:
+        StateGraph: The compiled workflow graph.
+    """
+    return fused_graph_builder().compile()
+
+# Variantes de graphe disponibles (les noms suivent langgraph.json)
+WORKFLOW_BUILDERS = {
+    "chat": chat_graph_builder,
+    "chat_speculative": partial(chat_graph_builder, speculative=True),
+    "chat_fused": fused_graph_builder,
+}
+DEFAULT_WORKFLOW = os.getenv("DEFAULT_WORKFLOW", "chat")
+
+# Graphes compilés une seule fois par processus, partagés entre les requêtes
+_COMPILED_WORKFLOWS = {}
+_COMPILE_LOCK = threading.Lock()
+# Checkpointer partagé par les graphes compilés (état par session / thread_id)
+_CHECKPOINTER = {}
+# Graphes déjà préchauffés (hérités par les workers forkés après le préchauffage)
+_WARMED_WORKFLOWS = set()
+
+def configure_checkpointer(checkpointer) -> None:
+    """
+    Sets the checkpointer used to compile workflow graphs. Graphs compiled
+    with a checkpointer keep per-session state keyed by the config's thread_id.
+    Already compiled graphs are rebound to the new checkpointer without being
+    recompiled (graphs compiled before a worker fork stay warm).
+    Args:
+        checkpointer: LangGraph checkpoint saver, or None to disable.
+    """
+    with _COMPILE_LOCK:
+        _CHECKPOINTER["default"] = checkpointer
+        for name, graph in list(_COMPILED_WORKFLOWS.items()):
+            _COMPILED_WORKFLOWS[name] = graph.copy(update={"checkpointer": checkpointer})
+
+def get_workflow(name: str = DEFAULT_WORKFLOW):
+    """
+    Returns the compiled workflow graph registered under the given name.
+    The graph is compiled on first use and reused afterwards; compiled graphs
+    hold no per-run state, so the same instance serves concurrent requests.
+    Args:
+        name (str): Graph variant name (see WORKFLOW_BUILDERS / langgraph.json).
+    Returns:
+        CompiledStateGraph: The compiled workflow graph.
+    Raises:
+        KeyError: If no graph variant is registered under this name.
+    """
+    graph = _COMPILED_WORKFLOWS.get(name)
+    if graph is not None:
+        return graph
+    if name not in WORKFLOW_BUILDERS:
+        raise KeyError(f"Unknown workflow '{name}'. Available: {', '.join(WORKFLOW_BUILDERS)}")
+    with _COMPILE_LOCK:
+        if name not in _COMPILED_WORKFLOWS:
+            _COMPILED_WORKFLOWS[name] = WORKFLOW_BUILDERS[name]().compile(
+                checkpointer=_CHECKPOINTER.get("default")
+            )
+        return _COMPILED_WORKFLOWS[name]
+
+async def warm_up_workflow(name: str = DEFAULT_WORKFLOW) -> None:
+    """
+    Runs the compiled graph once against a stub LLM so that lazy imports and
+    first-run code paths of the async execution path used by the server are
+    exercised before the first real request.
+    The stub routes to the natural-response branch, so no page is written,
+    and the run is kept out of the metrics and runtime stats.
+    A graph is warmed up once per process tree: workers forked after the
+    warm-up skip it.
+    Args:
+        name (str): Graph variant name to warm up.
+    """
+    if name in _WARMED_WORKFLOWS:
+        return
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    graph = get_workflow(name)
+    stub_llm = FakeListChatModel(responses=["RESPOND_NATURALLY", "Warm-up complete."])
+    config = {"configurable": {"thread_id": "__warmup__"}}
+    with override_llm(stub_llm), suppress_metrics():
+        await graph.ainvoke({
+            "messages": [HumanMessage(content="Hello")],
+            "initial_user_message": "Hello",
+            "existing_html_content": ""
+        }, config)
+    if graph.checkpointer:
+        await graph.checkpointer.adelete_thread("__warmup__")
+    _WARMED_WORKFLOWS.add(name)
+
 # Only run this code when the file is executed directly
 if __name__ == "__main__":
     graph = build_workflow()
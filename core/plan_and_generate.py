@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from base.state import State
+from base.base_agent import BaseAgent
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+from models.prompt_registry import register_local_prompt
+from core.code_generator import record_edit, page_update_message
+from utils.html_extractor import extract_html_only
+from utils.plan_splitter import split_plan_and_html
+from utils.session import get_run_page_store
+from utils.run_control import write_run_page
+
+register_local_prompt("local/plan_and_generate", ChatPromptTemplate.from_messages([
+    ("system",
+     "You are a web designer and front-end developer. For the user's request, first write a short "
+     "design plan (layout, sections, colors, interactions) between <plan> and </plan>, then the "
+     "complete HTML document (inline CSS and JavaScript) in a single ```html code block. "
+     "Write nothing after the code block."),
+    ("human",
+     "User request:\n{user_message}\n\n"
+     "Current page (empty for a new page):\n{existing_html_content}"),
+]))
+
+
+class PlanAndGenerateHtml(BaseAgent):
+    """
+    Agent that designs and writes the page in a single completion:
+    "<plan>...</plan>" followed by the HTML document.
+    """
+    profile = "plan_and_generate"
+    # Même demande sur la même page : réponse réutilisable, mise en cache
+    cache_responses = True
+    # Plan + page complète en une seule complétion
+    estimated_output_tokens = 3500
+
+    def __init__(self):
+        super().__init__("Plan And Generate Html Agent", "An agent that plans and writes HTML code in one call.")
+
+    def run(self, user_message: str, existing_html_content: str) -> str:
+        """
+        Generates the design plan and the HTML document.
+        Args:
+            user_message (str): The user's input message.
+            existing_html_content (str): The current HTML content to consider.
+        Returns:
+            str: The raw model output (plan block then HTML code block).
+        """
+        prompt = self.load_prompt("local/plan_and_generate")
+        prompt_value = prompt.invoke({"user_message": user_message, "existing_html_content": existing_html_content})
+        return self.invoke(prompt_value).content
+
+    async def arun(self, user_message: str, existing_html_content: str) -> str:
+        """
+        Async version of run, awaiting the LLM instead of blocking the event loop.
+        Args:
+            user_message (str): The user's input message.
+            existing_html_content (str): The current HTML content to consider.
+        Returns:
+            str: The raw model output (plan block then HTML code block).
+        """
+        prompt = await self.aload_prompt("local/plan_and_generate")
+        prompt_value = await prompt.ainvoke({"user_message": user_message, "existing_html_content": existing_html_content})
+        return (await self.ainvoke(prompt_value)).content
+
+
+def _fused_update(output: str) -> State:
+    design_plan, html_part = split_plan_and_html(output)
+    html = extract_html_only(html_part)
+    return {
+        "design_plan": design_plan,
+        "final_html_content": html,
+        "existing_html_content": html,
+    }
+
+
+def plan_and_write_html_node(state: State, config: RunnableConfig = None) -> State:
+    """
+    Node function of the fused graph variant: plans and writes the page in one
+    LLM call, splits the output into design_plan and final_html_content, and
+    writes the page to the session's store. Existing pages are regenerated
+    in full (no patch mode in this variant).
+    Args:
+        state (State): The current workflow state.
+        config (RunnableConfig): Run config carrying the session thread_id.
+    Returns:
+        State: Updated state with the design plan, the final HTML content and message.
+    """
+    start = time.perf_counter()
+    output = PlanAndGenerateHtml().run(state.get("initial_user_message", ""), state.get("existing_html_content", ""))
+    record_edit("fused", output, time.perf_counter() - start)
+    update = _fused_update(output)
+    version = write_run_page(get_run_page_store(config), update["final_html_content"])
+    update["messages"] = state.get("messages", []) + [page_update_message(version)]
+    return update
+
+
+async def aplan_and_write_html_node(state: State, config: RunnableConfig = None) -> State:
+    """
+    Async node function used by graph.astream / graph.ainvoke.
+    Args:
+        state (State): The current workflow state.
+        config (RunnableConfig): Run config carrying the session thread_id.
+    Returns:
+        State: Updated state with the design plan, the final HTML content and message.
+    """
+    start = time.perf_counter()
+    output = await PlanAndGenerateHtml().arun(state.get("initial_user_message", ""), state.get("existing_html_content", ""))
+    record_edit("fused", output, time.perf_counter() - start)
+    update = _fused_update(output)
+    page_store = get_run_page_store(config)
+    version = await asyncio.to_thread(write_run_page, page_store, update["final_html_content"])
+    update["messages"] = state.get("messages", []) + [page_update_message(version)]
+    return update
+
+
+if __name__ == "__main__":
+    agent = PlanAndGenerateHtml()
+    print("==> [INFO]:", agent.run("Generate a minimal personal site with About, Projects, and Contact sections.", ""))
@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from base.state import State
+from langchain_core.messages import get_buffer_string
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.runnables.config import merge_configs
+from core.intent_classifier import fast_route
+from core.design_and_plan import design_and_plan_node, adesign_and_plan_node
+from core.user_query_route import INTENT_TO_NEXT, llm_route, allm_route
+from utils.token_count import count_tokens
+
+# Mode spéculatif opt-in : le planificateur démarre en même temps que le routeur LLM
+SPECULATIVE_ROUTING = os.getenv("SPECULATIVE_ROUTING", "0") == "1"
+
+_STATS_LOCK = threading.Lock()
+_STATS = {
+    "speculations": 0,
+    "hits": 0,
+    "misses": 0,
+    "latency_saved_seconds": 0.0,
+    "tokens_wasted": 0,
+}
+
+
+class _TokenCounter(AsyncCallbackHandler):
+    """
+    Counts the prompt and completion tokens of the speculative planner call,
+    so that a cancelled or discarded plan can be reported as wasted tokens.
+    """
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._streamed = False
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.prompt_tokens += sum(count_tokens(get_buffer_string(batch)) for batch in messages)
+
+    async def on_llm_new_token(self, token, **kwargs):
+        self._streamed = True
+        self.completion_tokens += 1
+
+    async def on_llm_end(self, response, **kwargs):
+        if not self._streamed:
+            self.completion_tokens += sum(
+                count_tokens(generation.text) for generations in response.generations for generation in generations
+            )
+
+    @property
+    def total(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def _record(**deltas) -> None:
+    with _STATS_LOCK:
+        for key, value in deltas.items():
+            _STATS[key] += value
+
+
+def get_speculation_stats() -> dict:
+    """
+    Returns speculative routing counters: hits (plan committed), misses
+    (plan cancelled), latency saved and tokens wasted.
+    Returns:
+        dict: Speculation statistics.
+    """
+    with _STATS_LOCK:
+        return {**_STATS, "enabled": SPECULATIVE_ROUTING}
+
+
+def speculative_route_node(state: State) -> State:
+    """
+    Sync counterpart of aspeculative_route_node: routes, then plans inline
+    when the router picks the code path (no speculation on the sync path).
+    Args:
+        state (State): The current workflow state.
+    Returns:
+        State: Updated state with the next step (and the design plan when committed).
+    """
+    fast_intent = fast_route((state.get("initial_user_message") or "").strip())
+    next_step = INTENT_TO_NEXT[fast_intent] if fast_intent is not None else llm_route(state)
+    if next_step != "design_and_plan":
+        return {"next": next_step}
+    return {**design_and_plan_node(state), "next": "write_html_code"}
+
+
+async def aspeculative_route_node(state: State, config: RunnableConfig) -> State:
+    """
+    Routes the message while the planner runs speculatively in parallel.
+    When the router picks the code path the plan is committed and the graph
+    goes straight to write_html_code; otherwise the in-flight planner call is
+    cancelled. Messages resolved by the local fast path are not speculated on.
+    The speculative planner is tagged 'nostream' so that a discarded plan
+    never reaches the client.
+    Args:
+        state (State): The current workflow state.
+        config (RunnableConfig): Run config of the node.
+    Returns:
+        State: Updated state with the next step (and the design plan when committed).
+    """
+    fast_intent = fast_route((state.get("initial_user_message") or "").strip())
+    if fast_intent is not None:
+        return {"next": INTENT_TO_NEXT[fast_intent]}
+
+    counter = _TokenCounter()
+    plan_config = merge_configs(config, {"tags": ["nostream"], "callbacks": [counter], "run_name": "speculative_design_and_plan"})
+    plan_timing = {}
+
+    async def plan():
+        plan_start = time.perf_counter()
+        result = await RunnableLambda(adesign_and_plan_node).ainvoke(state, plan_config)
+        plan_timing["seconds"] = time.perf_counter() - plan_start
+        return result
+
+    start = time.perf_counter()
+    plan_task = asyncio.create_task(plan())
+    try:
+        next_step = await allm_route(state)
+        router_seconds = time.perf_counter() - start
+    except BaseException:
+        plan_task.cancel()
+        # Récupère l'issue du plan (annulation ou erreur) pour qu'elle ne soit pas journalisée comme perdue
+        await asyncio.gather(plan_task, return_exceptions=True)
+        raise
+    if next_step != "design_and_plan":
+        plan_task.cancel()
+        # Le plan a pu échouer avant l'annulation (surcharge, échéance...) : personne ne l'attend, l'erreur est ignorée
+        await asyncio.gather(plan_task, return_exceptions=True)
+        _record(speculations=1, misses=1, tokens_wasted=counter.total)
+        return {"next": next_step}
+    result = await plan_task
+    # Séquentiel : routeur puis planificateur ; spéculatif : le plus long des deux
+    saved = router_seconds + plan_timing["seconds"] - (time.perf_counter() - start)
+    _record(speculations=1, hits=1, latency_saved_seconds=max(saved, 0.0))
+    return {**result, "next": "write_html_code"}
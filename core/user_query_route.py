@@ -2,12 +2,13 @@
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from langchain import hub
+from typing import Literal
+from pydantic import BaseModel, Field
 from base.state import State
 from base.base_agent import BaseAgent
-
-# Cache du prompt (évite de tirer le hub à chaque requête)
-_PROMPT_DETERMINE_INTENT = hub.pull("dev-assistant/determine_user_intent")
+from models.llm_model import get_llm_key
+from core.intent_classifier import fast_route
+from utils.page_outline import page_context_for
 
 # Mapping des intents normalisés -> next step
 INTENT_TO_NEXT = {
@@ -15,31 +16,120 @@ INTENT_TO_NEXT = {
     "RESPOND_NATURALLY": "respond_naturally",
 }
 
+class RouterDecision(BaseModel):
+    """
+    Intent of the user's message.
+    """
+    intent: Literal["WRITE_CODE", "RESPOND_NATURALLY"] = Field(
+        description="WRITE_CODE to create or modify the web page, RESPOND_NATURALLY for anything else"
+    )
+
+# Sortie structurée par configuration de modèle (clé du registre get_llm), construite une fois
+_STRUCTURED_LLMS = {}
+
 class RouteInitialUserMessage(BaseAgent):
     """
     Agent that routes the initial user message to the appropriate next agent based on intent.
+    With a structured_output profile the model must answer through an enum-only
+    function call (see RouterDecision) instead of free text.
     """
+    profile = "router"
+    # Même demande sur la même page : réponse réutilisable, mise en cache
+    cache_responses = True
+    # Quelques tokens seulement : voie prioritaire de l'admission
+    priority = "high"
+    estimated_output_tokens = 15
+
     def __init__(self):
         super().__init__(
             "Route Initial User Message Agent",
             "An agent that routes the initial user message to the appropriate agent."
         )
+        self.structured_llm = self._structured_llm() if self.model_profile["structured_output"] else None
+
+    def _structured_llm(self):
+        key = get_llm_key(self.llm)
+        cached = _STRUCTURED_LLMS.get(key)
+        # Instance recréée pour la même configuration (registre vidé après un fork) : reconstruite
+        if cached is not None and cached[0] is self.llm:
+            return cached[1]
+        try:
+            structured = self.llm.with_structured_output(RouterDecision, method="function_calling", include_raw=True)
+        except NotImplementedError:
+            # Modèle sans appel de fonctions (ex: modèle factice) : réponse texte normalisée
+            structured = None
+        if key is not None:
+            # LLM hors registre (stub du warm-up) : jamais mis en cache, il ne serait jamais libéré
+            _STRUCTURED_LLMS[key] = (self.llm, structured)
+        return structured
+
+    @staticmethod
+    def _intent(response) -> str:
+        if isinstance(response, dict):
+            if response.get("parsed") is not None:
+                return response["parsed"].intent
+            response = response["raw"]  # Réponse en texte libre malgré la contrainte
+        return getattr(response, "content", str(response)).strip()
 
     def run(self, user_message: str, existing_html_content: str) -> str:
         """
-        Determines the intent of the user message using a prompt from the LangChain hub.
+        Determines the intent of the user message using a prompt from the prompt registry.
         Args:
             user_message (str): The user's input message.
             existing_html_content (str): The current HTML content to consider.
         Returns:
             str: The normalized intent string.
         """
-        prompt_value = _PROMPT_DETERMINE_INTENT.invoke({
+        prompt = self.load_prompt("dev-assistant/determine_user_intent")
+        prompt_value = prompt.invoke({
             "user_message": user_message,
             "existing_html_content": existing_html_content or ""
         })
-        msg = self.invoke(prompt_value)
-        return getattr(msg, "content", str(msg)).strip()
+        return self._intent(self.invoke(prompt_value, llm=self.structured_llm))
+
+    async def arun(self, user_message: str, existing_html_content: str) -> str:
+        """
+        Async version of run, awaiting the LLM instead of blocking the event loop.
+        Args:
+            user_message (str): The user's input message.
+            existing_html_content (str): The current HTML content to consider.
+        Returns:
+            str: The normalized intent string.
+        """
+        prompt = await self.aload_prompt("dev-assistant/determine_user_intent")
+        prompt_value = await prompt.ainvoke({
+            "user_message": user_message,
+            "existing_html_content": existing_html_content or ""
+        })
+        return self._intent(await self.ainvoke(prompt_value, llm=self.structured_llm))
+
+def _next_step(raw_intent: str) -> str:
+    norm_intent = raw_intent.strip().upper().replace("-", "_")
+    return INTENT_TO_NEXT.get(norm_intent, "respond_naturally")
+
+def llm_route(state: State) -> str:
+    """
+    Asks the LLM router for the next step (no fast path).
+    Args:
+        state (State): The current workflow state.
+    Returns:
+        str: The next node name.
+    """
+    agent = RouteInitialUserMessage()
+    existing_html = page_context_for("route_initial_user_message", state.get("existing_html_content"))
+    return _next_step(agent.run((state.get("initial_user_message") or "").strip(), existing_html))
+
+async def allm_route(state: State) -> str:
+    """
+    Async version of llm_route.
+    Args:
+        state (State): The current workflow state.
+    Returns:
+        str: The next node name.
+    """
+    agent = RouteInitialUserMessage()
+    existing_html = page_context_for("route_initial_user_message", state.get("existing_html_content"))
+    return _next_step(await agent.arun((state.get("initial_user_message") or "").strip(), existing_html))
 
 def route_initial_user_message_node(state: State) -> State:
     """
@@ -49,13 +139,27 @@ def route_initial_user_message_node(state: State) -> State:
     Returns:
         State: Updated state with the next step.
     """
-    agent = RouteInitialUserMessage()
     user_msg = (state.get("initial_user_message") or "").strip()
-    existing_html = state.get("existing_html_content") or ""
-    raw_intent = agent.run(user_msg, existing_html)
-    norm_intent = raw_intent.strip().upper().replace("-", "_")
-    next_step = INTENT_TO_NEXT.get(norm_intent, "respond_naturally")
-    return {"next": next_step}
+    # Fast path : classifieur local, le LLM n'est appelé que si le message est ambigu
+    fast_intent = fast_route(user_msg)
+    if fast_intent is not None:
+        return {"next": INTENT_TO_NEXT[fast_intent]}
+    return {"next": llm_route(state)}
+
+async def aroute_initial_user_message_node(state: State) -> State:
+    """
+    Async node function used by graph.astream / graph.ainvoke.
+    Args:
+        state (State): The current workflow state.
+    Returns:
+        State: Updated state with the next step.
+    """
+    user_msg = (state.get("initial_user_message") or "").strip()
+    # Fast path : classifieur local, le LLM n'est appelé que si le message est ambigu
+    fast_intent = fast_route(user_msg)
+    if fast_intent is not None:
+        return {"next": INTENT_TO_NEXT[fast_intent]}
+    return {"next": await allm_route(state)}
 
 if __name__ == "__main__":
     agent = RouteInitialUserMessage()
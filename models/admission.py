@@ -0,0 +1,410 @@
+import os
+import sys
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.resilience import REQUEST_DEADLINE_SECONDS
+
+# Contrôle d'admission des appels sortants vers l'API OpenAI (par modèle)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+# Places réservées à la voie prioritaire (routeur, réponses naturelles) parmi ADMISSION_MAX_CONCURRENCY
+ADMISSION_PRIORITY_SLOTS = int(os.getenv("ADMISSION_PRIORITY_SLOTS", "2"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+# Attente maximale dans la file ; 0 = jusqu'à l'échéance de la requête (une génération de page tient une place 30-60 s)
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "0"))
+# Budget de tokens (prompt + complétion) par minute et par modèle, 0 = illimité
+ADMISSION_TOKENS_PER_MINUTE = int(os.getenv("ADMISSION_TOKENS_PER_MINUTE", "0"))
+
+PRIORITIES = {"high": 0, "normal": 1}
+# Nombre de temps d'attente conservés pour les percentiles
+_WAIT_SAMPLES = 1000
+
+
+class AdmissionRejectedError(RuntimeError):
+    """
+    Raised when an LLM call cannot be admitted: the model's queue is full or
+    the call waited longer than the queue timeout (by default, until the
+    request deadline).
+    """
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    """
+    A pending or admitted call. The caller sets actual_tokens once the
+    response is known so that the token bucket charge is corrected.
+    """
+    __slots__ = ("priority", "cost", "enqueued_at", "granted", "actual_tokens", "_loop", "_event")
+
+    def __init__(self, priority: int, cost: int, loop=None):
+        self.priority = priority
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.actual_tokens = None
+        self._loop = loop
+        self._event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self) -> None:
+        # Réveil possible depuis un autre thread (appel sync libérant une place)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._event.set)
+        else:
+            self._event.set()
+
+
+class ModelAdmission:
+    """
+    Admission layer of one model: a bounded priority queue in front of a
+    concurrency limit and a token bucket refilled continuously at
+    tokens_per_minute. High-priority calls are always served first and may use
+    the reserved slots, so short router/natural replies never wait behind long
+    HTML generations. Works for both sync (worker threads) and async callers.
+    """
+    def __init__(
+        self,
+        model: str,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        priority_slots: int = ADMISSION_PRIORITY_SLOTS,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        tokens_per_minute: int = ADMISSION_TOKENS_PER_MINUTE,
+    ):
+        """
+        Args:
+            model (str): Model name.
+            max_concurrency (int): Maximum in-flight calls.
+            priority_slots (int): Slots only high-priority calls may use.
+            max_queue (int): Maximum waiting calls before rejecting.
+            queue_timeout (float): Maximum wait in the queue (seconds), 0 = until the call's deadline.
+            tokens_per_minute (int): Token budget per minute, 0 = unlimited.
+        """
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.normal_concurrency = max(1, self.max_concurrency - max(0, priority_slots))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.capacity = float(tokens_per_minute)
+        self.refill_rate = tokens_per_minute / 60
+        self._tokens = self.capacity
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._waits = deque(maxlen=_WAIT_SAMPLES)
+        self._counters = {"admitted": 0, "rejected": 0, "timeouts": 0, "tokens_charged": 0}
+
+    def _refill(self) -> None:
+        if not self.capacity:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.refill_rate)
+        self._refilled_at = now
+
+    def _charge(self, ticket: _Ticket) -> int:
+        # Un appel plus gros que le seau entier passe quand le seau est plein
+        return min(ticket.cost, int(self.capacity)) if self.capacity else 0
+
+    def _grant_locked(self) -> None:
+        self._refill()
+        while self._queue:
+            priority, _, ticket = self._queue[0]
+            limit = self.max_concurrency if priority == PRIORITIES["high"] else self.normal_concurrency
+            if self._in_flight >= limit:
+                break
+            charge = self._charge(ticket)
+            if charge > self._tokens:
+                break
+            heapq.heappop(self._queue)
+            self._tokens -= charge
+            self._in_flight += 1
+            self._counters["admitted"] += 1
+            self._counters["tokens_charged"] += charge
+            self._waits.append(time.monotonic() - ticket.enqueued_at)
+            ticket.granted = True
+            ticket.wake()
+
+    def _refill_eta(self) -> float:
+        """
+        Seconds before the bucket can admit the head of the queue (polling
+        interval of the waiters, since refills do not wake anyone).
+        """
+        with self._lock:
+            if not self.capacity or not self._queue:
+                return math.inf
+            missing = self._charge(self._queue[0][2]) - self._tokens
+            return max(0.01, missing / self.refill_rate) if missing > 0 else 0.01
+
+    def _enqueue(self, priority: str, estimated_tokens: int, loop=None) -> _Ticket:
+        ticket = _Ticket(PRIORITIES.get(priority, PRIORITIES["normal"]), max(0, int(estimated_tokens)), loop)
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self._counters["rejected"] += 1
+                raise AdmissionRejectedError(
+                    f"Model '{self.model}' is overloaded ({len(self._queue)} calls queued)",
+                    retry_after=self._retry_after_locked(),
+                )
+            heapq.heappush(self._queue, (ticket.priority, next(self._seq), ticket))
+            self._grant_locked()
+        return ticket
+
+    def _retry_after_locked(self) -> float:
+        waits = sorted(self._waits)
+        return round(max(1.0, waits[len(waits) // 2] if waits else 1.0), 1)
+
+    def _abandon(self, ticket: _Ticket, timed_out: bool) -> None:
+        with self._lock:
+            if ticket.granted:
+                # Admis entre-temps : la place est rendue
+                self._release_locked(ticket)
+                return
+            self._queue = [entry for entry in self._queue if entry[2] is not ticket]
+            heapq.heapify(self._queue)
+            if timed_out:
+                self._counters["timeouts"] += 1
+            self._grant_locked()
+
+    def _wait_until(self, ticket: _Ticket, deadline) -> float:
+        """
+        Monotonic time at which a queued call gives up: the queue timeout when
+        set, bounded by the call's deadline (epoch seconds) when it has one.
+        """
+        limits = []
+        if self.queue_timeout > 0:
+            limits.append(ticket.enqueued_at + self.queue_timeout)
+        if deadline is not None:
+            limits.append(time.monotonic() + deadline - time.time())
+        # Appel sans échéance (hors /chat-message) : attente bornée par l'échéance par défaut
+        return min(limits) if limits else ticket.enqueued_at + REQUEST_DEADLINE_SECONDS
+
+    def _timeout_error(self, ticket: _Ticket) -> AdmissionRejectedError:
+        with self._lock:
+            retry_after = self._retry_after_locked()
+        return AdmissionRejectedError(
+            f"Model '{self.model}' is overloaded (queued for {time.monotonic() - ticket.enqueued_at:.1f}s)",
+            retry_after=retry_after,
+        )
+
+    def acquire(self, priority: str, estimated_tokens: int, deadline: float = None) -> _Ticket:
+        """
+        Waits (blocking the current thread) until the call is admitted.
+        Args:
+            priority (str): 'high' or 'normal'.
+            estimated_tokens (int): Estimated prompt + completion tokens.
+            deadline (float): Deadline of the call (epoch seconds), bounding the wait.
+        Returns:
+            _Ticket: The admission ticket, to pass to release().
+        Raises:
+            AdmissionRejectedError: Queue full or queue timeout exceeded.
+        """
+        ticket = self._enqueue(priority, estimated_tokens)
+        give_up_at = self._wait_until(ticket, deadline)
+        try:
+            while not ticket.granted:
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    self._abandon(ticket, timed_out=True)
+                    if ticket.granted:
+                        break
+                    raise self._timeout_error(ticket)
+                ticket._event.wait(min(remaining, self._refill_eta()))
+                with self._lock:
+                    self._grant_locked()
+        except AdmissionRejectedError:
+            raise
+        except BaseException:
+            self._abandon(ticket, timed_out=False)
+            raise
+        return ticket
+
+    async def aacquire(self, priority: str, estimated_tokens: int, deadline: float = None) -> _Ticket:
+        """
+        Async version of acquire; a cancelled waiter leaves the queue.
+        Args:
+            priority (str): 'high' or 'normal'.
+            estimated_tokens (int): Estimated prompt + completion tokens.
+            deadline (float): Deadline of the call (epoch seconds), bounding the wait.
+        Returns:
+            _Ticket: The admission ticket, to pass to release().
+        Raises:
+            AdmissionRejectedError: Queue full or queue timeout exceeded.
+        """
+        ticket = self._enqueue(priority, estimated_tokens, asyncio.get_running_loop())
+        give_up_at = self._wait_until(ticket, deadline)
+        try:
+            while not ticket.granted:
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    self._abandon(ticket, timed_out=True)
+                    if ticket.granted:
+                        break
+                    raise self._timeout_error(ticket)
+                try:
+                    await asyncio.wait_for(ticket._event.wait(), timeout=min(remaining, self._refill_eta()))
+                except asyncio.TimeoutError:
+                    pass
+                with self._lock:
+                    self._grant_locked()
+        except AdmissionRejectedError:
+            raise
+        except BaseException:
+            self._abandon(ticket, timed_out=False)
+            raise
+        return ticket
+
+    def _release_locked(self, ticket: _Ticket) -> None:
+        self._in_flight -= 1
+        if self.capacity and ticket.actual_tokens is not None:
+            # Correction de l'estimation : remboursement ou dette (seau négatif)
+            delta = self._charge(ticket) - ticket.actual_tokens
+            self._tokens = min(self.capacity, self._tokens + delta)
+            self._counters["tokens_charged"] -= delta
+        self._grant_locked()
+
+    def release(self, ticket: _Ticket) -> None:
+        """
+        Frees the call's slot and settles its token charge.
+        Args:
+            ticket (_Ticket): Ticket returned by acquire/aacquire.
+        """
+        with self._lock:
+            self._release_locked(ticket)
+
+    @property
+    def overloaded(self) -> bool:
+        """
+        True when a new call would be rejected right away.
+        """
+        with self._lock:
+            return len(self._queue) >= self.max_queue
+
+    def get_stats(self) -> dict:
+        """
+        Returns the queue depth, in-flight calls, bucket level and wait times.
+        """
+        with self._lock:
+            self._refill()
+            waits = sorted(self._waits)
+            queued = {name: 0 for name in PRIORITIES}
+            for priority, _, _ in self._queue:
+                queued[next(name for name, value in PRIORITIES.items() if value == priority)] += 1
+
+            def percentile(p):
+                return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 1) if waits else 0.0
+
+            return {
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._queue),
+                "queued": queued,
+                "max_concurrency": self.max_concurrency,
+                "priority_slots": self.max_concurrency - self.normal_concurrency,
+                "max_queue": self.max_queue,
+                "tokens_per_minute": int(self.capacity),
+                "tokens_available": round(self._tokens) if self.capacity else None,
+                "wait_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+                **self._counters,
+            }
+
+
+_ADMISSIONS = {}
+_ADMISSIONS_LOCK = threading.Lock()
+
+
+def _reset_after_fork() -> None:
+    # Files d'attente liées à la boucle du processus parent (warm-up) : chaque worker a les siennes
+    _ADMISSIONS.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_model_admission(model: str) -> ModelAdmission:
+    """
+    Returns the admission layer of a model, creating it on first use.
+    Args:
+        model (str): Model name.
+    Returns:
+        ModelAdmission: The model's admission layer.
+    """
+    with _ADMISSIONS_LOCK:
+        if model not in _ADMISSIONS:
+            _ADMISSIONS[model] = ModelAdmission(model)
+        return _ADMISSIONS[model]
+
+
+@contextmanager
+def admit(model: str, priority: str, estimated_tokens: int, deadline: float = None):
+    """
+    Context manager holding an admission slot for one LLM call.
+    Args:
+        model (str): Model name.
+        priority (str): 'high' or 'normal'.
+        estimated_tokens (int): Estimated prompt + completion tokens.
+        deadline (float): Request deadline (epoch seconds) bounding the queue wait.
+    Yields:
+        _Ticket: Set its actual_tokens to settle the token charge (None when admission is disabled).
+    """
+    if not ADMISSION_ENABLED:
+        yield None
+        return
+    admission = get_model_admission(model)
+    ticket = admission.acquire(priority, estimated_tokens, deadline)
+    try:
+        yield ticket
+    finally:
+        admission.release(ticket)
+
+
+@asynccontextmanager
+async def aadmit(model: str, priority: str, estimated_tokens: int, deadline: float = None):
+    """
+    Async version of admit.
+    """
+    if not ADMISSION_ENABLED:
+        yield None
+        return
+    admission = get_model_admission(model)
+    ticket = await admission.aacquire(priority, estimated_tokens, deadline)
+    try:
+        yield ticket
+    finally:
+        admission.release(ticket)
+
+
+def admission_overloaded(models) -> bool:
+    """
+    True when the queue of one of the given models is full: a new request
+    calling them should be shed with a 503. The queues of the other models
+    do not matter (a full HTML writer queue must not reject replies served
+    by the router's model).
+    Args:
+        models (Iterable[str]): Models the request will call.
+    Returns:
+        bool: Whether the request should be shed.
+    """
+    if not ADMISSION_ENABLED:
+        return False
+    with _ADMISSIONS_LOCK:
+        admissions = [_ADMISSIONS[model] for model in set(models) if model in _ADMISSIONS]
+    return any(admission.overloaded for admission in admissions)
+
+
+def get_admission_stats() -> dict:
+    """
+    Returns the admission statistics of every model.
+    Returns:
+        dict: Per-model queue depth, wait times and counters.
+    """
+    with _ADMISSIONS_LOCK:
+        admissions = dict(_ADMISSIONS)
+    return {"enabled": ADMISSION_ENABLED, "models": {name: a.get_stats() for name, a in admissions.items()}}
@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Profils de modèle par agent (modèle, température, max_tokens, timeout, streaming, sortie structurée)
+AGENT_PROFILES_PATH = os.getenv(
+    "AGENT_PROFILES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent_profiles.json")
+)
+
+# Valeurs utilisées quand le fichier ne définit pas le profil "default"
+_BUILTIN_DEFAULT = {
+    "model": "gpt-3.5-turbo",
+    "temperature": 1.0,
+    "max_tokens": 4024,
+    "timeout": 60,
+    "streaming": True,
+    "structured_output": False,
+}
+_FIELD_TYPES = {
+    "model": (str,),
+    "temperature": (int, float),
+    "max_tokens": (int,),
+    "timeout": (int, float),
+    "streaming": (bool,),
+    "structured_output": (bool,),
+}
+
+_PROFILES = {}
+_LOCK = threading.Lock()
+
+
+class AgentProfileError(ValueError):
+    """
+    Raised when the agent profiles file is malformed.
+    """
+
+
+def _validate(name: str, profile: dict) -> dict:
+    for field, value in profile.items():
+        if field not in _FIELD_TYPES:
+            raise AgentProfileError(f"Unknown field '{field}' in agent profile '{name}' ({AGENT_PROFILES_PATH})")
+        if value is not None and (not isinstance(value, _FIELD_TYPES[field]) or (isinstance(value, bool) and bool not in _FIELD_TYPES[field])):
+            raise AgentProfileError(f"Invalid {field}={value!r} in agent profile '{name}' ({AGENT_PROFILES_PATH})")
+    return profile
+
+
+def _load() -> dict:
+    if not os.path.exists(AGENT_PROFILES_PATH):
+        return {"default": dict(_BUILTIN_DEFAULT)}
+    with open(AGENT_PROFILES_PATH, encoding="utf-8") as f:
+        try:
+            raw = json.load(f)
+        except json.JSONDecodeError as e:
+            raise AgentProfileError(f"Invalid JSON in {AGENT_PROFILES_PATH}: {e}") from e
+    if not isinstance(raw, dict) or not all(isinstance(profile, dict) for profile in raw.values()):
+        raise AgentProfileError(f"{AGENT_PROFILES_PATH} must map profile names to objects")
+    default = {**_BUILTIN_DEFAULT, **_validate("default", raw.get("default", {}))}
+    # Chaque profil hérite des valeurs du profil "default"
+    return {name: {**default, **_validate(name, profile)} for name, profile in {**raw, "default": {}}.items()}
+
+
+def get_agent_profile(name: str) -> dict:
+    """
+    Returns an agent's model profile, merged over the "default" profile.
+    Unknown profile names get the default profile.
+    Args:
+        name (str): Profile name (e.g. 'router', 'html_writer').
+    Returns:
+        dict: model, temperature, max_tokens, timeout, streaming and structured_output.
+    Raises:
+        AgentProfileError: The profiles file is malformed.
+    """
+    with _LOCK:
+        if not _PROFILES:
+            _PROFILES.update(_load())
+        return dict(_PROFILES.get(name, _PROFILES["default"]))
+
+
+def reload_agent_profiles() -> None:
+    """
+    Forgets the loaded profiles; they are read again from the file on next use.
+    """
+    with _LOCK:
+        _PROFILES.clear()
+
+
+def get_agent_profiles() -> dict:
+    """
+    Returns every loaded profile (for /stats).
+    """
+    get_agent_profile("default")
+    with _LOCK:
+        return {name: dict(profile) for name, profile in _PROFILES.items()}
@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langchain_core.callbacks import BaseCallbackHandler
+from utils.metrics import (
+    LLM_CALLS, LLM_DURATION, LLM_TTFT, LLM_PROMPT_TOKENS, LLM_COMPLETION_TOKENS, LLM_PROMPT_CHARS
+)
+from utils.token_count import count_tokens
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Callback handler of one agent LLM call: records its duration, time to first
+    token (streamed calls), prompt size and prompt/completion tokens (provider
+    usage when reported, tokenizer count otherwise). It runs inline, also on
+    the async path, so it never hops to a worker thread.
+    """
+    run_inline = True
+
+    def __init__(self, agent: str, model: str, prompt_tokens: int = None):
+        """
+        Args:
+            agent (str): Agent class name (metric label).
+            model (str): Model name (metric label).
+            prompt_tokens (int): Prompt tokens already counted by the caller.
+        """
+        self.agent = agent
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.started_at = None
+        self.first_token_at = None
+        self.completion_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.started_at = time.perf_counter()
+        prompt_chars = sum(len(m.content) for batch in messages for m in batch if isinstance(m.content, str))
+        LLM_PROMPT_CHARS.observe(prompt_chars, agent=self.agent)
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token_at is None and self.started_at is not None:
+            self.first_token_at = time.perf_counter()
+            LLM_TTFT.observe(self.first_token_at - self.started_at, agent=self.agent, model=self.model)
+        self.completion_tokens += 1
+
+    def on_llm_end(self, response, **kwargs):
+        labels = {"agent": self.agent, "model": self.model}
+        if self.started_at is not None:
+            LLM_DURATION.observe(time.perf_counter() - self.started_at, **labels)
+        usage = None
+        generations = [g for batch in response.generations for g in batch]
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        if usage:
+            prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        else:
+            prompt_tokens = self.prompt_tokens or 0
+            completion_tokens = self.completion_tokens or sum(count_tokens(g.text, self.model) for g in generations)
+        LLM_PROMPT_TOKENS.inc(prompt_tokens, **labels)
+        LLM_COMPLETION_TOKENS.inc(completion_tokens, **labels)
+        LLM_CALLS.inc(outcome="ok", **labels)
+
+    def on_llm_error(self, error, **kwargs):
+        LLM_CALLS.inc(agent=self.agent, model=self.model, outcome=type(error).__name__)
@@ -1,17 +1,100 @@
 import os
 import sys
+import threading
+import contextvars
+from contextlib import contextmanager
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from langchain_community.chat_models import ChatOpenAI
+import httpx
+from langchain_openai import ChatOpenAI
+from models.response_cache import get_response_cache
+
+# Limites du pool HTTP partagé (configurables via l'environnement)
+POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30"))
+# Point d'accès compatible OpenAI (ex: serveur factice des benchmarks), None = API OpenAI
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Registre process-wide : une instance ChatOpenAI par configuration de modèle
+_REGISTRY_LOCK = threading.Lock()
+_LLM_REGISTRY = {}
+_HTTP_CLIENTS = {}
+_POOL_COUNTERS = {"registry_hits": 0, "registry_misses": 0, "http_requests": 0}
+# Compteur de requêtes HTTP incrémenté depuis les threads des appels sync et depuis la boucle
+_COUNTERS_LOCK = threading.Lock()
+# LLM de substitution (ex: stub pour le warm-up), limité au contexte courant
+_LLM_OVERRIDE = contextvars.ContextVar("llm_override", default=None)
+
+
+@contextmanager
+def override_llm(llm):
+    """
+    Context manager making get_llm return the given LLM in the current context.
+    Used to run the workflow against a stub model (e.g. warm-up) without
+    affecting concurrent requests.
+    Args:
+        llm: Chat model returned by get_llm while the context is active.
+    """
+    token = _LLM_OVERRIDE.set(llm)
+    try:
+        yield llm
+    finally:
+        _LLM_OVERRIDE.reset(token)
+
+
+def _count_request(request) -> None:
+    """
+    httpx event hook counting outbound requests on the shared sync client.
+    """
+    with _COUNTERS_LOCK:
+        _POOL_COUNTERS["http_requests"] += 1
+
+
+async def _acount_request(request) -> None:
+    """
+    httpx event hook counting outbound requests on the shared async client.
+    """
+    with _COUNTERS_LOCK:
+        _POOL_COUNTERS["http_requests"] += 1
+
+
+def _get_http_clients():
+    """
+    Returns the shared (sync, async) httpx clients, creating them on first use.
+    Every pooled ChatOpenAI instance reuses these clients, so keep-alive
+    connections to the provider are shared across requests and nodes.
+
+    Returns:
+        tuple: (httpx.Client, httpx.AsyncClient)
+    """
+    if "default" not in _HTTP_CLIENTS:
+        limits = httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        )
+        _HTTP_CLIENTS["default"] = (
+            httpx.Client(limits=limits, event_hooks={"request": [_count_request]}),
+            httpx.AsyncClient(limits=limits, event_hooks={"request": [_acount_request]}),
+        )
+    return _HTTP_CLIENTS["default"]
+
 
 def get_llm(
     model_name="gpt-3.5-turbo",
     temperature=1.0,
     api_key=None,
     max_tokens=None,
-    timeout=None
+    timeout=None,
+    cache_responses=False,
+    base_url=None,
+    streaming=True
 ):
     """
-    Returns a configured ChatOpenAI instance.
+    Returns a pooled ChatOpenAI instance for the given model configuration.
+    Instances are created once per configuration and share process-wide
+    HTTP clients, so repeated calls do not pay for client construction,
+    TLS handshakes or cold connections.
 
     Args:
         model_name (str): Model name, e.g. 'gpt-3.5-turbo', 'gpt-4', etc.
@@ -19,18 +102,124 @@ def get_llm(
         api_key (str): Your OpenAI key, optional if already in env.
         max_tokens (int): Token limit for response.
         timeout (float): Timeout in seconds.
+        cache_responses (bool): Serve/store responses through the shared
+            response cache (only effective when LLM_CACHE_ENABLED=1).
+        base_url (str): OpenAI-compatible endpoint, defaults to OPENAI_BASE_URL.
+        streaming (bool): Stream tokens when the caller streams (e.g. graph
+            'messages' mode); False always makes a single non-streamed call.
 
     Returns:
         ChatOpenAI: Ready to use LLM.
     """
-    # Creating new ChatOpenAI instance
-    return ChatOpenAI(
-        model=model_name,
-        temperature=temperature,
-        openai_api_key=api_key,
-        max_tokens=max_tokens,
-        timeout=timeout
-    )
+    override = _LLM_OVERRIDE.get()
+    if override is not None:
+        return override
+    cache = get_response_cache() if cache_responses else None
+    base_url = base_url or OPENAI_BASE_URL
+    key = (model_name, temperature, api_key, max_tokens, timeout, cache is not None, base_url, streaming)
+    with _REGISTRY_LOCK:
+        llm = _LLM_REGISTRY.get(key)
+        if llm is not None:
+            _POOL_COUNTERS["registry_hits"] += 1
+            return llm
+        _POOL_COUNTERS["registry_misses"] += 1
+        http_client, http_async_client = _get_http_clients()
+        # Creating new ChatOpenAI instance bound to the shared HTTP pool
+        llm = ChatOpenAI(
+            model=model_name,
+            temperature=temperature,
+            api_key=api_key,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            base_url=base_url,
+            disable_streaming=not streaming,
+            # Nouvelles tentatives gérées par models/resilience.py (backoff, échéance, disjoncteur)
+            max_retries=0,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            cache=cache if cache is not None else False
+        )
+        _LLM_REGISTRY[key] = llm
+        return llm
+
+
+def get_llm_key(llm):
+    """
+    Returns the registry key of a pooled LLM, so that objects derived from it
+    can be cached per model configuration.
+    Args:
+        llm: Chat model returned by get_llm.
+    Returns:
+        tuple | None: The registry key, None for an LLM not pooled by get_llm
+            (e.g. an override stub).
+    """
+    with _REGISTRY_LOCK:
+        return next((key for key, registered in _LLM_REGISTRY.items() if registered is llm), None)
+
+
+def _reset_after_fork() -> None:
+    """
+    Drops the inherited clients in a forked worker: their connections belong
+    to the parent process and must not be shared. They are not closed here,
+    since closing them would also shut the parent's sockets.
+    """
+    _HTTP_CLIENTS.clear()
+    _LLM_REGISTRY.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _connection_counts(client) -> dict:
+    """
+    Reads connection counts from the httpcore pool behind an httpx client.
+    Args:
+        client: httpx.Client or httpx.AsyncClient.
+    Returns:
+        dict: Total, idle and active connection counts.
+    """
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {"total": len(connections), "idle": idle, "active": len(connections) - idle}
+
+
+def get_pool_stats() -> dict:
+    """
+    Returns statistics about the pooled LLM clients and their HTTP connections.
+    Returns:
+        dict: Registry size, hit/miss counters, pool limits and connection counts.
+    """
+    with _REGISTRY_LOCK, _COUNTERS_LOCK:
+        stats = {
+            "models": sorted({key[0] for key in _LLM_REGISTRY}),
+            "registered_clients": len(_LLM_REGISTRY),
+            **_POOL_COUNTERS,
+            "limits": {
+                "max_connections": POOL_MAX_CONNECTIONS,
+                "max_keepalive_connections": POOL_MAX_KEEPALIVE,
+                "keepalive_expiry": POOL_KEEPALIVE_EXPIRY,
+            },
+        }
+        if "default" in _HTTP_CLIENTS:
+            http_client, http_async_client = _HTTP_CLIENTS["default"]
+            stats["sync_connections"] = _connection_counts(http_client)
+            stats["async_connections"] = _connection_counts(http_async_client)
+    return stats
+
+
+async def aclose_llm_clients() -> None:
+    """
+    Closes the shared HTTP clients and empties the registry (used on shutdown).
+    """
+    with _REGISTRY_LOCK:
+        clients = _HTTP_CLIENTS.pop("default", None)
+        _LLM_REGISTRY.clear()
+    if clients is not None:
+        http_client, http_async_client = clients
+        http_client.close()
+        await http_async_client.aclose()
+
 
 if __name__ == "__main__":
     # Initializing LLM with test parameters
@@ -38,4 +227,5 @@ if __name__ == "__main__":
     # Testing LLM with sample prompt
     response = llm.invoke("Say this is a test!")
     # Test response received
-    print(f"==> [OK] Test response: {response.content}")
\ No newline at end of file
+    print(f"==> [OK] Test response: {response.content}")
+    print("==> [INFO] Pool stats:", get_pool_stats())
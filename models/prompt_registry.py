@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import time
+import argparse
+import asyncio
+import hashlib
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langchain_core.load import dumps, loads
+
+# Prompts utilisés par les agents (noms du LangChain hub)
+PROMPT_NAMES = [
+    "dev-assistant/determine_user_intent",
+    "dev-assistant/respond_to_user",
+    "dev-assistant/desing_and_planing",
+    "dev-assistant/html_generator",
+]
+
+# Cache local versionné : <PROMPT_CACHE_DIR>/<owner>/<name>/<version>.json + manifest.json
+PROMPT_CACHE_DIR = os.getenv(
+    "PROMPT_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+)
+# Mode hors-ligne strict : jamais d'appel au hub, le cache disque doit suffire
+PROMPTS_OFFLINE = os.getenv("PROMPTS_OFFLINE", "0") == "1"
+# Durée de vie (secondes) avant rafraîchissement en arrière-plan ; 0 = désactivé
+PROMPT_REFRESH_TTL = float(os.getenv("PROMPT_REFRESH_TTL", "0"))
+
+_PROMPTS = {}
+_LOCAL_PROMPTS = set()
+_FETCHED_AT = {}
+_REFRESHING = set()
+_LOCK = threading.Lock()
+_STATS = {
+    "loads": 0,
+    "memory_hits": 0,
+    "disk_loads": 0,
+    "hub_pulls": 0,
+    "refreshes": 0,
+    "refresh_errors": 0,
+    "load_seconds_total": 0.0,
+}
+
+
+class PromptNotAvailableError(RuntimeError):
+    """
+    Raised when a prompt is not in the local cache and cannot be pulled
+    (offline mode or hub unreachable).
+    """
+
+
+def _prompt_dir(name: str) -> str:
+    return os.path.join(PROMPT_CACHE_DIR, *name.split("/"))
+
+
+def _read_manifest(name: str) -> dict:
+    path = os.path.join(_prompt_dir(name), "manifest.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json_atomic(path: str, data: str) -> None:
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_prompt(name: str, prompt) -> str:
+    """
+    Stores a prompt in the local cache as a new version and makes it current.
+    Args:
+        name (str): Hub name of the prompt (e.g. 'dev-assistant/html_generator').
+        prompt: LangChain prompt template to store.
+    Returns:
+        str: The version id of the stored prompt.
+    """
+    serialized = dumps(prompt, pretty=True)
+    metadata = getattr(prompt, "metadata", None) or {}
+    version = metadata.get("lc_hub_commit_hash") or hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:12]
+    directory = _prompt_dir(name)
+    os.makedirs(directory, exist_ok=True)
+    _write_json_atomic(os.path.join(directory, f"{version}.json"), serialized)
+    manifest = _read_manifest(name)
+    versions = manifest.get("versions", [])
+    if version not in versions:
+        versions.append(version)
+    fetched_at = time.time()
+    _write_json_atomic(
+        os.path.join(directory, "manifest.json"),
+        json.dumps({"current": version, "fetched_at": fetched_at, "versions": versions}, indent=2)
+    )
+    with _LOCK:
+        _PROMPTS[name] = prompt
+        _FETCHED_AT[name] = fetched_at
+    return version
+
+
+def _load_from_disk(name: str):
+    manifest = _read_manifest(name)
+    version = manifest.get("current")
+    if not version:
+        return None
+    with open(os.path.join(_prompt_dir(name), f"{version}.json"), encoding="utf-8") as f:
+        prompt = loads(f.read())
+    with _LOCK:
+        _PROMPTS[name] = prompt
+        _FETCHED_AT[name] = manifest.get("fetched_at", 0.0)
+    return prompt
+
+
+def _pull_from_hub(name: str):
+    from langchain import hub
+    try:
+        prompt = hub.pull(name)
+    except Exception as e:
+        raise PromptNotAvailableError(f"Prompt '{name}' is not cached and could not be pulled: {e}") from e
+    save_prompt(name, prompt)
+    return prompt
+
+
+def _refresh_in_background(name: str) -> None:
+    """
+    Re-pulls a prompt from the hub in a daemon thread; the cached version
+    keeps being served until the new one is stored.
+    """
+    with _LOCK:
+        if name in _REFRESHING:
+            return
+        _REFRESHING.add(name)
+
+    def refresh():
+        try:
+            _pull_from_hub(name)
+            _STATS["refreshes"] += 1
+        except PromptNotAvailableError:
+            _STATS["refresh_errors"] += 1
+            # Keep serving the cached version and retry after another TTL
+            with _LOCK:
+                _FETCHED_AT[name] = time.time()
+        finally:
+            with _LOCK:
+                _REFRESHING.discard(name)
+
+    threading.Thread(target=refresh, name=f"prompt-refresh-{name}", daemon=True).start()
+
+
+def register_local_prompt(name: str, prompt) -> None:
+    """
+    Registers a prompt defined in code (not stored on the hub), so agents load
+    it through the same registry. Local prompts are never refreshed.
+    Args:
+        name (str): Registry name of the prompt (e.g. 'local/html_patch').
+        prompt: LangChain prompt template.
+    """
+    with _LOCK:
+        _PROMPTS[name] = prompt
+        _LOCAL_PROMPTS.add(name)
+
+
+def get_prompt(name: str):
+    """
+    Returns a prompt from the registry: memory first, then the on-disk cache,
+    then the LangChain hub (unless offline mode is enabled).
+    Args:
+        name (str): Hub name of the prompt.
+    Returns:
+        The prompt template.
+    Raises:
+        PromptNotAvailableError: If the prompt is not cached and cannot be pulled.
+    """
+    start = time.perf_counter()
+    with _LOCK:
+        prompt = _PROMPTS.get(name)
+    if prompt is not None:
+        _STATS["memory_hits"] += 1
+    else:
+        prompt = _load_from_disk(name)
+        if prompt is not None:
+            _STATS["disk_loads"] += 1
+        elif PROMPTS_OFFLINE:
+            raise PromptNotAvailableError(f"Prompt '{name}' is not in the local cache ({PROMPT_CACHE_DIR}) and offline mode is enabled")
+        else:
+            prompt = _pull_from_hub(name)
+            _STATS["hub_pulls"] += 1
+    refresh_due = time.time() - _FETCHED_AT.get(name, 0.0) > PROMPT_REFRESH_TTL
+    if PROMPT_REFRESH_TTL > 0 and not PROMPTS_OFFLINE and name not in _LOCAL_PROMPTS and refresh_due:
+        _refresh_in_background(name)
+    _STATS["loads"] += 1
+    _STATS["load_seconds_total"] += time.perf_counter() - start
+    return prompt
+
+
+async def aget_prompt(name: str):
+    """
+    Async version of get_prompt; disk or hub loads run in a worker thread.
+    Args:
+        name (str): Hub name of the prompt.
+    Returns:
+        The prompt template.
+    """
+    with _LOCK:
+        loaded = name in _PROMPTS
+    if loaded:
+        return get_prompt(name)
+    return await asyncio.to_thread(get_prompt, name)
+
+
+def preload_prompts(names=None) -> dict:
+    """
+    Loads prompts into memory (typically at startup).
+    Args:
+        names (list): Prompt names to load, defaults to PROMPT_NAMES.
+    Returns:
+        dict: Prompt name -> error message for prompts that could not be loaded.
+    """
+    errors = {}
+    for name in names or PROMPT_NAMES:
+        try:
+            get_prompt(name)
+        except PromptNotAvailableError as e:
+            errors[name] = str(e)
+    return errors
+
+
+def get_prompt_stats() -> dict:
+    """
+    Returns prompt registry statistics, including total prompt-load time.
+    Returns:
+        dict: Counters, cached prompt versions and configuration.
+    """
+    with _LOCK:
+        loaded = sorted(_PROMPTS)
+    return {
+        **_STATS,
+        "loaded": loaded,
+        "offline": PROMPTS_OFFLINE,
+        "refresh_ttl": PROMPT_REFRESH_TTL,
+        "cache_dir": PROMPT_CACHE_DIR,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pull the agents' prompts from the LangChain hub into the local cache.")
+    parser.add_argument("--seed", action="store_true",
+                        help="Only pull the prompts missing from the cache (setup step before PROMPTS_OFFLINE=1)")
+    args = parser.parse_args()
+    missing = []
+    for prompt_name in PROMPT_NAMES:
+        if args.seed and _read_manifest(prompt_name).get("current"):
+            print(f"==> [INFO]: {prompt_name} already cached (version {_read_manifest(prompt_name)['current']})")
+            continue
+        try:
+            _pull_from_hub(prompt_name)
+        except PromptNotAvailableError as e:
+            print(f"==> [ERROR]: {e}")
+            missing.append(prompt_name)
+            continue
+        print(f"==> [INFO]: {prompt_name} -> version {_read_manifest(prompt_name)['current']}")
+    if missing:
+        sys.exit(1)
+    print(f"==> [OK]: Prompt cache ready in {PROMPT_CACHE_DIR}")
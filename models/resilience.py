@@ -0,0 +1,429 @@
+import os
+import sys
+import time
+import math
+import asyncio
+import threading
+import contextvars
+from collections import deque
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import httpx
+import openai
+from tenacity import Retrying, AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from tenacity.stop import stop_base
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import ensure_config
+from utils.metrics import metrics_suppressed
+
+# Nouvelles tentatives des appels LLM (erreurs transitoires uniquement, avant le premier token)
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+# Attente avant une nouvelle tentative : aléatoire entre 0 et min(max, base * 2^n) (« full jitter »)
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+LLM_RETRY_MAX_BACKOFF = float(os.getenv("LLM_RETRY_MAX_BACKOFF", "8"))
+# Requête dupliquée quand le premier token tarde au-delà du p95 observé (appels async seulement)
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "250"))
+# Disjoncteur par modèle : ouvert après N échecs consécutifs, un essai laissé passer après le délai
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+# Échéance de bout en bout d'une requête (tous les appels LLM du graphe, nouvelles tentatives comprises)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "180"))
+
+# Nombre de temps au premier token conservés par (agent, modèle) pour le seuil de duplication
+_TTFT_SAMPLES = 200
+_RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # Inclut APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    httpx.TransportError,
+)
+
+_LOCK = threading.Lock()
+_STATS = {"attempts": 0, "retries": 0, "deadline_exceeded": 0, "hedges": 0, "hedges_won": 0, "breaker_rejections": 0}
+_TTFT = {}
+_BREAKERS = {}
+
+
+class DeadlineExceededError(TimeoutError):
+    """
+    Raised when the end-to-end deadline of the request passed before or
+    during an LLM call.
+    """
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised without calling the provider while a model's circuit breaker is open.
+    """
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Transient provider errors: connection failures and timeouts, rate limits, 5xx.
+    """
+    return isinstance(error, _RETRYABLE_ERRORS)
+
+
+def current_deadline():
+    """
+    Returns the end-to-end deadline (epoch seconds) of the running request,
+    read from the 'deadline' configurable passed down through the graph nodes.
+    Returns:
+        float: The deadline, None when the caller did not set one.
+    """
+    return (ensure_config().get("configurable") or {}).get("deadline")
+
+
+def _remaining(deadline) -> float:
+    if deadline is None:
+        return None
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        with _LOCK:
+            _STATS["deadline_exceeded"] += 1
+        raise DeadlineExceededError("Request deadline exceeded")
+    return remaining
+
+
+class _stop_before_deadline(stop_base):
+    """
+    Stops retrying when the next backoff would end after the deadline.
+    """
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def __call__(self, retry_state) -> bool:
+        return self.deadline is not None and time.time() + (retry_state.upcoming_sleep or 0) >= self.deadline
+
+
+def _count_retry(retry_state) -> None:
+    with _LOCK:
+        _STATS["retries"] += 1
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one model. Closed: calls go through and consecutive
+    transient failures are counted. Open (after LLM_BREAKER_FAILURES of them):
+    calls fail fast with CircuitOpenError. Half-open (after
+    LLM_BREAKER_RESET_SECONDS): one trial call goes through; its success
+    closes the breaker, its failure opens it again.
+    """
+    def __init__(self, model: str, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: If the breaker is open (or half-open with its trial call in flight).
+        """
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self.state == "closed":
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed >= self.reset_seconds:
+                # Essai : aussi renouvelé si le précédent n'a jamais abouti (annulé, erreur non transitoire)
+                self.state = "half_open"
+                self.opened_at = time.monotonic()
+                return
+            retry_after = max(self.reset_seconds - elapsed, 1.0)
+        with _LOCK:
+            _STATS["breaker_rejections"] += 1
+        raise CircuitOpenError(f"Model '{self.model}' is unavailable (circuit open)", retry_after=round(retry_after, 1))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold > 0):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.times_opened}
+
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    """
+    Returns the process-wide circuit breaker of a model.
+    """
+    with _LOCK:
+        if model not in _BREAKERS:
+            _BREAKERS[model] = CircuitBreaker(model)
+        return _BREAKERS[model]
+
+
+def _record_ttft(key: tuple, seconds: float) -> None:
+    if metrics_suppressed():
+        return  # Temps du LLM factice du warm-up : fausserait le seuil de duplication
+    with _LOCK:
+        _TTFT.setdefault(key, deque(maxlen=_TTFT_SAMPLES)).append(seconds)
+
+
+def hedge_threshold(agent: str, model: str):
+    """
+    Delay after which a call without first token is duplicated: the p95 of
+    the recent times to first token of this agent and model.
+    Returns:
+        float: Seconds, None when hedging is off or too few samples were seen.
+    """
+    if not LLM_HEDGING:
+        return None
+    with _LOCK:
+        samples = sorted(_TTFT.get((agent, model), ()))
+    if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    p95 = samples[min(len(samples) - 1, math.ceil(0.95 * len(samples)) - 1)]
+    return max(p95, LLM_HEDGE_MIN_DELAY_MS / 1000)
+
+
+class _FirstToken(BaseCallbackHandler):
+    """
+    Callback of one attempt signalling its first streamed token.
+    """
+    run_inline = True
+
+    def __init__(self, on_first):
+        self.on_first = on_first
+        self.at = None
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.at is None:
+            self.at = time.perf_counter()
+            self.on_first()
+
+
+class _HedgedCall:
+    """
+    Races a call against a duplicate started when no first token arrived
+    within the threshold. The first attempt to stream a token (or to complete,
+    for non-streamed calls) wins and the other one is cancelled right away,
+    from the token callback, so the loser never streams anything.
+    """
+    def __init__(self, attempt, streamed: dict):
+        self.attempt = attempt
+        self.streamed = streamed
+        self.tasks = []
+        self.winner = None
+        self.first = asyncio.Event()
+
+    def _win(self, task) -> None:
+        if self.winner is None:
+            self.winner = task
+            self.streamed["value"] = True
+            for other in self.tasks:
+                if other is not task:
+                    other.cancel()
+            self.first.set()
+
+    def _launch(self) -> asyncio.Task:
+        holder = {}
+        watcher = _FirstToken(lambda: self._win(holder["task"]))
+        task = holder["task"] = asyncio.create_task(self.attempt([watcher]))
+        task.started_at = time.perf_counter()
+        task.watcher = watcher
+        self.tasks.append(task)
+        return task
+
+    async def run(self, threshold):
+        primary = self._launch()
+        first_wait = asyncio.ensure_future(self.first.wait())
+        pending = {primary}
+        failed = None
+        try:
+            while self.winner is None:
+                timeout = None
+                if threshold is not None and len(self.tasks) == 1:
+                    timeout = max(threshold - (time.perf_counter() - primary.started_at), 0)
+                done, _ = await asyncio.wait(pending | {first_wait}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Pas de premier token dans le délai : requête dupliquée
+                    with _LOCK:
+                        _STATS["hedges"] += 1
+                    pending.add(self._launch())
+                    continue
+                if self.winner is not None:
+                    break  # Premier token : le perdant vient d'être annulé
+                for task in done - {first_wait}:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        self._win(task)  # Appel non streamé : réponse complète
+                    else:
+                        failed = task
+                if self.winner is None and not pending:
+                    return failed.result()  # Toutes les tentatives ont échoué : lève l'erreur
+            if self.winner is not primary:
+                with _LOCK:
+                    _STATS["hedges_won"] += 1
+            return await self.winner
+        finally:
+            first_wait.cancel()
+            for task in self.tasks:
+                if not task.done():
+                    task.cancel()
+
+
+def _run_bounded(call, timeout):
+    """
+    Runs a blocking call in a helper thread (same context variables) and
+    waits at most timeout seconds for it. A blocking HTTP call cannot be
+    cancelled: past the timeout it is abandoned and ends in the background,
+    within the model's own timeout.
+    Args:
+        call: Callable without arguments.
+        timeout (float): Seconds to wait, None = no limit.
+    Returns:
+        The call's result.
+    Raises:
+        DeadlineExceededError: If the call did not end in time, or the call's error.
+    """
+    if timeout is None:
+        return call()
+    outcome = {}
+    context = contextvars.copy_context()
+
+    def target():
+        try:
+            outcome["value"] = context.run(call)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, name="llm-attempt", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        with _LOCK:
+            _STATS["deadline_exceeded"] += 1
+        raise DeadlineExceededError("Request deadline exceeded")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
+
+
+def call_llm(agent: str, model: str, attempt):
+    """
+    Calls an LLM with retries (jittered exponential backoff, transient errors
+    only, never once tokens were streamed), the request deadline and the
+    model's circuit breaker. Like in acall_llm, each attempt is bounded by the
+    time left before the deadline (see _run_bounded).
+    Args:
+        agent (str): Agent class name.
+        model (str): Model name.
+        attempt: Callable(extra_callbacks) making one call and returning the response.
+    Returns:
+        The LLM response.
+    Raises:
+        DeadlineExceededError, CircuitOpenError, or the last call error.
+    """
+    deadline = current_deadline()
+    breaker = get_circuit_breaker(model)
+    streamed = {"value": False}
+    retrying = Retrying(
+        stop=stop_after_attempt(LLM_MAX_ATTEMPTS) | _stop_before_deadline(deadline),
+        wait=wait_random_exponential(multiplier=LLM_RETRY_BACKOFF, max=LLM_RETRY_MAX_BACKOFF),
+        retry=retry_if_exception(lambda e: is_retryable(e) and not streamed["value"]),
+        before_sleep=_count_retry,
+        reraise=True,
+    )
+    for attempt_state in retrying:
+        with attempt_state:
+            remaining = _remaining(deadline)
+            breaker.before_call()
+            with _LOCK:
+                _STATS["attempts"] += 1
+            watcher = _FirstToken(lambda: streamed.update(value=True))
+            started = time.perf_counter()
+            try:
+                response = _run_bounded(lambda: attempt([watcher]), remaining)
+            except Exception as e:
+                if is_retryable(e):
+                    breaker.record_failure()
+                raise
+            breaker.record_success()
+            _record_ttft((agent, model), (watcher.at or time.perf_counter()) - started)
+            return response
+
+
+async def acall_llm(agent: str, model: str, attempt):
+    """
+    Async version of call_llm. Each attempt is bounded by the time left before
+    the deadline, and is hedged when hedging is enabled (see hedge_threshold).
+    Args:
+        agent (str): Agent class name.
+        model (str): Model name.
+        attempt: Callable(extra_callbacks) returning the awaitable of one call.
+    Returns:
+        The LLM response.
+    Raises:
+        DeadlineExceededError, CircuitOpenError, or the last call error.
+    """
+    deadline = current_deadline()
+    breaker = get_circuit_breaker(model)
+    streamed = {"value": False}
+    retrying = AsyncRetrying(
+        stop=stop_after_attempt(LLM_MAX_ATTEMPTS) | _stop_before_deadline(deadline),
+        wait=wait_random_exponential(multiplier=LLM_RETRY_BACKOFF, max=LLM_RETRY_MAX_BACKOFF),
+        retry=retry_if_exception(lambda e: is_retryable(e) and not streamed["value"]),
+        before_sleep=_count_retry,
+        reraise=True,
+    )
+    async for attempt_state in retrying:
+        with attempt_state:
+            remaining = _remaining(deadline)
+            breaker.before_call()
+            with _LOCK:
+                _STATS["attempts"] += 1
+            call = _HedgedCall(attempt, streamed)
+            task = asyncio.ensure_future(call.run(hedge_threshold(agent, model)))
+            try:
+                done, _ = await asyncio.wait({task}, timeout=remaining)
+            except BaseException:
+                task.cancel()  # Exécution annulée (déconnexion) : les requêtes en cours aussi
+                raise
+            if not done:
+                task.cancel()
+                with _LOCK:
+                    _STATS["deadline_exceeded"] += 1
+                raise DeadlineExceededError("Request deadline exceeded")
+            try:
+                response = task.result()
+            except Exception as e:
+                if is_retryable(e):
+                    breaker.record_failure()
+                raise
+            breaker.record_success()
+            winner = call.winner
+            _record_ttft((agent, model), (winner.watcher.at or time.perf_counter()) - winner.started_at)
+            return response
+
+
+def get_resilience_stats() -> dict:
+    """
+    Returns the resilience counters (attempts, retries, deadlines exceeded,
+    hedged calls and hedges that won) and the state of each circuit breaker.
+    """
+    with _LOCK:
+        stats = dict(_STATS)
+        breakers = dict(_BREAKERS)
+    stats["hedging"] = LLM_HEDGING
+    stats["breakers"] = {model: breaker.get_stats() for model, breaker in breakers.items()}
+    return stats
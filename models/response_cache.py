@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+# Cache opt-in : désactivé par défaut, activable via l'environnement
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "0") == "1"
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_responses.sqlite")
+)
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "10000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Two-level LLM response cache: an in-memory LRU in front of a SQLite store.
+    Plugged into ChatOpenAI through LangChain's cache interface, so cache hits
+    still go through the callback system (and thus the /chat-message stream).
+    Keys hash the rendered prompt together with the LLM parameters
+    (model name, temperature, max_tokens, ...).
+    """
+    def __init__(self, path: str, max_memory_entries: int, max_disk_entries: int, ttl: float):
+        """
+        Initialize the cache.
+        Args:
+            path (str): SQLite database path.
+            max_memory_entries (int): Max entries kept in the in-memory LRU.
+            max_disk_entries (int): Max rows kept in SQLite (least recently used are evicted).
+            ttl (float): Entry lifetime in seconds (0 = no expiry).
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "updates": 0, "evictions": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache(last_access)")
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """
+        Builds the cache key from the rendered prompt and the LLM parameters.
+        Args:
+            prompt (str): Serialized prompt value.
+            llm_string (str): Serialized LLM parameters.
+        Returns:
+            str: Hex digest used as cache key.
+        """
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def lookup(self, prompt: str, llm_string: str):
+        """
+        Look up a cached response.
+        Args:
+            prompt (str): Serialized prompt value.
+            llm_string (str): Serialized LLM parameters.
+        Returns:
+            list | None: Cached generations, or None on miss.
+        """
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0], now):
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[1]
+            self._memory.pop(key, None)
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            generations = [loads(item) for item in json.loads(row[0])]
+            self._remember(key, row[1], generations)
+            self.stats["disk_hits"] += 1
+            return generations
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        """
+        Store a response in both cache levels.
+        Args:
+            prompt (str): Serialized prompt value.
+            llm_string (str): Serialized LLM parameters.
+            return_val (list): Generations returned by the LLM.
+        """
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        value = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            self._remember(key, now, list(return_val))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self.stats["updates"] += 1
+            self._writes_since_eviction += 1
+            if self._writes_since_eviction >= 100:
+                self._evict_disk(now)
+
+    def _remember(self, key: str, created_at: float, generations: list) -> None:
+        self._memory[key] = (created_at, generations)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self, now: float) -> None:
+        """
+        Drops expired rows, then the least recently used rows above the size limit.
+        """
+        self._writes_since_eviction = 0
+        if self.ttl > 0:
+            cursor = self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self.stats["evictions"] += max(cursor.rowcount, 0)
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_disk_entries:
+            cursor = self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                (count - self.max_disk_entries,)
+            )
+            self.stats["evictions"] += max(cursor.rowcount, 0)
+
+    def clear(self, **kwargs) -> None:
+        """
+        Empty both cache levels.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def get_stats(self) -> dict:
+        """
+        Returns hit/miss/eviction counters and current sizes.
+        Returns:
+            dict: Cache statistics.
+        """
+        with self._lock:
+            disk_entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return {**self.stats, "memory_entries": len(self._memory), "disk_entries": disk_entries}
+
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Returns the process-wide response cache, or None when caching is disabled.
+    Returns:
+        LLMResponseCache | None: The shared cache instance.
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _CACHE_LOCK:
+        if "default" not in _CACHE:
+            _CACHE["default"] = LLMResponseCache(
+                LLM_CACHE_PATH, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_DISK_ENTRIES, LLM_CACHE_TTL
+            )
+        return _CACHE["default"]
+
+
+def _reset_after_fork() -> None:
+    # Une connexion SQLite ne doit pas traverser un fork : le worker ouvre la sienne (même base)
+    _CACHE.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_response_cache_stats() -> dict:
+    """
+    Returns the response cache statistics.
+    Returns:
+        dict: Cache statistics, or {"enabled": False}.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.get_stats()}
@@ -1,14 +1,199 @@
 import os
 import sys
+import json
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import traceback
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import uvicorn
-from script.app import app
+
+# Workers attendus à l'enregistrement avant d'abandonner le rapport de démarrage (s)
+WORKER_READY_TIMEOUT = 120.0
+# Un worker mort plus tôt après son démarrage est relancé après une pause (évite une boucle de crash)
+WORKER_MIN_UPTIME = 5.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the chat server (one process, or N preforked workers).")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")),
+                        help="Worker processes forked from a warmed-up launcher (default: WEB_CONCURRENCY or 1)")
+    parser.add_argument("--startup-report", default=None,
+                        help="Write the startup phase timings (launcher and workers) to this JSON file")
+    return parser.parse_args()
+
+
+def warm_up(app_module) -> None:
+    """
+    Runs the startup work once in the launcher, so that forked workers inherit
+    it: prompts loaded from the local cache, every graph variant compiled and
+    executed once against a stub LLM.
+    Args:
+        app_module: The imported script.app module.
+    """
+    from utils.worker_state import startup_phase
+    from core.nodes import get_workflow, warm_up_workflow, WORKFLOW_BUILDERS
+    with startup_phase("prompts"):
+        for prompt_name, error in app_module.preload_prompts().items():
+            print(f"==> [WARN]: Prompt {prompt_name} not loaded: {error}")
+    with startup_phase("compile"):
+        for name in WORKFLOW_BUILDERS:
+            get_workflow(name)
+
+    async def warm_all():
+        for name in WORKFLOW_BUILDERS:
+            await warm_up_workflow(name)
+
+    with startup_phase("warmup"):
+        asyncio.run(warm_all())
+
+
+def serve_worker(app, sock: socket.socket, index: int, args) -> None:
+    """
+    Body of a forked worker: serves the app on the launcher's listening socket.
+    """
+    import uvicorn
+    from utils.logging_setup import start_listener, shutdown_logging
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    os.environ["WORKER_INDEX"] = str(index)
+    # Thread d'écriture des logs propre au worker (arrêté dans le lanceur avant le fork)
+    start_listener()
+    config = uvicorn.Config(app, host=args.host, port=args.port)
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        # os._exit ne passe pas par atexit : vide la file avant de quitter
+        shutdown_logging()
+
+
+def start_worker(app, sock: socket.socket, index: int, args) -> int:
+    """
+    Forks one worker. The launcher's logging thread is stopped around the
+    fork: a thread holding the log queue lock at fork time would leave the
+    child's copy locked forever.
+    Returns:
+        int: Worker pid (in the launcher).
+    """
+    from utils.logging_setup import start_listener, shutdown_logging
+    shutdown_logging()
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            serve_worker(app, sock, index, args)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    start_listener()
+    return pid
+
+
+def startup_report(launcher_phases: dict, workers: list) -> dict:
+    """
+    Builds the startup report: launcher phases (paid once) and, per worker,
+    the time from fork to ready.
+    """
+    return {
+        "launcher": launcher_phases,
+        "workers": [{"index": w["index"], "pid": w["pid"], "ready_ms": w["ready_ms"]} for w in workers],
+    }
+
+
+def run_workers(args) -> None:
+    """
+    Preforked multi-worker mode: imports and warms up once, forks --workers
+    processes sharing one listening socket, restarts crashed workers and
+    forwards SIGTERM/SIGINT to them.
+    """
+    from utils.worker_state import record_startup_phase, clear_workers, get_worker_stats, unregister_worker, get_startup_stats
+    # Les workers partagent pages et verrous de session : à fixer avant l'import de l'application
+    os.environ.setdefault("PAGE_STORE_SHARED", "1")
+    os.environ.setdefault("SESSION_LOCK_DIR", os.path.join(".cache", "session_locks"))
+    start = time.perf_counter()
+    import script.app as app_module
+    record_startup_phase("imports", (time.perf_counter() - start) * 1000)
+    warm_up(app_module)
+    clear_workers()
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers = {}
+    started = {}
+    for index in range(args.workers):
+        pid = start_worker(app_module.app, sock, index, args)
+        workers[pid], started[pid] = index, time.monotonic()
+    print(f"==> [OK]: Starting {args.workers} workers on http://{args.host}:{args.port}")
+    # Aperçu en direct et préemption restent locaux à chaque processus (voir README, "Multiple workers")
+    print("==> [WARN]: Live preview (/preview-stream) only shows runs handled by the same worker, "
+          "and a newer message handled by another worker waits for the session's run instead of pre-empting it")
+
+    stopping = []
+
+    def stop(signum, frame):
+        if not stopping:
+            stopping.append(signum)
+            print("==> [INFO]: Stopping workers")
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    launcher_phases = get_startup_stats()
+    deadline = time.monotonic() + WORKER_READY_TIMEOUT
+    reported = False
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if not reported and not stopping:
+                ready = get_worker_stats()["workers"]
+                if len(ready) >= args.workers or time.monotonic() > deadline:
+                    reported = True
+                    report = startup_report(launcher_phases, ready)
+                    print(f"==> [INFO]: Launcher startup {launcher_phases['total_ms']} ms {launcher_phases['phases_ms']}")
+                    for worker in report["workers"]:
+                        print(f"==> [INFO]: Worker {worker['index']} (pid {worker['pid']}) ready in {worker['ready_ms']} ms")
+                    if args.startup_report:
+                        with open(args.startup_report, "w", encoding="utf-8") as f:
+                            json.dump(report, f, indent=2)
+            time.sleep(0.2)
+            continue
+        index = workers.pop(pid)
+        unregister_worker(pid)
+        if stopping:
+            continue
+        print(f"==> [WARN]: Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        if time.monotonic() - started.pop(pid) < WORKER_MIN_UPTIME:
+            time.sleep(1.0)
+        new_pid = start_worker(app_module.app, sock, index, args)
+        workers[new_pid], started[new_pid] = index, time.monotonic()
+    sock.close()
+
 
 if __name__ == "__main__":
-    # Start the FastAPI server using Uvicorn
-    print("==> [OK]: Starting FastAPI server on http://0.0.0.0:8000")
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=8000
-    )
\ No newline at end of file
+    args = parse_args()
+    if args.workers > 1:
+        run_workers(args)
+    else:
+        import uvicorn
+        from script.app import app
+        # Start the FastAPI server using Uvicorn
+        print(f"==> [OK]: Starting FastAPI server on http://{args.host}:{args.port}")
+        uvicorn.run(
+            app,
+            host=args.host,
+            port=args.port
+        )
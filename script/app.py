@@ -2,33 +2,107 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import time
-import json
-import logging
+import asyncio
+import structlog
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
-from core.nodes import build_workflow
+from core.nodes import get_workflow, warm_up_workflow, configure_checkpointer, WORKFLOW_BUILDERS, DEFAULT_WORKFLOW
+from contextlib import asynccontextmanager
 from langchain.schema import HumanMessage
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from utils.html_extractor import extract_html_only
-from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
+from models.llm_model import get_pool_stats, aclose_llm_clients
+from models.prompt_registry import preload_prompts, get_prompt_stats
+from core.intent_classifier import get_router_stats
+from models.response_cache import get_response_cache_stats
+from core.code_generator import get_edit_stats
+from core.speculation import get_speculation_stats
+from models.admission import AdmissionRejectedError, admission_overloaded, get_admission_stats
+from models.resilience import DeadlineExceededError, CircuitOpenError, REQUEST_DEADLINE_SECONDS, get_resilience_stats
+from models.agent_profiles import get_agent_profile, get_agent_profiles
+from utils.page_store import negotiate_encoding
+from utils.stream_protocol import ChatEventEncoder, sse_frame
+from utils.live_preview import get_preview_channel
+from utils.session import DEFAULT_SESSION, validate_session_id, get_session_page_store, get_session_lock
+from utils.run_control import RunCancelledError, start_run, finish_run, get_cancellation_stats
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse, Response, PlainTextResponse
+from utils.logging_setup import configure_logging, get_logging_stats
+from utils.metrics import REGISTRY, REQUESTS, REQUEST_DURATION, REQUEST_TTFT, render_metrics
+from utils.worker_state import startup_phase, register_worker, heartbeat, unregister_worker, get_startup_stats, get_worker_stats
 
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('chat_app.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+# Journalisation structurée, non bloquante (file + thread d'écriture, échantillonnage)
+configure_logging()
+logger = structlog.get_logger(__name__)
 # Load environment variables
 load_dotenv()
+# Base SQLite des checkpoints LangGraph (état de conversation par session)
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", ".cache/checkpoints.sqlite")
+# Commentaire SSE envoyé périodiquement sur /preview-stream pour garder la connexion ouverte
+PREVIEW_KEEPALIVE_SECONDS = 15
+# Période de publication de la charge du worker dans le registre partagé
+WORKER_HEARTBEAT_SECONDS = 2.0
+
+
+async def _publish_worker_load() -> None:
+    """
+    Publishes this worker's load (requests served, runs in flight) to the
+    shared worker registry until cancelled.
+    """
+    while True:
+        try:
+            in_flight = get_cancellation_stats()["in_flight"]
+            await asyncio.to_thread(heartbeat, int(REQUESTS.total()), in_flight)
+        except Exception as e:
+            logger.warning("worker_heartbeat_failed", error=str(e))
+        await asyncio.sleep(WORKER_HEARTBEAT_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan: loads the prompts from the local cache and the
+    default page into the page store, opens the SQLite checkpointer holding
+    per-session graph state, compiles every workflow variant once at startup
+    (optionally warming it up against a stub LLM) and releases the pooled
+    LLM HTTP clients on shutdown. Each phase is timed (see /stats "startup");
+    phases already run by the multi-worker launcher before the fork are no-ops.
+    In a forked worker, the worker registers itself and publishes its load.
+    """
+    with startup_phase("prompts"):
+        for prompt_name, error in (await asyncio.to_thread(preload_prompts)).items():
+            logger.warning("prompt_not_loaded", prompt=prompt_name, error=str(error))
+    with startup_phase("page_store"):
+        await asyncio.to_thread(lambda: get_session_page_store(DEFAULT_SESSION).current)
+    os.makedirs(os.path.dirname(CHECKPOINT_DB_PATH) or ".", exist_ok=True)
+    async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB_PATH) as checkpointer:
+        with startup_phase("checkpointer"):
+            await checkpointer.setup()
+            configure_checkpointer(checkpointer)
+        app.state.checkpointer = checkpointer
+        for name in WORKFLOW_BUILDERS:
+            with startup_phase("compile"):
+                get_workflow(name)
+            if os.getenv("WARMUP_GRAPH", "0") == "1":
+                with startup_phase("warmup"):
+                    await warm_up_workflow(name)
+            logger.info("workflow_compiled", graph=name)
+        publisher = None
+        # Indice défini par run.py --workers dans chaque processus forké (absent en mono-processus)
+        app.state.worker_index = os.getenv("WORKER_INDEX")
+        if app.state.worker_index is not None:
+            await asyncio.to_thread(register_worker, int(app.state.worker_index))
+            publisher = asyncio.create_task(_publish_worker_load())
+            logger.info("worker_ready", worker=int(app.state.worker_index), startup=get_startup_stats())
+        yield
+        if publisher is not None:
+            publisher.cancel()
+            await asyncio.to_thread(unregister_worker)
+        configure_checkpointer(None)
+    await aclose_llm_clients()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="templates"), name="static")
 # Add CORS middleware to allow streaming from any origin
 app.add_middleware(
@@ -44,93 +118,173 @@ class ChatMessage(BaseModel):
     Pydantic model for chat message requests.
     """
     message: str
+    graph: str = DEFAULT_WORKFLOW
+    session_id: str = DEFAULT_SESSION
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
     pass
 
-page_to_clear = "templates/generated/page.html"
 @app.get("/clear-page")
-async def clear_page():
+async def clear_page(session_id: str = DEFAULT_SESSION):
+    """
+    FastAPI endpoint to empty a session's page and forget its conversation state.
+    """
+    try:
+        validate_session_id(session_id)
+    except ValueError as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
     try:
-        with open(page_to_clear, "w", encoding="utf-8") as f:
-            f.write("")  # Clear the content of the page
-        logger.info(f"==> [INFO]: Cleared content of {page_to_clear}")
+        page_store = get_session_page_store(session_id)
+        async with get_session_lock(session_id):
+            await asyncio.to_thread(page_store.clear)  # Atomic write of an empty page
+            await app.state.checkpointer.adelete_thread(session_id)
+        logger.info("page_cleared", session_id=session_id, path=page_store.path)
         return JSONResponse(content={"status": "success", "message": "Page cleared"})
     except Exception as e:
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
 
 
+async def _watch_disconnect(request: Request, run) -> None:
+    """
+    Cancels a chat run as soon as its client disconnects, even while
+    nothing is being sent (queued for the session lock, non-streamed LLM call).
+    """
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            run.cancel("disconnected")
+            return
+
 @app.post("/chat-message")
-async def chat_message(chat_message: ChatMessage):
+async def chat_message(chat_message: ChatMessage, request: Request):
     """
     FastAPI endpoint to handle chat messages.
     Streams responses from the workflow graph to the client in real time.
+    Each session (thread) resumes from its checkpointed state; runs of the
+    same session are serialized by a single-writer lock. The run is cancelled
+    (graph nodes and LLM requests included) when the client disconnects or
+    when a newer message of the same session pre-empts it.
     """
     request_id = f"req_{int(time.time())}_{hash(chat_message.message)%1000}"
-    logger.info(f"[{request_id}] New chat message received: {chat_message.message[:50]}...")
     try:
-        with open("templates/generated/page.html", "r") as f:
-            existing_html_content = f.read()
-    except FileNotFoundError:
-        existing_html_content = ""
+        graph = get_workflow(chat_message.graph)
+        session_id = validate_session_id(chat_message.session_id)
+    except KeyError as e:
+        return JSONResponse(content={"status": "error", "message": e.args[0]}, status_code=400)
+    except ValueError as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+    log = logger.bind(request_id=request_id, session_id=session_id, graph=chat_message.graph)
+    if admission_overloaded([get_agent_profile("router")["model"]]):
+        # File du modèle du routeur pleine (premier appel de la requête) : refus immédiat plutôt
+        # qu'une attente jusqu'à l'échéance ; les autres modèles bornent leur attente par l'échéance
+        log.warning("chat_message_rejected", reason="admission_queue_full")
+        REQUESTS.inc(graph=chat_message.graph, outcome="rejected")
+        return JSONResponse(
+            content={"status": "error", "message": "Server overloaded, please retry shortly"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    log.info("chat_message_received", message_chars=len(chat_message.message))
+    # L'échéance descend jusqu'aux agents par la config du graphe (voir models/resilience.py)
+    config = {"configurable": {"thread_id": session_id, "deadline": time.time() + REQUEST_DEADLINE_SECONDS}}
     async def response_generator():
         """
-        Generator function to stream workflow responses as server-sent events.
+        Generator function to stream workflow events as server-sent events
+        (see utils/stream_protocol.py for the event protocol).
         """
+        encoder = ChatEventEncoder(request_id, session_id, chat_message.graph, preview=get_preview_channel(session_id))
+        # Générateur refermé sans fin normale : le client est parti
+        outcome = "disconnected"
+        run = start_run(session_id, request_id, chat_message.graph)
+        watcher = asyncio.create_task(_watch_disconnect(request, run))
+
+        async def run_graph():
+            # Exécuté dans la tâche du run : l'annuler interrompt aussi l'attente du verrou
+            async with get_session_lock(session_id):
+                inputs = {
+                    "messages": [HumanMessage(content=chat_message.message)],
+                    "initial_user_message": chat_message.message,
+                }
+                snapshot = await graph.aget_state(config)
+                if not snapshot.values:
+                    # Première exécution de la session : partir de la page déjà sur disque
+                    inputs["existing_html_content"] = get_session_page_store(session_id).current.html
+                stream = graph.astream(inputs, config, stream_mode=["updates", "messages", "custom"])
+                async for frame in encoder.aencode(stream):
+                    yield frame
+
         try:
-            logger.info(f"[{request_id}] Starting streaming response")
-            yield json.dumps({"type": "start", "request_id": request_id}) + "\n"
-            graph = build_workflow()
-            stream = graph.stream({
-                "messages": [HumanMessage(content=chat_message.message)],
-                "initial_user_message": chat_message.message,
-                "existing_html_content": existing_html_content
-            }, stream_mode=["updates", "messages"])
-            for chunk in stream:
-                if chunk is not None:
-                    is_llm_message = isinstance(chunk, tuple) and len(chunk) == 2 and chunk[0] == 'messages'
-                    is_update_stream = isinstance(chunk, tuple) and len(chunk) == 2 and chunk[0] == 'updates'
-                    if is_llm_message:
-                        langgraph_node_info = chunk[1][1]
-                        message_from_llm = chunk[1][0]
-                        node, value = chunk
-                        if value is not None:
-                            logger.info(f"[{request_id}] Stream update from {langgraph_node_info['langgraph_node']}: {str(message_from_llm)[:100]}...")
-                            yield json.dumps({
-                                "type": "update",
-                                "node": langgraph_node_info['langgraph_node'],
-                                "value": str(message_from_llm.content)
-                            }) + "\n"
-                    elif is_update_stream:
-                        updated_state = chunk[1]
-                        node_step_name = list(updated_state.keys())[-1]
-                        node, value = chunk
-                        if updated_state is not None:
-                            logger.info(f"[{request_id}] Stream update from {node}: {str(value)[:100]}...")
-                            yield json.dumps({
-                                "type": "not_update",
-                                "node": node_step_name,
-                                "value": str(updated_state)
-                            }) + "\n"
-                    else:
-                        logger.info(f"[{request_id}] Received chunk in unknown format: {type(chunk)}")
-        except Exception as e:
-            logger.error(f"[{request_id}] Error in stream: {str(e)}", exc_info=True)
-            yield json.dumps({
-                "type": "error",
-                "error": str(e),
-                "request_id": request_id
-            }) + "\n"
+            try:
+                yield encoder.start()
+                async for frame in run.stream(run_graph()):
+                    yield frame
+                outcome = "ok"
+            except RunCancelledError as e:
+                outcome = e.reason
+                log.info("chat_run_cancelled", reason=e.reason)
+                if e.reason == "disconnected":
+                    encoder.done()  # Aborts the live preview; nobody reads the stream anymore
+                    return
+                yield encoder.error(str(e), code=e.reason)
+            except AdmissionRejectedError as e:
+                outcome = "overloaded"
+                log.warning("llm_call_rejected", error=str(e))
+                yield encoder.error(str(e), code="overloaded", retry_after=e.retry_after)
+            except DeadlineExceededError as e:
+                outcome = "deadline"
+                log.warning("request_deadline_exceeded", deadline_s=REQUEST_DEADLINE_SECONDS)
+                yield encoder.error(str(e), code="deadline")
+            except CircuitOpenError as e:
+                outcome = "unavailable"
+                log.warning("llm_circuit_open", error=str(e))
+                yield encoder.error(str(e), code="unavailable", retry_after=e.retry_after)
+            except Exception as e:
+                outcome = "error"
+                log.error("stream_error", error=str(e), exc_info=True)
+                yield encoder.error(str(e))
+            for frame in encoder.done():
+                yield frame
         finally:
-            logger.info(f"[{request_id}] Stream completed")
-            yield json.dumps({
-                "type": "final",
-                "node": "final",
-                "value": "final"
-            }) + "\n"
+            watcher.cancel()
+            if outcome == "disconnected":
+                run.cancel("disconnected")
+            finish_run(run, outcome)
+            duration = time.perf_counter() - encoder.started_at
+            REQUESTS.inc(graph=chat_message.graph, outcome=outcome)
+            REQUEST_DURATION.observe(duration, graph=chat_message.graph)
+            if encoder.ttft_seconds is not None:
+                REQUEST_TTFT.observe(encoder.ttft_seconds, graph=chat_message.graph)
+            log.info("chat_message_completed", outcome=outcome, tokens=encoder.token_count,
+                     duration_ms=round(duration * 1000, 1),
+                     ttft_ms=None if encoder.ttft_seconds is None else round(encoder.ttft_seconds * 1000, 1))
     return StreamingResponse(response_generator(), media_type="text/event-stream")
 
+@app.get("/preview-stream")
+async def preview_stream(session_id: str = DEFAULT_SESSION):
+    """
+    FastAPI endpoint pushing live preview snapshots of the page being generated
+    for a session (server-sent events: snapshot, final, abort).
+    """
+    try:
+        validate_session_id(session_id)
+    except ValueError as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+    channel = get_preview_channel(session_id)
+    async def event_generator():
+        queue = channel.subscribe()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=PREVIEW_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield sse_frame(event["event"], event["data"])
+        finally:
+            channel.unsubscribe(queue)
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/chat", response_class=HTMLResponse)
 async def chat():
     """
@@ -139,13 +293,131 @@ async def chat():
     with open("templates/index.html") as f:
         return f.read()
 
+def _stats_metrics() -> list:
+    """
+    Scrape-time collector exporting the existing runtime stats (pool, caches,
+    router, admission, resilience, speculation, cancellation, logging) as Prometheus families.
+    """
+    pool = get_pool_stats()
+    cache = get_response_cache_stats()
+    prompts = get_prompt_stats()
+    router = get_router_stats()
+    speculation = get_speculation_stats()
+    admission = get_admission_stats()["models"]
+    logging_stats = get_logging_stats()
+    cancellation = get_cancellation_stats()
+    resilience = get_resilience_stats()
+    return [
+        ("llm_http_requests_total", "counter", "Outbound HTTP requests to the LLM provider.",
+         [({}, pool["http_requests"])]),
+        ("llm_pool_connections", "gauge", "Pooled HTTP connections to the LLM provider.",
+         [({"client": client, "state": state}, pool[f"{client}_connections"][state])
+          for client in ("sync", "async") if f"{client}_connections" in pool for state in ("idle", "active")]),
+        ("llm_cache_lookups_total", "counter", "LLM response cache lookups.",
+         [({"result": result}, cache.get(key)) for result, key in
+          (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))]),
+        ("llm_cache_entries", "gauge", "LLM response cache entries.",
+         [({"level": level}, cache.get(f"{level}_entries")) for level in ("memory", "disk")]),
+        ("prompt_loads_total", "counter", "Prompt loads by source.",
+         [({"source": source}, prompts[key]) for source, key in
+          (("memory", "memory_hits"), ("disk", "disk_loads"), ("hub", "hub_pulls"))]),
+        ("router_decisions_total", "counter", "Routing decisions by path.",
+         [({"path": path}, router[path]) for path in ("fast_path", "llm_fallback")]),
+        ("speculations_total", "counter", "Speculative plans by result.",
+         [({"result": "hit"}, speculation["hits"]), ({"result": "miss"}, speculation["misses"])]),
+        ("speculation_tokens_wasted_total", "counter", "Tokens spent on discarded speculative plans.",
+         [({}, speculation["tokens_wasted"])]),
+        ("admission_in_flight", "gauge", "LLM calls in flight.",
+         [({"model": model}, stats["in_flight"]) for model, stats in admission.items()]),
+        ("admission_queue_depth", "gauge", "LLM calls waiting for admission.",
+         [({"model": model, "priority": priority}, count)
+          for model, stats in admission.items() for priority, count in stats["queued"].items()]),
+        ("admission_rejections_total", "counter", "LLM calls rejected by admission control.",
+         [({"model": model, "reason": reason}, stats[key]) for model, stats in admission.items()
+          for reason, key in (("queue_full", "rejected"), ("timeout", "timeouts"))]),
+        ("llm_attempts_total", "counter", "LLM call attempts (retries and hedges included).",
+         [({}, resilience["attempts"])]),
+        ("llm_retries_total", "counter", "LLM call retries after a transient error.",
+         [({}, resilience["retries"])]),
+        ("llm_hedges_total", "counter", "Hedged LLM calls, by result.",
+         [({"result": "started"}, resilience["hedges"]), ({"result": "won"}, resilience["hedges_won"])]),
+        ("llm_deadline_exceeded_total", "counter", "LLM calls stopped by the request deadline.",
+         [({}, resilience["deadline_exceeded"])]),
+        ("llm_breaker_rejections_total", "counter", "LLM calls rejected by an open circuit breaker.",
+         [({}, resilience["breaker_rejections"])]),
+        ("llm_breaker_open", "gauge", "1 when the model's circuit breaker is open or half-open.",
+         [({"model": model}, int(breaker["state"] != "closed")) for model, breaker in resilience["breakers"].items()]),
+        ("runs_cancelled_total", "counter", "Chat runs cancelled, by reason.",
+         [({"reason": reason}, cancellation[reason]) for reason in ("disconnected", "preempted")]),
+        ("cancelled_tokens_saved_total", "counter", "Estimated LLM output tokens saved by cancelled runs.",
+         [({}, cancellation["tokens_saved"])]),
+        ("cancelled_seconds_saved_total", "counter", "Estimated run time saved by cancelled runs.",
+         [({}, cancellation["seconds_saved"])]),
+        ("log_records_dropped_total", "counter", "Log records dropped because the log queue was full.",
+         [({}, logging_stats["dropped"])]),
+    ]
+
+
+REGISTRY.register_collector(_stats_metrics)
+
+@app.get("/metrics")
+async def metrics():
+    """
+    FastAPI endpoint exposing request, node and LLM metrics (latency histograms,
+    time to first token, token counts) and the runtime stats in the
+    Prometheus text format.
+    """
+    # Collecteurs bloquants (COUNT(*) SQLite du cache de réponses) : hors de la boucle
+    body = await asyncio.to_thread(render_metrics)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _runtime_stats() -> dict:
+    """
+    Collects the /stats payload (runs in a worker thread).
+    """
+    return {
+        "llm_pool": get_pool_stats(),
+        "prompts": get_prompt_stats(),
+        "router": get_router_stats(),
+        "response_cache": get_response_cache_stats(),
+        "edits": get_edit_stats(),
+        "speculation": get_speculation_stats(),
+        "admission": get_admission_stats(),
+        "agent_profiles": get_agent_profiles(),
+        "cancellation": get_cancellation_stats(),
+        "resilience": get_resilience_stats(),
+        "startup": get_startup_stats(),
+        "workers": get_worker_stats() if app.state.worker_index is not None else None
+    }
+
+@app.get("/stats")
+async def stats():
+    """
+    FastAPI endpoint exposing runtime statistics (LLM client pool, prompts,
+    router, response cache, page edits, speculative planning, LLM admission,
+    agent model profiles, cancelled runs, retries/hedging/circuit breakers,
+    startup phase timings and, in multi-worker mode, the load of every worker).
+    """
+    # Lectures bloquantes (COUNT(*) SQLite du cache, registre des workers) : hors de la boucle
+    return JSONResponse(content=await asyncio.to_thread(_runtime_stats))
+
 @app.get("/page", response_class=HTMLResponse)
-async def page():
+async def page(request: Request, session_id: str = DEFAULT_SESSION):
     """
     FastAPI endpoint to serve only the extracted HTML code from the generated page.
+    Served from the session's in-memory page store, with ETag/304 revalidation
+    and zstd/gzip compression.
     """
-    with open("templates/generated/page.html") as f:
-        html_content = f.read()
-        extracted_html = extract_html_only(html_content)
-        print("==> [INFO]: Extracted HTML code from page.html")
-        return extracted_html
\ No newline at end of file
+    try:
+        validate_session_id(session_id)
+    except ValueError as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+    current = get_session_page_store(session_id).current
+    headers = {"ETag": current.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if current.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=current.encoded(encoding), media_type="text/html", headers=headers)
\ No newline at end of file
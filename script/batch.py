@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from dotenv import load_dotenv
+from langchain.schema import HumanMessage
+from core.nodes import get_workflow, WORKFLOW_BUILDERS, DEFAULT_WORKFLOW
+from models.prompt_registry import preload_prompts
+from models.resilience import REQUEST_DEADLINE_SECONDS
+from utils.page_store import atomic_write
+from utils.session import validate_session_id
+from utils.stats import percentiles
+
+load_dotenv()
+
+# Statuts définitifs : une tâche déjà dans cet état n'est pas relancée à la reprise
+FINAL_STATUSES = ("ok", "no_page")
+
+
+def job_id(job: dict) -> str:
+    """
+    Returns the id of a job: its 'id' field, or a hash of its prompt and base
+    page, so that a job keeps the same id (and output file) across runs.
+    Args:
+        job (dict): One line of the input file.
+    Returns:
+        str: The job id.
+    Raises:
+        ValueError: If the given id is not a valid file name.
+    """
+    if job.get("id") is not None:
+        return validate_session_id(str(job["id"]))
+    digest = hashlib.sha256(f"{job['prompt']}\0{job.get('base_html', '')}".encode("utf-8")).hexdigest()
+    return f"job-{digest[:16]}"
+
+
+def load_jobs(path: str) -> list:
+    """
+    Reads the JSONL input file: one {"prompt", optional "id", optional
+    "base_html" or "base_html_path"} object per line.
+    Args:
+        path (str): Input file path.
+    Returns:
+        list: Jobs with their 'id', 'prompt' and 'base_html'.
+    Raises:
+        ValueError: On an invalid line or a duplicate job id.
+    """
+    jobs, seen = [], set()
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict) or not str(job.get("prompt") or "").strip():
+                    raise ValueError("a non-empty 'prompt' is required")
+                if job.get("base_html_path"):
+                    # Chemin relatif au fichier d'entrée
+                    base_path = os.path.join(os.path.dirname(os.path.abspath(path)), job["base_html_path"])
+                    with open(base_path, encoding="utf-8") as base_file:
+                        job["base_html"] = base_file.read()
+                identifier = job_id(job)
+            except (ValueError, OSError) as e:
+                raise ValueError(f"{path}:{number}: {e}") from e
+            if identifier in seen:
+                raise ValueError(f"{path}:{number}: duplicate job id '{identifier}'")
+            seen.add(identifier)
+            jobs.append({"id": identifier, "prompt": job["prompt"], "base_html": job.get("base_html") or ""})
+    return jobs
+
+
+def load_progress(path: str) -> dict:
+    """
+    Reads the progress checkpoint (one JSON record per finished job, the last
+    record of a job wins). A truncated last line left by an interrupted run
+    is ignored.
+    Args:
+        path (str): Progress file path.
+    Returns:
+        dict: Last record of each job id.
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["id"]] = record
+    return records
+
+
+class ProgressLog:
+    """
+    Append-only progress checkpoint: each finished job is written and synced
+    to disk before the next one is recorded, so an interrupted run resumes
+    from the last recorded job.
+    """
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = asyncio.Lock()
+
+    async def record(self, record: dict) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._write, json.dumps(record) + "\n")
+
+    def _write(self, line: str) -> None:
+        self._file.write(line)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def run_job(graph, job: dict, out_dir: str) -> dict:
+    """
+    Runs the workflow graph for one job. The code generator writes the page
+    atomically to <out_dir>/<id>.html (the config's page_path).
+    Args:
+        graph: Compiled workflow graph.
+        job (dict): The job.
+        out_dir (str): Output directory.
+    Returns:
+        dict: Progress record: id, status, latency_ms, output, bytes, error.
+    """
+    output = os.path.join(out_dir, f"{job['id']}.html")
+    record = {"id": job["id"], "status": None, "latency_ms": None, "output": None, "bytes": 0, "error": None}
+    config = {"configurable": {
+        "thread_id": job["id"],
+        "page_path": output,
+        # Échéance de la tâche, partagée par tous ses appels LLM (voir models/resilience.py)
+        "deadline": time.time() + REQUEST_DEADLINE_SECONDS,
+    }}
+    start = time.perf_counter()
+    try:
+        result = await graph.ainvoke({
+            "messages": [HumanMessage(content=job["prompt"])],
+            "initial_user_message": job["prompt"],
+            "existing_html_content": job["base_html"],
+        }, config)
+        if result.get("final_html_content") is None:
+            # Le routeur a choisi une réponse naturelle : aucune page n'a été écrite
+            record["status"] = "no_page"
+            record["error"] = result["messages"][-1].content[:500] if result.get("messages") else None
+        else:
+            record["status"] = "ok"
+            record["output"] = os.path.relpath(output, out_dir)
+            record["bytes"] = len(result["final_html_content"].encode("utf-8"))
+    except Exception as e:
+        # Surcharge, échéance dépassée, disjoncteur ouvert... : la tâche sera relancée à la reprise
+        record["status"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+async def run_batch(args) -> int:
+    """
+    Runs every pending job with at most --concurrency jobs in flight, records
+    each finished job in the progress file and writes the report.
+    Returns:
+        int: Exit status (1 if a job failed).
+    """
+    jobs = load_jobs(args.input)
+    os.makedirs(args.out, exist_ok=True)
+    progress_path = os.path.join(args.out, "progress.jsonl")
+    done = {
+        identifier: record for identifier, record in load_progress(progress_path).items()
+        if record["status"] in FINAL_STATUSES and (record["status"] != "ok" or os.path.exists(os.path.join(args.out, record["output"])))
+    }
+    pending = [job for job in jobs if job["id"] not in done]
+    print(f"==> [INFO]: {len(jobs)} jobs, {len(jobs) - len(pending)} already done, {len(pending)} to run "
+          f"(graph {args.graph}, concurrency {args.concurrency})")
+
+    for prompt_name, error in preload_prompts().items():
+        print(f"==> [WARN]: Prompt {prompt_name} not loaded: {error}")
+    graph = get_workflow(args.graph)
+    progress = ProgressLog(progress_path)
+    queue = asyncio.Queue()
+    for job in pending:
+        queue.put_nowait(job)
+    records = []
+
+    async def worker():
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            record = await run_job(graph, job, args.out)
+            await progress.record(record)
+            records.append(record)
+            level = "OK" if record["status"] == "ok" else "WARN"
+            print(f"==> [{level}]: [{len(records)}/{len(pending)}] {record['id']} {record['status']} "
+                  f"in {record['latency_ms']} ms" + (f": {record['error']}" if record["status"] == "failed" else ""))
+
+    start = time.perf_counter()
+    # Statut de sortie calculé à partir des tâches, indépendamment de l'écriture du rapport
+    status = 1
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+        status = 1 if any(record["status"] == "failed" for record in records) else 0
+    finally:
+        progress.close()
+        wall_seconds = time.perf_counter() - start
+        report = batch_report(args, records, wall_seconds, len(jobs) - len(pending))
+        atomic_write(os.path.join(args.out, "report.json"), json.dumps(report, indent=2))
+        summary = report["summary"]
+        print(f"==> [INFO]: {summary['ok']} pages, {summary['no_page']} without page, {summary['failed']} failed "
+              f"in {summary['wall_seconds']}s ({summary['jobs_per_second']} jobs/s)")
+        latency = summary["latency_ms"]
+        print(f"    latency_ms p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+        print(f"==> [OK]: Report saved to {os.path.join(args.out, 'report.json')}")
+    return status
+
+
+def batch_report(args, records: list, wall_seconds: float, skipped: int) -> dict:
+    """
+    Builds the run report: throughput, latency percentiles and per-job results.
+    Args:
+        args: Parsed command-line arguments.
+        records (list): Records of the jobs run in this invocation.
+        wall_seconds (float): Duration of the run.
+        skipped (int): Jobs already done by a previous run.
+    Returns:
+        dict: The report.
+    """
+    statuses = [record["status"] for record in records]
+    return {
+        "config": {"input": args.input, "graph": args.graph, "concurrency": args.concurrency},
+        "summary": {
+            "jobs": len(records),
+            "skipped": skipped,
+            "ok": statuses.count("ok"),
+            "no_page": statuses.count("no_page"),
+            "failed": statuses.count("failed"),
+            "wall_seconds": round(wall_seconds, 2),
+            "jobs_per_second": round(len(records) / wall_seconds, 3) if wall_seconds > 0 else None,
+            "latency_ms": percentiles([record["latency_ms"] for record in records]),
+        },
+        "jobs": records,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate pages offline from a JSONL file of prompts.")
+    parser.add_argument("input", help="JSONL file: one {\"prompt\", optional \"id\", \"base_html\" or \"base_html_path\"} per line")
+    parser.add_argument("--out", default=os.path.join("templates", "generated", "batch"), help="Output directory (pages, progress.jsonl, report.json)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Jobs in flight")
+    parser.add_argument("--graph", default=DEFAULT_WORKFLOW, choices=list(WORKFLOW_BUILDERS), help="Workflow variant")
+    sys.exit(asyncio.run(run_batch(parser.parse_args())))
@@ -1,7 +1,7 @@
 async function clearPage() {
     try {
         // Appel du backend pour vider la page
-        let res = await fetch("http://localhost:8000/clear-page");
+        let res = await fetch(`http://localhost:8000/clear-page?session_id=${encodeURIComponent(SESSION_ID)}`);
         let data = await res.json();
         console.log(data);
 
@@ -1,7 +1,40 @@
-// Add these declarations at the top level, outside any function
-let htmlPreviewContent = '';
-let lastSentPosition = 0;
-const CONTENT_CHUNK_SIZE = 80; // Send 80 characters at a time
+// One session per browser tab: the server keeps the conversation state and page per session
+const SESSION_ID = (() => {
+    let sessionId = sessionStorage.getItem('sessionId');
+    if (!sessionId) {
+        sessionId = (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`).replace(/[^A-Za-z0-9_-]/g, '');
+        sessionStorage.setItem('sessionId', sessionId);
+    }
+    return sessionId;
+})();
+
+function sessionPageUrl() {
+    return `http://localhost:8000/page?session_id=${encodeURIComponent(SESSION_ID)}`;
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const iframe = document.getElementById('myIframe');
+    if (iframe) {
+        iframe.src = sessionPageUrl();
+    }
+    subscribeToPreview();
+});
+
+// Server-push live preview: well-formed snapshots of the page while it is generated
+function subscribeToPreview() {
+    const previewSource = new EventSource(`http://localhost:8000/preview-stream?session_id=${encodeURIComponent(SESSION_ID)}`);
+    previewSource.addEventListener('snapshot', (event) => {
+        updateLivePreview(JSON.parse(event.data).html);
+    });
+    previewSource.addEventListener('final', (event) => {
+        // The page has been committed: show the stored version
+        const iframe = document.getElementById('myIframe');
+        iframe.src = `http://localhost:8000${JSON.parse(event.data).url}`;
+    });
+    previewSource.addEventListener('abort', () => {
+        hideLivePreview();
+    });
+}
 
 function extractHtmlSections(rawValue) {
     const htmlStart = rawValue.indexOf('<html');
@@ -50,6 +83,10 @@ function formatMarkdown(text) {
     return formatted.replace(/^<br>/, '');
 }
 
+function formatNodeName(node) {
+    return node.replace(/_/g, ' ').replace(/^\w/, c => c.toUpperCase());
+}
+
 function escapeHtml(str) {
     return str
         .replace(/&/g, '&amp;')
@@ -66,9 +103,6 @@ async function sendMessage() {
         const inputArea = document.querySelector('.input-area');
         const iframe = document.querySelector('.iframe-section iframe');
         
-        // Reset the HTML preview buffer for a new message
-        htmlPreviewContent = '';
-        lastSentPosition = 0;
         inputArea.classList.add('loading');
         
         // Add the user's message to the chat history
@@ -121,7 +155,20 @@ async function sendMessage() {
         
         // Track active nodes and processed steps
         const processedNodes = new Map();
+        const nodeText = new Map(); // Full text streamed by each node
         let activeStep = '';
+
+        // Create (once) the node entry in the workflow details
+        function getWorkflowNode(node) {
+            if (!processedNodes.has(node)) {
+                const nodeEl = document.createElement('div');
+                nodeEl.className = 'workflow-node';
+                nodeEl.innerHTML = `<div class="node-title">${formatNodeName(node)}</div><div class="node-content"></div>`;
+                workflowContent.appendChild(nodeEl);
+                processedNodes.set(node, nodeEl);
+            }
+            return processedNodes.get(node);
+        }
         
         let shouldAutoScroll = true;
 
@@ -139,7 +186,7 @@ async function sendMessage() {
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({ message: messageText })
+                body: JSON.stringify({ message: messageText, session_id: SESSION_ID })
             });
             
             if (!response.ok) {
@@ -151,7 +198,7 @@ async function sendMessage() {
             const decoder = new TextDecoder();
             let buffer = '';
             
-            // Process the stream
+            // Process the stream: SSE frames ("event: <type>\ndata: <json>\n\n"), protocol v1
             while (true) {
                 const { done, value } = await reader.read();
                 
@@ -162,92 +209,56 @@ async function sendMessage() {
                 // Decode the chunk and add to buffer
                 buffer += decoder.decode(value, { stream: true });
                 
-                // Process complete lines in the buffer
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || ''; // Keep the last incomplete line in the buffer
+                // Process complete frames in the buffer
+                const frames = buffer.split('\n\n');
+                buffer = frames.pop() || ''; // Keep the last incomplete frame in the buffer
                 
-                for (const line of lines) {
-                    if (line.trim() === '') continue;
+                for (const frame of frames) {
+                    let eventType = 'message';
+                    let payload = '';
+                    for (const line of frame.split('\n')) {
+                        if (line.startsWith('event: ')) {
+                            eventType = line.slice(7);
+                        } else if (line.startsWith('data: ')) {
+                            payload += line.slice(6);
+                        }
+                    }
+                    if (!payload) continue;
                     try {
-                        const data = JSON.parse(line);
+                        const data = JSON.parse(payload);
                         
-                        if (data.type === 'start') {
-                            //console.log('Thinking...', data.request_id);
-                            statusIndicator.innerHTML = 'Thinking...';
-                        } 
-                        else if (data.type === 'update') {
-                            // Format the node name for display
-                            const nodeName = data.node.replace(/_/g, ' ').replace(/([A-Z])/g, ' $1')
-                                .replace(/^\w/, c => c.toUpperCase());
-                            
-                            // Check if this is a message chunk update (streaming tokens)
-                            if (data.node === 'messages') {
-                                // Try to extract the message content from the AIMessageChunk
-                                const messageChunkMatch = data.value.match(/AIMessageChunk\(content='([^']*)'/);
-                                if (messageChunkMatch) {
-                                    // Even if the content is empty, we get the match object
-                                    const chunkContent = messageChunkMatch[1] ? messageChunkMatch[1].replace(/\\n/g, '\n') : '';
-                                    
-                                    // Get the langgraph_node info to know which node is generating this content
-                                    const nodeInfoMatch = data.value.match(/'langgraph_node':\s*'([^']+)'/);
-                                    const currentNode = nodeInfoMatch ? nodeInfoMatch[1] : null;
-                                    
-                                    // If we still have the typing indicator, remove it first
-                                    if (responseContent.querySelector('.typing-indicator')) {
-                                        responseContent.innerHTML = '';
-                                    }
-                                    
-                                    // Append the new content to the response area
-                                    responseContent.innerHTML += chunkContent;
-                                    
-                                    // Update status to show current node
-                                    if (currentNode) {
-                                        statusIndicator.innerHTML = `
-                                            <svg xmlns="http://www.w3.org/2000/svg" width="12" height="12" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                                                <path d="M21 15a2 2 0 0 1-2 2H7l-4 4V5a2 2 0 0 1 2-2h14a2 2 0 0 1 2 2z"></path>
-                                            </svg>
-                                            ${formatNodeName(currentNode)} is Responding...
-                                        `;
-                                    }
-                                    
-                                    // Scroll to the bottom of the message history
-                                    messageHistory.scrollTop = messageHistory.scrollHeight;
-                                    return; // Skip the rest of the processing for this node
-                                }
+                        if (eventType === 'start') {
+                            if (data.v !== 1) {
+                                console.warn('Unsupported stream protocol version:', data.v);
                             }
-                            
-                            // Update status to show current step
+                            statusIndicator.innerHTML = 'Thinking...';
+                        }
+                        else if (eventType === 'node_start') {
+                            const nodeName = formatNodeName(data.node);
                             statusIndicator.innerHTML = `Thinking.. ${nodeName}...`;
                             activeStep = data.node;
-                            
-                            // Create or update the node in workflow details
-                            if (!processedNodes.has(data.node)) {
-                                //console.log('Adding new node:', data.node);
-                                const nodeEl = document.createElement('div');
-                                nodeEl.className = 'workflow-node';
-                                nodeEl.innerHTML = `<div class="node-title">${nodeName}</div><div class="node-content"></div>`;
-                                workflowContent.appendChild(nodeEl);
-                                processedNodes.set(data.node, nodeEl);
-                            }
-                            
-                            // Update node content by appending rather than replacing
-                            const nodeEl = processedNodes.get(data.node);
+                            getWorkflowNode(data.node);
+                        }
+                        else if (eventType === 'node_end') {
+                            const nodeTitle = getWorkflowNode(data.node).querySelector('.node-title');
+                            nodeTitle.textContent = `${formatNodeName(data.node)} (${(data.duration_ms / 1000).toFixed(2)}s)`;
+                        }
+                        else if (eventType === 'token') {
+                            // Nœud fusionné : le plan et le HTML s'affichent dans les panneaux des deux étapes
+                            const displayNode = data.part === 'html' ? 'write_html_code'
+                                : data.part === 'plan' ? 'design_and_plan' : data.node;
+                            // Opérations de patch : texte accumulé à part, affiché tel quel
+                            const textKey = data.part === 'patch' ? `${displayNode}:patch` : displayNode;
+                            // Update node content by appending only the new text
+                            const nodeEl = getWorkflowNode(displayNode);
                             const nodeContent = nodeEl.querySelector('.node-content');
-                            
-                            // We'll store the full content in a data attribute to avoid truncation issues when appending
-                            if (!nodeContent.hasAttribute('data-full-content')) {
-                                nodeContent.setAttribute('data-full-content', '');
-                            }
-                            
-                            // Append the new value to our stored full content
-                            const currentFullContent = nodeContent.getAttribute('data-full-content');
-                            const newFullContent = currentFullContent + data.value;
-                            // console.log('Received data from stream:', data.value);
-                            //console.log('Got data from stream:', data);
-                            nodeContent.setAttribute('data-full-content', newFullContent);
+                            nodeText.set(textKey, (nodeText.get(textKey) || '') + data.text);
+                            const newFullContent = nodeText.get(textKey);
                             
                             // Update the displayed content (show full content, not truncated)
-                            if (data.node === 'write_html_code') {
+                            if (data.part === 'patch') {
+                                nodeContent.textContent = newFullContent;
+                            } else if (displayNode === 'write_html_code') {
                                 // Extraire la section HTML
                                 const { html } = extractHtmlSections(newFullContent);
                                 nodeContent.textContent = escapeHtml(html);
@@ -256,24 +267,23 @@ async function sendMessage() {
                             }
                     
                             // If this is respond_naturally, update the main response content
-                            let naturalResponseBuffer = '';
                             if (data.node === 'respond_naturally') {
                                 // Remove typing indicator if present
                                 if (responseContent.querySelector('.typing-indicator')) {
                                     responseContent.innerHTML = '';
                                 }
-                                // Ajoute le chunk au buffer
-                                naturalResponseBuffer += data.value;
-                                // Affiche le buffer (remplace tout le contenu à chaque chunk)
-                                responseContent.innerHTML = naturalResponseBuffer.replace(/\n/g, '<br>');
+                                responseContent.innerHTML = escapeHtml(newFullContent).replace(/\n/g, '<br>');
+                                statusIndicator.innerHTML = `
+                                    <svg xmlns="http://www.w3.org/2000/svg" width="12" height="12" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
+                                        <path d="M21 15a2 2 0 0 1-2 2H7l-4 4V5a2 2 0 0 1 2-2h14a2 2 0 0 1 2 2z"></path>
+                                    </svg>
+                                    ${formatNodeName(data.node)} is Responding...
+                                `;
                             }
                             
                             // Check if this is a write_html_code node
                             if (data.node === 'write_html_code') {
-                                const { intro, html, outro } = extractHtmlSections(data.value);
-                                console.log('HTML content received:', html);
-                                console.log('Intro:', intro);
-                                console.log('Outro:', outro);
+                                const { intro, html, outro } = extractHtmlSections(newFullContent);
                                 // If we don't already have a code display, create one
                                 let codeDisplay = responseContent.querySelector('pre.code-display');
                                 if (!codeDisplay) {
@@ -287,17 +297,19 @@ async function sendMessage() {
                                 }
                                 let codeDesc = responseContent.querySelector('.code-display-description');
                                 if (intro) {
-                                    // Concatène l'intro (pour chunks successifs)
                                     codeDesc.innerHTML = formatMarkdown(intro);
                                 }
                                 // Get the code element
                                 const codeElement = codeDisplay.querySelector('code');
-                                // Show the code display
-                                if (data.value.includes('</html>')) {
+                                // Show the code display once the document is complete
+                                if (html && codeDisplay.style.display === 'none') {
                                     codeDisplay.style.display = 'block';
-                                    responseContent.querySelector('.typing-indicator').remove();
+                                    const typingIndicator = responseContent.querySelector('.typing-indicator');
+                                    if (typingIndicator) {
+                                        typingIndicator.remove();
+                                    }
                                 }
-                                codeElement.textContent += html;
+                                codeElement.textContent = html;
                                 if (window.Prism) {
                                     Prism.highlightElement(codeElement);
                                 }
@@ -309,16 +321,6 @@ async function sendMessage() {
                                     }
                                 }
 
-                                // Add received chunk to the HTML preview buffer
-                                htmlPreviewContent += data.value;
-
-                                // Start or continue processing the HTML preview content
-                                if (!window.processingPreview) {
-                                    window.processingPreview = true;
-                                    // console.log('Starting preview processing');
-                                    processPreviewContent();
-                                }
-                                
                                 // Scroll the code block to the bottom for better UX
                                 codeDisplay.scrollTop = codeDisplay.scrollHeight;
                                 
@@ -336,71 +338,36 @@ async function sendMessage() {
                             if (shouldAutoScroll) {
                                 messageHistory.scrollTop = messageHistory.scrollHeight;
                             }
-                        } 
-                        else if (data.type === 'final') {
-                            // Update status to show completion
-                            statusIndicator.innerHTML = `
-                                <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                                    <polyline points="20 6 9 17 4 12"></polyline>
-                                </svg>
-                                Task Completed!
-                            `;
-                            
-                            // Display the final message content
-                            if (data.messages && data.messages.length > 0) {
-                                const lastMessage = data.messages[data.messages.length - 1];
-                                
-                                // Remove typing indicator if present
-                                if (responseContent.querySelector('.typing-indicator')) {
-                                    responseContent.innerHTML = '';
-                                }
-                                
-                                responseContent.innerHTML = lastMessage.content.replace(/\n/g, '<br>');
+                        }
+                        else if (eventType === 'artifact') {
+                            // The page is not inlined: reload it from its reference
+                            iframe.src = `http://localhost:8000${data.url}`;
+                        }
+                        else if (eventType === 'done') {
+                            // Make sure the message content is visible and not just a typing indicator
+                            if (responseContent.querySelector('.typing-indicator')) {
+                                const { intro } = extractHtmlSections(nodeText.get('write_html_code') || '');
+                                responseContent.innerHTML = intro ? `<div class="intro-text" style="margin-top: 8px;">${formatMarkdown(intro)}</div>` : '';
                             }
                             
-                            // Refresh the iframe if HTML was updated
-                            setTimeout(() => {
-                                iframe.src = iframe.src;
-                            }, 100);
-                            //console.log('Stream ended:', data.request_id);
-                            
                             // Update status to show completion with check mark
                             statusIndicator.innerHTML = `
                                 <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
                                     <polyline points="20 6 9 17 4 12"></polyline>
                                 </svg>
-                                Complete
+                                Complete (${(data.t_ms / 1000).toFixed(1)}s)
                             `;
-                            
-                            // Make sure the message content is visible and not just a typing indicator
-                            if (responseContent.querySelector('.typing-indicator')) {
-                                const { intro, html, outro } = extractHtmlSections(data.value);
-                                // If we somehow reached the end without receiving a final message content,
-                                // replace the typing indicator with a completed message
-                                if (intro) {
-                                    // Pour éviter de dupliquer l'outro, vérifie si elle est déjà là
-                                    if (!responseContent.querySelector('.intro-text')) {
-                                        responseContent.innerHTML += `<div class="intro-text" style="margin-top: 8px;">${intro}</div>`;
-                                    }
-                                }
-                            }
-                            
-                            // Reset HTML preview content
-                            htmlPreviewContent = '';
-                            lastSentPosition = 0;
-                            window.processingPreview = false;
-                            
-                            // Refresh the iframe to show any HTML changes
-                            setTimeout(() => {
-                                iframe.src = iframe.src;
-                            }, 100);
                         }
-                        else if (data.type === 'error') {
-                            statusIndicator.innerHTML = `Error: ${data.error}`;
+                        else if (eventType === 'error' && data.code === 'preempted') {
+                            // Un message plus récent de la session a remplacé cette exécution
+                            statusIndicator.textContent = 'Superseded by a newer message';
+                        }
+                        else if (eventType === 'error') {
+                            statusIndicator.innerHTML = `Error: ${escapeHtml(data.message)}`;
                             statusIndicator.style.color = '#ff6b6b';
                         }
                     } catch (e) {
-                        //console.error('Error parsing stream data:', e, line);
+                        //console.error('Error parsing stream data:', e, frame);
                     }
                 }
             }
@@ -424,7 +391,7 @@ document.getElementById('messageInput').addEventListener('keypress', function(e)
 
 // Ajoute un bouton de préférence pour minimiser/maximiser le panneau de prévisualisation
 
-function updateLivePreview(codeSnippet) {
+function updateLivePreview(snapshotHtml) {
     let previewOverlay = document.getElementById('livePreviewOverlay');
     let previewContainer, titleOverlay, previewFrame, preferenceBtn, closeBtn;
     // On stocke isMinimized sur l'élément pour le garder entre les appels
@@ -497,73 +464,18 @@ function updateLivePreview(codeSnippet) {
     // Always show overlay when updating preview
     previewOverlay.style.display = 'flex';
     
-    // Process code snippet if it's a valid string
-    if (typeof codeSnippet === 'string') {
-        if (codeSnippet.includes('<html')) {
-            previewOverlay.htmlContent = '';
-            previewOverlay.previewFinished = false;
-        }
-        if (!previewOverlay.htmlContent) previewOverlay.htmlContent = '';
-        previewOverlay.htmlContent += codeSnippet;
-        console.log('==> [INFO] snippet:', codeSnippet);
-
-        // Cherche le début de la balise <html
-        const htmlStart = previewOverlay.htmlContent.indexOf('<html');
-        // Cherche la fin du document HTML
-        const htmlEnd = previewOverlay.htmlContent.indexOf('</html>', htmlStart);
-
-        // VRAI LIVE : on affiche tout à partir de <html, même si </html> n'est pas encore là
-        if (htmlStart !== -1) {
-            let htmlToDisplay;
-            if (htmlEnd !== -1) {
-                // Si on a la fin, on affiche que le HTML complet
-                htmlToDisplay = previewOverlay.htmlContent.slice(htmlStart, htmlEnd + 7);
-            } else {
-                // Sinon, on affiche tout ce qu'on a reçu depuis <html (progression live)
-                htmlToDisplay = previewOverlay.htmlContent.slice(htmlStart);
-            }
-
-            try {
-                const frameDoc = previewFrame.contentDocument || previewFrame.contentWindow.document;
-                frameDoc.open();
-                frameDoc.write(htmlToDisplay);
-                frameDoc.close();
-            } catch (e) {
-                console.log('Error updating live preview:', e);
-            }
-        }
-
-        // Optionnel : flag pour ne plus actualiser après la fin
-        if (htmlEnd !== -1) {
-            previewOverlay.previewFinished = true;
-            console.log('Preview HTML terminé !');
-        }
-    } else {
-        console.error('Invalid content type:', codeSnippet);
-    }
-}
-
-// Replace processHtmlBuffer with this
-function processPreviewContent() {
-    //console.log('Processing content, position:', lastSentPosition, 'of', htmlPreviewContent.length);
-    if (htmlPreviewContent.length > lastSentPosition) {
-        
-        const chunk = htmlPreviewContent.substring(lastSentPosition, lastSentPosition + CONTENT_CHUNK_SIZE);
-        lastSentPosition += chunk.length;
-        //console.log('Sending chunk of length:', chunk.length);
-       // console.log("===> htmlPreviewContent:", htmlPreviewContent);
-        updateLivePreview(chunk);
-        
-        // If there's more to process, schedule the next chunk
-        if (htmlPreviewContent.length > lastSentPosition) {
-            setTimeout(processPreviewContent, 60); // Process every 60ms for a smooth effect
-        } else {
-            window.processingPreview = false;
-            //console.log('Content processing complete');
+    // Render the well-formed snapshot pushed by the server (replaces the previous one)
+    if (typeof snapshotHtml === 'string') {
+        try {
+            const frameDoc = previewFrame.contentDocument || previewFrame.contentWindow.document;
+            frameDoc.open();
+            frameDoc.write(snapshotHtml);
+            frameDoc.close();
+        } catch (e) {
+            console.log('Error updating live preview:', e);
         }
     } else {
-        window.processingPreview = false;
-        console.log('No more content to process');
+        console.error('Invalid content type:', snapshotHtml);
     }
 }
 
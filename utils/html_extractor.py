@@ -3,17 +3,212 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import re
 
+_FENCE = "```"
+_DOCUMENT_STARTS = ("<!doctype", "<html")
+_DOCUMENT_END = "</html>"
+# Longueur max d'un marqueur : un début de marqueur ('<' ou '`') dans la fin d'un morceau est retenu
+_HOLD_BACK = max(len(marker) for marker in (_FENCE, _DOCUMENT_END) + _DOCUMENT_STARTS) - 1
+_FRAGMENT_START_RE = re.compile(r"<[A-Za-z!]")
+
+_SEEKING, _FENCE_INFO, _IN_BLOCK, _IN_DOCUMENT, _DONE = range(5)
+
+
+class StreamingHtmlExtractor:
+    """
+    Incremental state machine extracting the HTML document from a model
+    output fed chunk by chunk, in a single linear pass:
+
+    - prose before the document is dropped;
+    - the document starts at a doctype or <html, inside a Markdown fence
+      (```html) or not; fenced blocks without one (```css, ```js) are skipped;
+    - it ends at </html>, or at the closing fence when it was opened by a
+      fence (a fence inside an unfenced page, e.g. in a <pre>, is content);
+      trailing prose is dropped;
+    - outputs without doctype/<html> wrapper (fragments) are kept from their
+      first tag: the first fenced block containing a tag, else the prose.
+
+    A possible marker start ('<' or '`') at the end of a chunk is held back
+    until the next one, so that markers split across tokens are still recognized.
+    """
+    def __init__(self):
+        self._state = _SEEKING
+        self._pending = ""
+        self._parts = []
+        self._preamble = []
+        self._fragment_start = None
+        self._preamble_size = 0
+        # Le document a été ouvert par une clôture ``` (seule une clôture peut alors le terminer)
+        self._fenced = False
+        # Bloc délimité en cours sans doctype/<html>, et premier bloc contenant un tag
+        self._block = []
+        self._block_fragment = None
+
+    @property
+    def done(self) -> bool:
+        """
+        True once the end of the document has been reached.
+        """
+        return self._state == _DONE
+
+    @property
+    def html(self) -> str:
+        """
+        The document extracted so far (the fragment from its first tag while
+        no document boundary has been found).
+        """
+        if self._state in (_SEEKING, _FENCE_INFO, _IN_BLOCK):
+            return self._fragment()
+        return "".join(self._parts).lstrip()
+
+    def feed(self, chunk: str) -> str:
+        """
+        Feeds the next chunk of model output.
+        Args:
+            chunk (str): New text.
+        Returns:
+            str: Document text extracted from this chunk (may be empty).
+        """
+        if self._state == _DONE or not chunk:
+            return ""
+        if not self._pending and self._state != _FENCE_INFO and "<" not in chunk and "`" not in chunk:
+            # Aucun marqueur possible dans ce morceau
+            extracted = []
+            self._consume(chunk, extracted)
+            return "".join(extracted)
+        return self._scan(self._pending + chunk, final=False)
+
+    def close(self) -> str:
+        """
+        Flushes the held-back characters and returns the extracted document.
+        Returns:
+            str: The clean HTML ('' if the output contains no tag).
+        """
+        if self._state != _DONE and self._pending:
+            self._scan(self._pending, final=True)
+        self._pending = ""
+        if self._state == _IN_BLOCK:
+            # Bloc jamais refermé
+            self._end_block()
+        if self._state in (_SEEKING, _FENCE_INFO):
+            return self._fragment().strip()
+        self._state = _DONE
+        return "".join(self._parts).strip()
+
+    def _keep(self, text: str) -> None:
+        if text:
+            self._parts.append(text)
+
+    def _remember_preamble(self, text: str) -> None:
+        if self._fragment_start is None:
+            # Le '<' du début de fragment peut terminer le morceau précédent
+            previous = self._preamble[-1][-1:] if self._preamble else ""
+            match = _FRAGMENT_START_RE.search(previous + text)
+            if match is not None:
+                self._fragment_start = self._preamble_size - len(previous) + match.start()
+        self._preamble.append(text)
+        self._preamble_size += len(text)
+
+    def _fragment(self) -> str:
+        # Pas de document : le bloc en cours ou le premier bloc contenant un tag, sinon la prose
+        match = _FRAGMENT_START_RE.search("".join(self._block)) if self._block else None
+        if match is not None:
+            return "".join(self._block)[match.start():].lstrip()
+        if self._block_fragment is not None:
+            return self._block_fragment
+        if self._fragment_start is not None:
+            return "".join(self._preamble)[self._fragment_start:].lstrip()
+        return ""
+
+    def _end_block(self) -> None:
+        block = "".join(self._block)
+        match = _FRAGMENT_START_RE.search(block)
+        if self._block_fragment is None and match is not None:
+            self._block_fragment = block[match.start():].lstrip()
+        self._block = []
+        self._state = _SEEKING
+
+    def _scan(self, text: str, final: bool) -> str:
+        lowered = text.lower()
+        position = 0
+        extracted = []
+        while position < len(text) and self._state != _DONE:
+            if self._state == _FENCE_INFO:
+                # Langage de la clôture (```html) : ignoré jusqu'à la fin de ligne ou au premier tag
+                ends = [index for index in (text.find("\n", position), text.find("<", position)) if index != -1]
+                if not ends:
+                    position = len(text)
+                    break
+                position = min(ends) + (text[min(ends)] == "\n")
+                self._state = _IN_BLOCK
+                continue
+            if self._state in (_SEEKING, _IN_BLOCK):
+                markers = [(lowered.find(m, position), m) for m in (_FENCE,) + _DOCUMENT_STARTS]
+            elif self._fenced:
+                markers = [(lowered.find(m, position), m) for m in (_FENCE, _DOCUMENT_END)]
+            else:
+                markers = [(lowered.find(_DOCUMENT_END, position), _DOCUMENT_END)]
+            found = [(index, marker) for index, marker in markers if index != -1]
+            if not found:
+                safe = len(text)
+                if not final:
+                    tail = max(position, len(text) - _HOLD_BACK)
+                    candidates = [index for index in (text.find("<", tail), text.find("`", tail)) if index != -1]
+                    if candidates:
+                        safe = min(candidates)
+                self._consume(text[position:safe], extracted)
+                position = safe
+                break
+            index, marker = min(found)
+            self._consume(text[position:index], extracted)
+            if self._state in (_SEEKING, _IN_BLOCK):
+                if marker != _FENCE:
+                    self._fenced = self._state == _IN_BLOCK
+                    self._block = []
+                    self._state = _IN_DOCUMENT
+                    self._parts = []
+                    position = index
+                elif self._state == _IN_BLOCK:
+                    # Bloc refermé sans document (```css, ```js, fragment) : la recherche continue
+                    self._end_block()
+                    position = index + len(marker)
+                else:
+                    self._state = _FENCE_INFO
+                    position = index + len(marker)
+            elif marker == _DOCUMENT_END:
+                end = index + len(marker)
+                self._consume(text[index:end], extracted)
+                self._state = _DONE
+                position = end
+            else:
+                # Clôture de fin de bloc : le document s'arrête là
+                self._state = _DONE
+                position = index + len(marker)
+        self._pending = "" if self._state == _DONE else text[position:]
+        return "".join(extracted)
+
+    def _consume(self, text: str, extracted: list) -> None:
+        if not text:
+            return
+        if self._state == _SEEKING:
+            self._remember_preamble(text)
+        elif self._state == _IN_BLOCK:
+            self._block.append(text)
+        elif self._state == _IN_DOCUMENT:
+            if not self._parts:
+                text = text.lstrip()
+                if not text:
+                    return
+            self._keep(text)
+            extracted.append(text)
+
+
 def extract_html_only(text):
     """
-    Extracts only the HTML code between <html> and </html> tags from the input text.
-    Also removes Markdown code block markers (```html ... ```).
+    Extracts the HTML document from a model output: drops the surrounding
+    prose and Markdown code block markers (```html ... ```), keeps the
+    doctype when present and supports outputs without <html> wrapper.
     Returns the cleaned HTML code as a string, or an empty string if not found.
     """
-    match = re.search(r'<html[\s\S]*?</html>', text, re.IGNORECASE)
-    if match:
-        html_code = match.group(0)
-        # Remove Markdown code block markers
-        html_code = re.sub(r'```html\s*', '', html_code)
-        html_code = re.sub(r'```', '', html_code)
-        return html_code.strip()
-    return ''
\ No newline at end of file
+    extractor = StreamingHtmlExtractor()
+    extractor.feed(text or "")
+    return extractor.close()
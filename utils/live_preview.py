@@ -0,0 +1,202 @@
+import os
+import sys
+import re
+import time
+import asyncio
+import weakref
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.html_extractor import StreamingHtmlExtractor
+
+# Intervalle minimal entre deux instantanés de prévisualisation envoyés aux clients
+PREVIEW_THROTTLE_MS = float(os.getenv("PREVIEW_THROTTLE_MS", "200"))
+
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+# Éléments à contenu brut : leur texte n'est pas du HTML
+_RAW_TEXT_TAGS = {"script", "style", "textarea", "title"}
+_TAG_RE = re.compile(
+    r"<!--.*?-->|<![^>]*>|<\?[^>]*>|<(/?)([A-Za-z][A-Za-z0-9:-]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+    re.S
+)
+_PARTIAL_ENTITY_RE = re.compile(r"&[#A-Za-z0-9]*$")
+# Sortie au format patch (voir utils/patch_engine.py) : pas un document à prévisualiser
+_PATCH_OP_RE = re.compile(r"^@@ (REPLACE|INSERT|DELETE|END)\b", re.M)
+# Les opérations de patch apparaissent dès le début de la sortie
+_PATCH_DETECTION_CHARS = 512
+
+
+def close_open_tags(partial_html: str) -> str:
+    """
+    Turns a truncated HTML document into a well-formed one: drops a trailing
+    unfinished tag, comment or entity, and an unclosed <script> (never run
+    half a script), then closes every element left open.
+    Args:
+        partial_html (str): Document extracted so far (see StreamingHtmlExtractor).
+    Returns:
+        str: A renderable snapshot.
+    """
+    html = partial_html
+    comment_start = html.rfind("<!--")
+    if comment_start > html.rfind("-->"):
+        html = html[:comment_start]
+    last_open = html.rfind("<")
+    if last_open > html.rfind(">"):
+        html = html[:last_open]
+    html = _PARTIAL_ENTITY_RE.sub("", html)
+
+    stack = []
+    position = 0
+    while True:
+        match = _TAG_RE.search(html, position)
+        if match is None:
+            break
+        position = match.end()
+        closing, tag = match.group(1), (match.group(2) or "").lower()
+        if not tag:
+            continue
+        if closing:
+            if tag in stack:
+                del stack[len(stack) - 1 - stack[::-1].index(tag):]
+            continue
+        if tag in _VOID_TAGS or match.group(3).rstrip().endswith("/"):
+            continue
+        if tag in _RAW_TEXT_TAGS:
+            raw_end = re.compile(rf"</{tag}\s*>", re.I).search(html, position)
+            if raw_end is None:
+                if tag == "script":
+                    html = html[:match.start()]
+                else:
+                    stack.append(tag)
+                break
+            position = raw_end.end()
+            continue
+        stack.append(tag)
+    return html + "".join(f"</{tag}>" for tag in reversed(stack))
+
+
+class PreviewChannel:
+    """
+    Server-push preview channel of a session: the HTML generator's tokens are
+    fed to an incremental extractor and the document so far is turned into
+    throttled, well-formed snapshots pushed to
+    every subscriber. Each subscriber only keeps the latest event, so a slow
+    client never falls behind. Patch outputs (edits) are not previewed.
+    """
+    def __init__(self, throttle_ms: float = PREVIEW_THROTTLE_MS):
+        """
+        Args:
+            throttle_ms (float): Minimum interval between two snapshots.
+        """
+        self.throttle = throttle_ms / 1000
+        self.active = False
+        self.seq = 0
+        self._extractor = StreamingHtmlExtractor()
+        self._head = ""
+        self._last_publish = 0.0
+        self._last_snapshot = ""
+        self._is_patch = False
+        self._subscribers = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Registers a subscriber; a generation in progress is sent right away.
+        Returns:
+            asyncio.Queue: Queue receiving {"event": ..., "data": ...} dicts.
+        """
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        if self.active and self._last_snapshot:
+            queue.put_nowait(self._snapshot_event(self._last_snapshot))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _publish(self, event: str, data: dict) -> None:
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()  # Only the latest event matters
+            queue.put_nowait({"event": event, "data": data})
+
+    def _snapshot_event(self, html: str) -> dict:
+        return {"event": "snapshot", "data": {"seq": self.seq, "html": html}}
+
+    def _publish_snapshot(self) -> None:
+        snapshot = close_open_tags(self._extractor.html)
+        if not snapshot or snapshot == self._last_snapshot:
+            return
+        self._last_publish = time.monotonic()
+        self.seq += 1
+        self._last_snapshot = snapshot
+        event = self._snapshot_event(snapshot)
+        self._publish(event["event"], event["data"])
+
+    def begin(self) -> None:
+        """
+        Starts a new generation (also called when a rejected patch falls back
+        to a full regeneration within the same node).
+        """
+        self.active = True
+        self._extractor = StreamingHtmlExtractor()
+        self._head = ""
+        self._last_publish = 0.0
+        self._last_snapshot = ""
+        self._is_patch = False
+
+    def feed(self, text: str) -> None:
+        """
+        Adds generated text; a snapshot is pushed at most once per throttle interval.
+        Args:
+            text (str): New token text.
+        """
+        if not self.active or self._is_patch:
+            return
+        if len(self._head) < _PATCH_DETECTION_CHARS:
+            self._head += text
+            if _PATCH_OP_RE.search(self._head):
+                self._is_patch = True
+                return
+        self._extractor.feed(text)
+        if self._subscribers and time.monotonic() - self._last_publish >= self.throttle:
+            self._publish_snapshot()
+
+    def finish(self, artifact: dict = None) -> None:
+        """
+        Ends the generation: pushes the committed page reference, or an abort
+        event when the generation failed.
+        Args:
+            artifact (dict): Page reference (url, version, etag), None on failure.
+        """
+        if not self.active:
+            return
+        self.active = False
+        if artifact is None:
+            self._publish("abort", {"seq": self.seq})
+        else:
+            self._publish("final", {"seq": self.seq, **artifact})
+
+
+# Canal par session, retenu seulement par ses abonnés (/preview-stream) et l'exécution en cours :
+# un canal sans abonné ni exécution est libéré automatiquement
+_CHANNELS = weakref.WeakValueDictionary()
+_CHANNELS_LOCK = threading.Lock()
+
+
+def get_preview_channel(session_id: str) -> PreviewChannel:
+    """
+    Returns the preview channel of a session. Channels are only kept while
+    a subscriber or a chat run holds them.
+    Args:
+        session_id (str): The session id.
+    Returns:
+        PreviewChannel: The session's channel.
+    """
+    with _CHANNELS_LOCK:
+        channel = _CHANNELS.get(session_id)
+        if channel is None:
+            channel = _CHANNELS[session_id] = PreviewChannel()
+        return channel
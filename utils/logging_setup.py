@@ -0,0 +1,143 @@
+import os
+import sys
+import zlib
+import queue
+import random
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import structlog
+
+LOG_FILE = os.getenv("LOG_FILE", "chat_app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Part des requêtes dont les lignes INFO/DEBUG sont gardées (les WARNING et plus le sont toujours)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# Taille de la file vers le thread d'écriture ; au-delà, les lignes sont abandonnées (jamais d'attente)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+_STATE = {"listener": None, "handler": None, "handlers": None}
+
+
+class _SamplingFilter(logging.Filter):
+    """
+    Keeps every WARNING+ record and a LOG_SAMPLE_RATE share of the others.
+    Records carrying a request_id are sampled per request (all or none of its lines).
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        request_id = record.msg.get("request_id") if isinstance(record.msg, dict) else getattr(record, "request_id", None)
+        if request_id is None:
+            return random.random() < self.rate
+        return zlib.crc32(str(request_id).encode()) % 10000 < self.rate * 10000
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without formatting them (rendering
+    and file I/O happen off the event loop) and drops them when the queue is full.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging() -> None:
+    """
+    Sets up the non-blocking logging pipeline: structlog events and stdlib
+    records go through a bounded queue (sampled, see LOG_SAMPLE_RATE) to a
+    listener thread writing JSON lines to LOG_FILE and readable lines to stderr.
+    Safe to call more than once.
+    """
+    if _STATE["listener"] is not None:
+        return
+    timestamper = structlog.processors.TimeStamper(fmt="iso")
+    pre_chain = [structlog.stdlib.add_log_level, structlog.stdlib.add_logger_name, timestamper]
+    structlog.configure(
+        processors=[
+            structlog.contextvars.merge_contextvars,
+            structlog.stdlib.filter_by_level,
+            *pre_chain,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    def formatter(renderer):
+        return structlog.stdlib.ProcessorFormatter(
+            processors=[structlog.stdlib.ProcessorFormatter.remove_processors_meta, renderer],
+            foreign_pre_chain=pre_chain,
+        )
+
+    file_handler = logging.FileHandler(LOG_FILE)
+    file_handler.setFormatter(formatter(structlog.processors.JSONRenderer()))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter(structlog.dev.ConsoleRenderer(colors=False)))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(_SamplingFilter(LOG_SAMPLE_RATE))
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    # Une ligne INFO par requête HTTP sortante (chaque appel LLM) : trop bavard
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    _STATE.update(listener=listener, handler=queue_handler, handlers=(file_handler, stream_handler))
+    atexit.register(shutdown_logging)
+
+
+def start_listener() -> None:
+    """
+    Starts the listener thread again after shutdown_logging, on the same queue
+    and handlers. The listener thread does not survive a fork: the launcher
+    stops it before forking (so the queue lock is never inherited held) and
+    each forked worker starts its own from its entry point.
+    """
+    handler = _STATE["handler"]
+    if _STATE["listener"] is not None or handler is None:
+        return
+    listener = QueueListener(handler.queue, *_STATE["handlers"], respect_handler_level=True)
+    listener.start()
+    _STATE["listener"] = listener
+
+
+def shutdown_logging() -> None:
+    """
+    Flushes the queued records and stops the listener thread. Records logged
+    afterwards stay queued until start_listener is called.
+    """
+    listener = _STATE["listener"]
+    if listener is not None:
+        _STATE["listener"] = None
+        listener.stop()
+
+
+def get_logging_stats() -> dict:
+    """
+    Returns the logging pipeline state: queue depth, dropped records and sample rate.
+    """
+    handler = _STATE["handler"]
+    return {
+        "queue_depth": handler.queue.qsize() if handler is not None else 0,
+        "dropped": handler.dropped if handler is not None else 0,
+        "sample_rate": LOG_SAMPLE_RATE,
+    }
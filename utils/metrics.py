@@ -0,0 +1,223 @@
+import os
+import sys
+import math
+import threading
+import contextvars
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Préfixe commun des métriques exportées sur /metrics
+METRICS_PREFIX = "dev_assistant_"
+# Bornes (secondes) des histogrammes de durée : du nœud local (ms) à la génération complète
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+SIZE_BUCKETS = (100, 300, 1000, 3000, 10000, 30000, 100000)
+# Mesures ignorées dans le contexte courant (warm-up du graphe contre un LLM factice)
+_SUPPRESSED = contextvars.ContextVar("metrics_suppressed", default=False)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+@contextmanager
+def suppress_metrics():
+    """
+    Context manager discarding the metrics and runtime stats recorded in the
+    current context (and the tasks and threads it starts), e.g. the warm-up
+    run of a graph against a stub LLM.
+    """
+    token = _SUPPRESSED.set(True)
+    try:
+        yield
+    finally:
+        _SUPPRESSED.reset(token)
+
+
+def metrics_suppressed() -> bool:
+    """
+    True inside suppress_metrics: recorders of runtime stats skip the update.
+    """
+    return _SUPPRESSED.get()
+
+
+class _Metric:
+    """
+    Base of the hand-rolled metrics: a family of samples keyed by label values,
+    guarded by a lock (metrics are updated from worker threads and the event loop).
+    """
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = METRICS_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter.
+    """
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if _SUPPRESSED.get():
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self) -> float:
+        """
+        Sum over all label values.
+        """
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket histogram with sum and count.
+    """
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        if _SUPPRESSED.get():
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class _Registry:
+    """
+    Metrics registry: owned metrics plus collectors called at scrape time to
+    export the stats the app already keeps (pools, caches, admission...).
+    """
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def reset(self) -> None:
+        """
+        Clears the samples of the owned metrics.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            with metric._lock:
+                metric._values.clear()
+
+    def register_collector(self, collector) -> None:
+        """
+        Registers a callable returning (name, type, help, [(labels dict, value)]) tuples.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception:
+                continue  # Une source de stats indisponible ne doit pas casser le scrape
+            for name, type_name, documentation, samples in families:
+                full_name = METRICS_PREFIX + name
+                lines += [f"# HELP {full_name} {documentation}", f"# TYPE {full_name} {type_name}"]
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    label_names = tuple(labels)
+                    lines.append(f"{full_name}{_format_labels(label_names, tuple(labels[n] for n in label_names))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = _Registry()
+
+
+def _reset_after_fork() -> None:
+    # Un worker forké ne reprend pas les mesures du processus parent (warm-up)
+    REGISTRY.reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+REQUESTS = REGISTRY.register(Counter("requests_total", "Chat messages handled, by graph and outcome.", ("graph", "outcome")))
+REQUEST_DURATION = REGISTRY.register(Histogram("request_duration_seconds", "End-to-end /chat-message duration.", ("graph",)))
+REQUEST_TTFT = REGISTRY.register(Histogram("request_ttft_seconds", "Time to the first token sent to the client.", ("graph",)))
+NODE_DURATION = REGISTRY.register(Histogram("node_duration_seconds", "LangGraph node duration.", ("node",)))
+LLM_CALLS = REGISTRY.register(Counter("llm_calls_total", "LLM calls, by agent and outcome.", ("agent", "model", "outcome")))
+LLM_DURATION = REGISTRY.register(Histogram("llm_duration_seconds", "LLM call duration.", ("agent", "model")))
+LLM_TTFT = REGISTRY.register(Histogram("llm_ttft_seconds", "Time to first token of streamed LLM calls.", ("agent", "model")))
+LLM_PROMPT_TOKENS = REGISTRY.register(Counter("llm_prompt_tokens_total", "Prompt tokens sent to the LLM.", ("agent", "model")))
+LLM_COMPLETION_TOKENS = REGISTRY.register(Counter("llm_completion_tokens_total", "Completion tokens received from the LLM.", ("agent", "model")))
+LLM_PROMPT_CHARS = REGISTRY.register(Histogram("llm_prompt_chars", "Prompt size in characters.", ("agent",), buckets=SIZE_BUCKETS))
+
+
+def render_metrics() -> str:
+    """
+    Renders every metric in the Prometheus text exposition format (0.0.4).
+    Returns:
+        str: The /metrics payload.
+    """
+    return REGISTRY.render()
@@ -0,0 +1,190 @@
+import os
+import sys
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.token_count import count_tokens
+
+# Budget de tokens du contexte de page, par nœud (le générateur reçoit toujours la page complète)
+OUTLINE_TOKEN_BUDGETS = {
+    "route_initial_user_message": int(os.getenv("OUTLINE_BUDGET_ROUTER", "300")),
+    "respond_naturally": int(os.getenv("OUTLINE_BUDGET_RESPOND", "800")),
+    "design_and_plan": int(os.getenv("OUTLINE_BUDGET_PLANNER", "1500")),
+}
+PAGE_OUTLINE_ENABLED = os.getenv("PAGE_OUTLINE_ENABLED", "1") == "1"
+
+_STRUCTURAL_TAGS = {
+    "html", "head", "body", "header", "nav", "main", "section", "article", "aside", "footer",
+    "div", "form", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6", "button", "img",
+    "a", "p", "li", "input", "textarea", "select", "label", "title", "script", "style", "iframe", "video",
+}
+_TEXT_TAGS = {"title", "h1", "h2", "h3", "h4", "h5", "h6", "p", "button", "a", "li", "label"}
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_CSS_RULE_RE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+_SPACES_RE = re.compile(r"\s+")
+
+# Niveaux de détail essayés du plus riche au plus compact : (profondeur, règles CSS, longueur des extraits)
+_DETAIL_LEVELS = [(12, 40, 120), (8, 25, 80), (6, 15, 50), (4, 8, 30), (3, 4, 0), (2, 0, 0)]
+
+
+class _OutlineParser(HTMLParser):
+    """
+    Single-pass HTML parser collecting the DOM skeleton, CSS rules and text excerpts.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.nodes = []          # (depth, label) for structural elements
+        self.texts = {}          # node index -> text excerpt
+        self.css_rules = []
+        self._stack = []         # open tags: (tag, node index or None)
+        self._in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        node_index = None
+        if tag in _STRUCTURAL_TAGS:
+            label = tag
+            if attrs.get("id"):
+                label += f"#{attrs['id']}"
+            if attrs.get("class"):
+                label += "".join(f".{cls}" for cls in attrs["class"].split()[:3])
+            for key in ("href", "src", "type", "name"):
+                if attrs.get(key) and tag in {"a", "img", "input", "script", "iframe", "video"}:
+                    label += f" {key}={attrs[key][:40]}"
+                    break
+            node_index = len(self.nodes)
+            self.nodes.append((len(self._stack), label))
+        if tag == "style":
+            self._in_style = True
+        if tag not in _VOID_TAGS:
+            self._stack.append((tag, node_index))
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self._in_style = False
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+
+    def handle_data(self, data):
+        if self._in_style:
+            for selector, body in _CSS_RULE_RE.findall(data):
+                selector = _SPACES_RE.sub(" ", selector).strip()
+                body = _SPACES_RE.sub(" ", body).strip()
+                if selector and not selector.startswith("@"):
+                    self.css_rules.append(f"{selector} {{ {body} }}")
+            return
+        text = _SPACES_RE.sub(" ", data).strip()
+        if not text:
+            return
+        for tag, node_index in reversed(self._stack):
+            if node_index is not None:
+                if tag in _TEXT_TAGS:
+                    self.texts[node_index] = (self.texts.get(node_index, "") + " " + text).strip()
+                break
+
+
+def _render(parsed: _OutlineParser, max_depth: int, max_css_rules: int, excerpt_len: int) -> str:
+    lines = ["DOM outline:"]
+    for index, (depth, label) in enumerate(parsed.nodes):
+        if depth > max_depth:
+            continue
+        line = "  " * depth + label
+        text = parsed.texts.get(index)
+        if text and excerpt_len:
+            line += f' "{text[:excerpt_len]}{"..." if len(text) > excerpt_len else ""}"'
+        lines.append(line)
+    if parsed.css_rules and max_css_rules:
+        lines.append("Main CSS rules:")
+        lines.extend(parsed.css_rules[:max_css_rules])
+        if len(parsed.css_rules) > max_css_rules:
+            lines.append(f"... ({len(parsed.css_rules) - max_css_rules} more rules)")
+    return "\n".join(lines)
+
+
+# Parse unique par version de page, rendu mis en cache par (version, budget)
+_PARSED = OrderedDict()
+_OUTLINES = OrderedDict()
+_CACHE_SIZE = 32
+_LOCK = threading.Lock()
+
+
+def _cache_put(cache: OrderedDict, key, value) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > _CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def build_page_outline(html: str, max_tokens: int) -> str:
+    """
+    Builds a compact outline of an HTML page (DOM skeleton with ids/classes,
+    main CSS rules, text excerpts) fitting within a token budget.
+    Pages that already fit the budget are returned unchanged.
+    The page is parsed once per version; outlines are cached per budget.
+    Args:
+        html (str): The page HTML.
+        max_tokens (int): Token budget for the outline.
+    Returns:
+        str: The outline (or the page itself if small enough).
+    """
+    if not html or not html.strip():
+        return ""
+    version = hashlib.sha256(html.encode("utf-8")).hexdigest()
+    with _LOCK:
+        outline = _OUTLINES.get((version, max_tokens))
+        parsed = _PARSED.get(version)
+    if outline is not None:
+        return outline
+    if count_tokens(html) <= max_tokens:
+        outline = html
+    else:
+        if parsed is None:
+            parsed = _OutlineParser()
+            parsed.feed(html)
+            parsed.close()
+        for max_depth, max_css_rules, excerpt_len in _DETAIL_LEVELS:
+            outline = _render(parsed, max_depth, max_css_rules, excerpt_len)
+            if count_tokens(outline) <= max_tokens:
+                break
+        else:
+            # Dernier recours : tronquer l'esquisse la plus compacte
+            while outline and count_tokens(outline) > max_tokens:
+                outline = outline[: int(len(outline) * 0.8)]
+    with _LOCK:
+        if parsed is not None:
+            _cache_put(_PARSED, version, parsed)
+        _cache_put(_OUTLINES, (version, max_tokens), outline)
+    return outline
+
+
+def page_context_for(node_name: str, html: str) -> str:
+    """
+    Returns the page context to send to a node: a budgeted outline for the
+    router, planner and natural-response nodes, the raw HTML otherwise.
+    Args:
+        node_name (str): Graph node name.
+        html (str): The current page HTML.
+    Returns:
+        str: The page context for this node.
+    """
+    html = html or ""
+    budget = OUTLINE_TOKEN_BUDGETS.get(node_name)
+    if not PAGE_OUTLINE_ENABLED or budget is None:
+        return html
+    return build_page_outline(html, budget)
+
+
+if __name__ == "__main__":
+    sample = (
+        "<html><head><title>Demo</title><style>body { background: #fff; font-family: Arial; }"
+        " .hero h1 { color: navy; }</style></head><body><header id='top' class='site-header'>"
+        "<nav><a href='#about'>About</a><a href='#projects'>Projects</a></nav></header>"
+        "<main><section id='about' class='hero'><h1>Hello, I'm Ada</h1><p>I build things for the web.</p>"
+        "</section></main><footer><p>(c) 2025</p></footer></body></html>"
+    )
+    print("==> [INFO]:\n" + build_page_outline(sample, 100))
@@ -0,0 +1,193 @@
+import os
+import sys
+import gzip
+import hashlib
+import weakref
+import tempfile
+import threading
+from collections import OrderedDict
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import zstandard
+from utils.html_extractor import extract_html_only
+
+DEFAULT_PAGE_PATH = "templates/generated/page.html"
+# Plusieurs workers écrivent les mêmes pages : la version en mémoire est revalidée sur le fichier
+PAGE_STORE_SHARED = os.getenv("PAGE_STORE_SHARED", "0") == "1"
+# Pages gardées en mémoire (HTML et variantes compressées) ; une par session active
+PAGE_STORE_MAX_ENTRIES = int(os.getenv("PAGE_STORE_MAX_ENTRIES", "256"))
+
+
+def atomic_write(path: str, data: str) -> None:
+    """
+    Atomically writes data to a file to prevent corruption.
+    Args:
+        path (str): The target file path.
+        data (str): The data to write.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".html")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)  # Atomically replace the existing file
+    finally:
+        # Clean up if os.replace was not called
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class PageVersion:
+    """
+    Immutable snapshot of the generated page: clean HTML (extracted by the
+    generator before it is stored), content-hash version id and lazily
+    compressed bodies.
+    """
+    def __init__(self, html: str):
+        """
+        Args:
+            html (str): Clean page HTML.
+        """
+        self.html = html
+        self.body = html.encode("utf-8")
+        self.version = hashlib.sha256(self.body).hexdigest()[:16]
+        self.etag = f'"{self.version}"'
+        self._encoded = {"identity": self.body}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        """
+        Returns the extracted HTML compressed with the given encoding (cached).
+        Args:
+            encoding (str): 'zstd', 'gzip' or 'identity'.
+        Returns:
+            bytes: The encoded body.
+        """
+        with self._lock:
+            if encoding not in self._encoded:
+                if encoding == "zstd":
+                    self._encoded[encoding] = zstandard.ZstdCompressor(level=6).compress(self.body)
+                elif encoding == "gzip":
+                    self._encoded[encoding] = gzip.compress(self.body, compresslevel=6, mtime=0)
+                else:
+                    raise ValueError(f"Unsupported encoding: {encoding}")
+            return self._encoded[encoding]
+
+
+def _file_signature(path: str):
+    # Chaque écriture atomique crée un nouveau fichier : l'inode change même à taille et date égales
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class PageStore:
+    """
+    In-memory store of the current page version, written through to disk
+    atomically. Readers never touch the file system, except in multi-worker
+    mode (PAGE_STORE_SHARED) where one stat() per read detects a page written
+    by another worker.
+    """
+    def __init__(self, path: str = DEFAULT_PAGE_PATH, shared: bool = PAGE_STORE_SHARED):
+        """
+        Args:
+            path (str): Page file path used for durability.
+            shared (bool): Revalidate the in-memory version against the file on each read.
+        """
+        self.path = path
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._current = None
+        self._signature = None
+
+    @property
+    def current(self) -> PageVersion:
+        """
+        The current page version (loaded from disk on first access).
+        """
+        current = self._current
+        if current is not None and self.shared and _file_signature(self.path) != self._signature:
+            current = None
+        if current is None:
+            with self._lock:
+                signature = _file_signature(self.path)
+                if self._current is None or (self.shared and signature != self._signature):
+                    try:
+                        with open(self.path, encoding="utf-8") as f:
+                            # Les pages écrites avant le stockage d'artefacts propres contiennent la sortie brute
+                            self._current = PageVersion(extract_html_only(f.read()))
+                    except FileNotFoundError:
+                        self._current = PageVersion("")
+                    self._signature = signature
+                current = self._current
+        return current
+
+    def write(self, html: str) -> PageVersion:
+        """
+        Stores a new page version: hashing happens once here, then the HTML
+        is written atomically to disk.
+        Args:
+            html (str): Clean page HTML.
+        Returns:
+            PageVersion: The new current version.
+        """
+        version = PageVersion(html)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write(self.path, html)
+            self._current = version
+            self._signature = _file_signature(self.path)
+        return version
+
+    def clear(self) -> PageVersion:
+        """
+        Atomically empties the page.
+        Returns:
+            PageVersion: The new (empty) current version.
+        """
+        return self.write("")
+
+
+# Magasins encore référencés (une seule instance par chemin tant qu'un appelant s'en sert)
+_STORES = weakref.WeakValueDictionary()
+# Magasins récemment utilisés gardés en mémoire ; les autres sont rechargés depuis le disque
+_RECENT_STORES = OrderedDict()
+_STORES_LOCK = threading.Lock()
+
+
+def get_page_store(path: str = DEFAULT_PAGE_PATH) -> PageStore:
+    """
+    Returns the process-wide page store for a page path. Only the
+    PAGE_STORE_MAX_ENTRIES most recently used stores (and those still
+    referenced by a caller) are kept; an evicted page is reloaded from disk.
+    Args:
+        path (str): Page file path.
+    Returns:
+        PageStore: The shared store.
+    """
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = _STORES[path] = PageStore(path)
+        _RECENT_STORES[path] = store
+        _RECENT_STORES.move_to_end(path)
+        while len(_RECENT_STORES) > PAGE_STORE_MAX_ENTRIES:
+            _RECENT_STORES.popitem(last=False)
+        return store
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """
+    Picks the response encoding from an Accept-Encoding header (zstd > gzip > identity).
+    Args:
+        accept_encoding (str): The Accept-Encoding header value.
+    Returns:
+        str: 'zstd', 'gzip' or 'identity'.
+    """
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    if "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
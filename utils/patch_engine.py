@@ -0,0 +1,126 @@
+import os
+import sys
+import re
+from dataclasses import dataclass, field
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# En-têtes d'opération : "@@ REPLACE 12-14", "@@ INSERT 20", "@@ DELETE 30-31", "@@ END"
+_HEADER_RE = re.compile(r"^@@\s*(REPLACE|INSERT|DELETE|END)\b\s*(\d+)?(?:\s*-\s*(\d+))?\s*(?:@@)?\s*$", re.IGNORECASE)
+_FENCE_RE = re.compile(r"^\s*```")
+# Préfixe de numérotation (00012: ) parfois recopié par le modèle
+_LINE_NUMBER_RE = re.compile(r"^\d{5}: ?")
+
+
+class PatchError(ValueError):
+    """
+    Raised when a patch cannot be parsed or does not apply to the document.
+    """
+
+
+@dataclass
+class PatchOp:
+    """
+    A single line-addressed edit (1-based line numbers, inclusive ranges).
+    INSERT adds the lines after line `start` (0 inserts at the top).
+    """
+    kind: str
+    start: int
+    end: int
+    lines: list = field(default_factory=list)
+
+
+def parse_patch(text: str) -> list:
+    """
+    Parses model output into patch operations.
+    Args:
+        text (str): Patch text made of '@@ OP start[-end]' headers followed by content lines.
+    Returns:
+        list: List of PatchOp.
+    Raises:
+        PatchError: If the text contains no operation or a malformed header.
+    """
+    ops = []
+    current = None
+    for line in text.splitlines():
+        if _FENCE_RE.match(line):
+            continue
+        header = _HEADER_RE.match(line.strip()) if line.startswith("@@") else None
+        if line.startswith("@@") and header is None:
+            raise PatchError(f"Malformed patch header: {line!r}")
+        if header is None:
+            if current is None:
+                if line.strip():
+                    raise PatchError(f"Content outside of an operation: {line!r}")
+                continue
+            current.lines.append(_LINE_NUMBER_RE.sub("", line, count=1))
+            continue
+        kind, start, end = header.group(1).upper(), header.group(2), header.group(3)
+        if kind == "END":
+            current = None
+            continue
+        if start is None:
+            raise PatchError(f"Missing line number in header: {line!r}")
+        start = int(start)
+        end = int(end) if end is not None else start
+        current = PatchOp(kind, start, end)
+        ops.append(current)
+    if not ops:
+        raise PatchError("Patch contains no operation")
+    return ops
+
+
+def apply_patch(document: str, ops: list) -> str:
+    """
+    Validates and applies patch operations to a document.
+    All positions refer to the original document; operations are applied
+    bottom-up so earlier edits do not shift later ones.
+    Args:
+        document (str): The original document.
+        ops (list): List of PatchOp.
+    Returns:
+        str: The patched document.
+    Raises:
+        PatchError: If an operation is out of bounds or ranges overlap.
+    """
+    lines = document.splitlines()
+    n_lines = len(lines)
+    ranges = []
+    for op in ops:
+        if op.kind == "INSERT":
+            if not 0 <= op.start <= n_lines:
+                raise PatchError(f"INSERT position {op.start} out of bounds (document has {n_lines} lines)")
+            if not op.lines:
+                raise PatchError(f"INSERT after line {op.start} has no content")
+            continue
+        if not 1 <= op.start <= op.end <= n_lines:
+            raise PatchError(f"{op.kind} range {op.start}-{op.end} out of bounds (document has {n_lines} lines)")
+        if op.kind == "DELETE" and any(ln.strip() for ln in op.lines):
+            raise PatchError(f"DELETE {op.start}-{op.end} must not carry content")
+        ranges.append((op.start, op.end))
+    ranges.sort()
+    for (_, prev_end), (next_start, _) in zip(ranges, ranges[1:]):
+        if next_start <= prev_end:
+            raise PatchError(f"Overlapping ranges around line {next_start}")
+    for op in ops:
+        if op.kind == "INSERT" and any(start <= op.start < end for start, end in ranges):
+            raise PatchError(f"INSERT after line {op.start} falls inside a modified range")
+    # Trier du bas vers le haut ; à position égale, les insertions passent après les remplacements
+    ordered = sorted(
+        enumerate(ops),
+        key=lambda item: (item[1].end if item[1].kind != "INSERT" else item[1].start, item[1].kind == "INSERT", -item[0]),
+        reverse=True
+    )
+    for _, op in ordered:
+        if op.kind == "INSERT":
+            lines[op.start:op.start] = op.lines
+        elif op.kind == "REPLACE":
+            lines[op.start - 1:op.end] = op.lines
+        else:
+            del lines[op.start - 1:op.end]
+    return "\n".join(lines) + ("\n" if document.endswith("\n") else "")
+
+
+if __name__ == "__main__":
+    page = "<html>\n<body style=\"background: black\">\n<h1>Hello</h1>\n</body>\n</html>\n"
+    patch = "@@ REPLACE 2-2\n<body style=\"background: white\">\n@@ INSERT 3\n<p>Welcome!</p>\n@@ END"
+    print("==> [INFO]:\n" + apply_patch(page, parse_patch(patch)))
@@ -0,0 +1,118 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PLAN_OPEN = "<plan>"
+PLAN_CLOSE = "</plan>"
+# Au-delà de ce préambule sans <plan>, la sortie est considérée comme du HTML seul
+_PLAN_DETECTION_CHARS = 256
+# Débuts de document : si l'un apparaît avant <plan>, le modèle n'a pas produit de plan
+_DOCUMENT_MARKERS = ("```", "<!doctype", "<html")
+
+_BEFORE, _PLAN, _HTML = range(3)
+
+
+def _partial_suffix(text: str, marker: str) -> int:
+    """
+    Length of the longest suffix of text that is a proper prefix of marker.
+    """
+    lowered = text[-(len(marker) - 1):].lower()
+    for size in range(min(len(lowered), len(marker) - 1), 0, -1):
+        if marker.startswith(lowered[-size:]):
+            return size
+    return 0
+
+
+class PlanHtmlSplitter:
+    """
+    Splits the streamed output of the fused plan+generate call
+    ("<plan>...</plan>" followed by the HTML document) into its plan and
+    html parts as it arrives. Markers split across chunks are held back until
+    they can be recognized; an output without plan is entirely html.
+    """
+    def __init__(self):
+        self._state = _BEFORE
+        self._pending = ""
+        self._plan = []
+        self._html = []
+
+    @property
+    def plan(self) -> str:
+        return "".join(self._plan).strip()
+
+    @property
+    def html(self) -> str:
+        return "".join(self._html)
+
+    def _emit(self, part: str, text: str, out: list) -> None:
+        if not (self._plan if part == "plan" else self._html):
+            text = text.lstrip()
+        if text:
+            (self._plan if part == "plan" else self._html).append(text)
+            out.append((part, text))
+
+    def feed(self, chunk: str) -> list:
+        """
+        Feeds the next chunk of model output.
+        Args:
+            chunk (str): New text.
+        Returns:
+            list: (part, text) pieces, part being 'plan' or 'html'.
+        """
+        text = self._pending + chunk
+        self._pending = ""
+        out = []
+        while text:
+            if self._state == _BEFORE:
+                lowered = text.lower()
+                start = lowered.find(PLAN_OPEN)
+                document = min((i for i in (lowered.find(m) for m in _DOCUMENT_MARKERS) if i != -1), default=-1)
+                if start != -1 and (document == -1 or start < document):
+                    # Préambule éventuel avant <plan> ignoré
+                    self._state = _PLAN
+                    text = text[start + len(PLAN_OPEN):].lstrip("\n")
+                    continue
+                if document != -1 or len(text) >= _PLAN_DETECTION_CHARS:
+                    self._state = _HTML
+                    continue
+                self._pending = text
+                break
+            if self._state == _PLAN:
+                end = text.lower().find(PLAN_CLOSE)
+                if end == -1:
+                    keep = _partial_suffix(text, PLAN_CLOSE)
+                    self._emit("plan", text[:len(text) - keep], out)
+                    self._pending = text[len(text) - keep:]
+                    break
+                self._emit("plan", text[:end], out)
+                self._state = _HTML
+                text = text[end + len(PLAN_CLOSE):].lstrip("\n")
+                continue
+            self._emit("html", text, out)
+            break
+        return out
+
+    def close(self) -> list:
+        """
+        Flushes the held-back text at the end of the output.
+        Returns:
+            list: Remaining (part, text) pieces.
+        """
+        text, self._pending = self._pending, ""
+        out = []
+        self._emit("plan" if self._state == _PLAN else "html", text, out)
+        return out
+
+
+def split_plan_and_html(text: str) -> tuple:
+    """
+    Splits a complete fused output.
+    Args:
+        text (str): Model output.
+    Returns:
+        tuple: (plan, html part) — the html part still needs extract_html_only.
+    """
+    splitter = PlanHtmlSplitter()
+    splitter.feed(text or "")
+    splitter.close()
+    return splitter.plan, splitter.html
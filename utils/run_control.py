@@ -0,0 +1,214 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Un nouveau message d'une session annule l'exécution encore en cours de cette session
+SESSION_PREEMPTION = os.getenv("SESSION_PREEMPTION", "1") == "1"
+
+_CURRENT_RUN = contextvars.ContextVar("current_chat_run", default=None)
+_END = object()
+
+# Exécution en cours la plus récente de chaque session
+_ACTIVE_RUNS = {}
+_LOCK = threading.Lock()
+_STATS = {"disconnected": 0, "preempted": 0, "tokens_saved": 0, "seconds_saved": 0.0}
+# Durée des exécutions terminées par graphe (total, nombre) : base de l'estimation du temps économisé
+_DURATIONS = {}
+
+
+class RunCancelledError(Exception):
+    """
+    Raised when a chat run was cancelled (client disconnected or pre-empted
+    by a newer message of the same session).
+    """
+    def __init__(self, reason: str):
+        super().__init__("Superseded by a newer message" if reason == "preempted" else "Client disconnected")
+        self.reason = reason
+
+
+class ChatRun:
+    """
+    In-flight graph run of one chat message. The graph is driven in a task
+    owned by the run, so that cancelling it stops the graph nodes and aborts
+    their LLM requests without touching the HTTP response task.
+    """
+    def __init__(self, session_id: str, request_id: str, graph: str):
+        self.session_id = session_id
+        self.request_id = request_id
+        self.graph = graph
+        self.started_at = time.perf_counter()
+        self.cancel_reason = None
+        self.finished = False
+        self._task = None
+        self._calls = {}
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_reason is not None
+
+    def cancel(self, reason: str) -> bool:
+        """
+        Cancels the run and records what it saved: the remaining estimated
+        output tokens of the LLM calls in flight and the typical remaining time.
+        Args:
+            reason (str): 'disconnected' or 'preempted'.
+        Returns:
+            bool: False if the run had already finished or been cancelled.
+        """
+        with _LOCK:
+            if self.finished or self.cancel_reason is not None:
+                return False
+            self.cancel_reason = reason
+            tokens_saved = sum(max(estimate - handler.completion_tokens, 0) for handler, estimate in self._calls.values())
+            total, count = _DURATIONS.get(self.graph, (0.0, 0))
+            seconds_saved = max(total / count - (time.perf_counter() - self.started_at), 0.0) if count else 0.0
+            _STATS[reason] += 1
+            _STATS["tokens_saved"] += tokens_saved
+            _STATS["seconds_saved"] += seconds_saved
+        if self._task is not None:
+            self._task.get_loop().call_soon_threadsafe(self._task.cancel)
+        return True
+
+    async def stream(self, source):
+        """
+        Drives an async iterator in the run's task and yields its items.
+        Args:
+            source: Async iterator running the graph (e.g. the SSE frames).
+        Yields:
+            The items of source.
+        Raises:
+            RunCancelledError: If the run was cancelled.
+        """
+        queue = asyncio.Queue()
+
+        async def pump():
+            _CURRENT_RUN.set(self)
+            try:
+                async for item in source:
+                    queue.put_nowait(item)
+            except Exception as e:
+                queue.put_nowait(e)
+
+        self._task = asyncio.create_task(pump())
+        self._task.add_done_callback(lambda _: queue.put_nowait(_END))
+        if self.cancelled:
+            self._task.cancel()
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            if not self._task.done():
+                # Plus personne ne lit la réponse : le client est parti
+                self.cancel("disconnected")
+        if self.cancelled:
+            raise RunCancelledError(self.cancel_reason)
+
+
+def start_run(session_id: str, request_id: str, graph: str) -> ChatRun:
+    """
+    Registers the run of a new chat message, pre-empting the run still in
+    flight for the same session (see SESSION_PREEMPTION).
+    Args:
+        session_id (str): The session id.
+        request_id (str): The request id.
+        graph (str): Workflow variant name.
+    Returns:
+        ChatRun: The new run.
+    """
+    run = ChatRun(session_id, request_id, graph)
+    with _LOCK:
+        previous = _ACTIVE_RUNS.get(session_id)
+        _ACTIVE_RUNS[session_id] = run
+    if previous is not None and SESSION_PREEMPTION:
+        previous.cancel("preempted")
+    return run
+
+
+def finish_run(run: ChatRun, outcome: str) -> None:
+    """
+    Unregisters a run; the duration of completed runs feeds the time-saved estimate.
+    Args:
+        run (ChatRun): The run.
+        outcome (str): Request outcome ('ok' for a completed run).
+    """
+    with _LOCK:
+        run.finished = True
+        if _ACTIVE_RUNS.get(run.session_id) is run:
+            del _ACTIVE_RUNS[run.session_id]
+        if outcome == "ok":
+            total, count = _DURATIONS.get(run.graph, (0.0, 0))
+            _DURATIONS[run.graph] = (total + time.perf_counter() - run.started_at, count + 1)
+
+
+def current_run():
+    """
+    Returns the chat run of the calling context, None outside of a run.
+    """
+    return _CURRENT_RUN.get()
+
+
+@contextmanager
+def track_llm_call(handler, estimated_output_tokens: int):
+    """
+    Registers an LLM call in flight in the current run, so that a cancellation
+    can count the output tokens it did not generate.
+    Args:
+        handler: The call's LLMMetricsHandler (counts the streamed tokens).
+        estimated_output_tokens (int): The agent's completion estimate.
+    """
+    run = current_run()
+    if run is None:
+        yield
+        return
+    key = object()
+    with _LOCK:
+        run._calls[key] = (handler, estimated_output_tokens)
+    try:
+        yield
+    finally:
+        with _LOCK:
+            run._calls.pop(key, None)
+
+
+def write_run_page(page_store, html: str):
+    """
+    Writes a page unless the current run was cancelled: a run the client
+    gave up on (or a newer message replaced) never overwrites the page.
+    Args:
+        page_store (PageStore): The session's page store.
+        html (str): Clean page HTML.
+    Returns:
+        PageVersion: The new current version.
+    Raises:
+        RunCancelledError: If the run was cancelled.
+    """
+    run = current_run()
+    if run is not None and run.cancelled:
+        raise RunCancelledError(run.cancel_reason)
+    return page_store.write(html)
+
+
+def get_cancellation_stats() -> dict:
+    """
+    Returns the cancellation counters: runs cancelled by disconnect or
+    pre-emption, estimated tokens and seconds saved, runs in flight.
+    """
+    with _LOCK:
+        return {
+            "preemption": SESSION_PREEMPTION,
+            "in_flight": len(_ACTIVE_RUNS),
+            "disconnected": _STATS["disconnected"],
+            "preempted": _STATS["preempted"],
+            "tokens_saved": _STATS["tokens_saved"],
+            "seconds_saved": round(_STATS["seconds_saved"], 3),
+        }
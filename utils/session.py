@@ -0,0 +1,146 @@
+import os
+import sys
+import re
+import fcntl
+import asyncio
+import weakref
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.page_store import get_page_store, DEFAULT_PAGE_PATH
+
+# La session par défaut garde la page historique ; les autres ont chacune leur fichier
+DEFAULT_SESSION = "default"
+SESSIONS_DIR = "templates/generated/sessions"
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Un verrou d'écriture par session (libéré automatiquement quand plus utilisé)
+_SESSION_LOCKS = weakref.WeakValueDictionary()
+# Plusieurs workers : le verrou de session est aussi un verrou de fichier (flock) dans ce dossier
+SESSION_LOCK_DIR = os.getenv("SESSION_LOCK_DIR", "")
+# Attente maximale entre deux tentatives de prise du verrou de fichier (s)
+_FILE_LOCK_MAX_POLL = 0.2
+
+
+def validate_session_id(session_id: str) -> str:
+    """
+    Validates a session id (used as thread id and in file names).
+    Args:
+        session_id (str): The session id sent by the client.
+    Returns:
+        str: The session id.
+    Raises:
+        ValueError: If the id contains characters other than letters, digits, '-' and '_'.
+    """
+    if not _SESSION_ID_RE.match(session_id or ""):
+        raise ValueError("Invalid session id: use 1-64 letters, digits, '-' or '_'")
+    return session_id
+
+
+def session_page_path(session_id: str) -> str:
+    """
+    Returns the page file path of a session.
+    Args:
+        session_id (str): The session id.
+    Returns:
+        str: Page file path.
+    """
+    if session_id == DEFAULT_SESSION:
+        return DEFAULT_PAGE_PATH
+    return os.path.join(SESSIONS_DIR, f"{validate_session_id(session_id)}.html")
+
+
+def get_session_page_store(session_id: str):
+    """
+    Returns the page store of a session.
+    Args:
+        session_id (str): The session id.
+    Returns:
+        PageStore: The session's page store.
+    """
+    return get_page_store(session_page_path(session_id))
+
+
+def session_id_from_config(config) -> str:
+    """
+    Reads the session id (LangGraph thread id) from a runnable config.
+    Args:
+        config (dict): The runnable config passed to a node.
+    Returns:
+        str: The session id, DEFAULT_SESSION when none is set.
+    """
+    return ((config or {}).get("configurable") or {}).get("thread_id") or DEFAULT_SESSION
+
+
+def get_run_page_store(config):
+    """
+    Returns the page store a graph run writes to: the file named by the
+    config's 'page_path' configurable when set (batch jobs write one artifact
+    each), otherwise the page of the run's session.
+    Args:
+        config (dict): The runnable config passed to a node.
+    Returns:
+        PageStore: The run's page store.
+    """
+    page_path = ((config or {}).get("configurable") or {}).get("page_path")
+    if page_path:
+        return get_page_store(page_path)
+    return get_session_page_store(session_id_from_config(config))
+
+
+class _ProcessSessionLock:
+    """
+    Session lock shared by the workers of a multi-worker deployment: the
+    in-process asyncio lock, then an exclusive flock on a per-session file,
+    polled without blocking the event loop.
+    """
+    def __init__(self, session_id: str):
+        self.path = os.path.join(SESSION_LOCK_DIR, f"{validate_session_id(session_id)}.lock")
+        self._lock = asyncio.Lock()
+        self._fd = None
+
+    async def __aenter__(self):
+        await self._lock.acquire()
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            delay = 0.005
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, _FILE_LOCK_MAX_POLL)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            self._fd = fd
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        fd, self._fd = self._fd, None
+        # Fermer le descripteur libère le flock
+        os.close(fd)
+        self._lock.release()
+
+
+def get_session_lock(session_id: str) -> asyncio.Lock:
+    """
+    Returns the single-writer lock of a session: runs of the same session are
+    serialized while different sessions run in parallel. With SESSION_LOCK_DIR
+    set (multi-worker mode), runs are serialized across worker processes too.
+    Args:
+        session_id (str): The session id.
+    Returns:
+        asyncio.Lock: The session lock.
+    """
+    lock = _SESSION_LOCKS.get(session_id)
+    if lock is None:
+        if SESSION_LOCK_DIR:
+            os.makedirs(SESSION_LOCK_DIR, exist_ok=True)
+            lock = _ProcessSessionLock(session_id)
+        else:
+            lock = asyncio.Lock()
+        _SESSION_LOCKS[session_id] = lock
+    return lock
@@ -0,0 +1,22 @@
+def percentiles(values: list) -> dict:
+    """
+    Nearest-rank p50/p95/p99, mean and max of a list of milliseconds.
+    Args:
+        values (list): Measured values.
+    Returns:
+        dict: p50, p95, p99, mean and max (all None for an empty list).
+    """
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 1)
+
+    return {
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "mean": round(sum(ordered) / len(ordered), 1),
+        "max": round(ordered[-1], 1),
+    }
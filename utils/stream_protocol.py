@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import orjson
+from utils.session import get_session_page_store
+from utils.plan_splitter import PlanHtmlSplitter
+
+# Version du protocole d'événements de /chat-message (incrémentée à chaque changement incompatible)
+PROTOCOL_VERSION = 1
+# Regroupement des petits tokens : fenêtre max (ms, 0 = désactivé) et taille max d'un lot
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", "0"))
+STREAM_COALESCE_MAX_CHARS = int(os.getenv("STREAM_COALESCE_MAX_CHARS", "256"))
+
+# Nœuds produisant un artefact : seule une référence est envoyée, jamais le contenu
+ARTIFACT_NODES = {"write_html_code", "plan_and_write_html"}
+# Nœuds fusionnés (plan puis HTML dans une seule sortie) : chaque token indique sa partie
+SPLIT_NODES = {"plan_and_write_html"}
+
+_END = object()
+
+
+def sse_frame(event: str, data: dict, event_id: int = None) -> bytes:
+    """
+    Serializes one server-sent event frame.
+    Args:
+        event (str): Event type.
+        data (dict): JSON payload.
+        event_id (int): Optional event sequence number.
+    Returns:
+        bytes: The SSE frame.
+    """
+    frame = b"event: " + event.encode("ascii") + b"\n"
+    if event_id is not None:
+        frame += b"id: " + str(event_id).encode("ascii") + b"\n"
+    return frame + b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+class TokenCoalescer:
+    """
+    Buffers small token deltas of a node into batches bounded in time
+    (max_delay_ms after the first buffered token) and size (max_chars).
+    With max_delay_ms = 0 every token is emitted as is.
+    """
+    def __init__(self, max_delay_ms: float = STREAM_COALESCE_MS, max_chars: int = STREAM_COALESCE_MAX_CHARS):
+        self.max_delay = max_delay_ms / 1000
+        self.max_chars = max_chars
+        self._node = None
+        self._parts = []
+        self._size = 0
+        self._first_at = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_delay > 0
+
+    def time_left(self):
+        """
+        Seconds before the pending batch must be flushed, None when nothing is buffered.
+        """
+        if self._first_at is None:
+            return None
+        return max(0.0, self._first_at + self.max_delay - time.monotonic())
+
+    def add(self, node: str, text: str) -> list:
+        """
+        Adds a token delta.
+        Args:
+            node (str): Node that produced the token.
+            text (str): Token text.
+        Returns:
+            list: (node, text) batches ready to be sent.
+        """
+        if not self.enabled:
+            return [(node, text)]
+        ready = self.flush() if node != self._node else []
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        self._node = node
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or self.time_left() == 0:
+            ready += self.flush()
+        return ready
+
+    def flush(self) -> list:
+        """
+        Returns the pending batch (if any) and empties the buffer.
+        Returns:
+            list: Zero or one (node, text) batch.
+        """
+        if not self._parts:
+            return []
+        batch = [(self._node, "".join(self._parts))]
+        self._parts = []
+        self._size = 0
+        self._first_at = None
+        return batch
+
+
+class ChatEventEncoder:
+    """
+    Translates LangGraph stream chunks (modes 'messages', 'updates' and
+    'custom') into the versioned /chat-message event protocol:
+
+    - start       {v, request_id, session_id, graph}
+    - node_start  {node, t_ms}
+    - token       {node, text, part?}     (only the new text; part = plan/html for fused nodes, patch for patch operations)
+    - node_end    {node, t_ms, duration_ms}
+    - route       {node, next}
+    - artifact    {node, kind, url, version, etag, bytes}
+    - error       {message, code?, retry_after?}
+    - done        {t_ms, tokens, events}
+    """
+    def __init__(self, request_id: str, session_id: str, graph: str, coalescer: TokenCoalescer = None, preview=None):
+        """
+        Args:
+            request_id (str): Request identifier.
+            session_id (str): Session id (used for the artifact reference).
+            graph (str): Workflow variant name.
+            coalescer (TokenCoalescer): Token batching policy, defaults to the env settings.
+            preview (PreviewChannel): Optional live preview channel fed with the artifact node's tokens.
+        """
+        self.request_id = request_id
+        self.session_id = session_id
+        self.graph = graph
+        self.coalescer = coalescer or TokenCoalescer()
+        self.preview = preview
+        self.started_at = time.perf_counter()
+        self.token_count = 0
+        self.first_token_at = None
+        self._seq = 0
+        self._ended_nodes = set()
+        self._splitters = {}
+
+    def _elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started_at) * 1000, 1)
+
+    def _frame(self, event: str, data: dict) -> bytes:
+        self._seq += 1
+        return sse_frame(event, data, self._seq)
+
+    @property
+    def ttft_seconds(self):
+        """
+        Seconds between the start and the first token frame, None if no token was sent.
+        """
+        return None if self.first_token_at is None else self.first_token_at - self.started_at
+
+    def _tokens(self, batches: list) -> list:
+        if batches and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        frames = []
+        for key, text in batches:
+            if isinstance(key, tuple):
+                node, part = key
+                frames.append(self._frame("token", {"node": node, "part": part, "text": text}))
+            else:
+                frames.append(self._frame("token", {"node": key, "text": text}))
+        return frames
+
+    def _split_tokens(self, node: str, pieces: list) -> list:
+        # Lots regroupés par (nœud, partie) : un lot ne chevauche jamais plan et HTML
+        batches = []
+        for part, piece in pieces:
+            if self.preview is not None and part == "html":
+                self.preview.feed(piece)
+            batches += self.coalescer.add((node, part), piece)
+        return batches
+
+    def start(self) -> bytes:
+        return self._frame("start", {
+            "v": PROTOCOL_VERSION,
+            "request_id": self.request_id,
+            "session_id": self.session_id,
+            "graph": self.graph,
+        })
+
+    def error(self, message: str, code: str = None, retry_after: float = None) -> bytes:
+        data = {"message": message, "request_id": self.request_id}
+        if code is not None:
+            data["code"] = code
+        if retry_after is not None:
+            data["retry_after"] = retry_after
+        return self._frame("error", data)
+
+    def done(self) -> list:
+        if self.preview is not None:
+            self.preview.finish(None)  # No-op unless the generation did not complete
+        frames = self._tokens(self.coalescer.flush())
+        frames.append(self._frame("done", {
+            "t_ms": self._elapsed_ms(),
+            "tokens": self.token_count,
+            "events": self._seq + 1,
+        }))
+        return frames
+
+    def flush(self) -> list:
+        """
+        Frames for the pending token batch (called when its time window expires).
+        """
+        return self._tokens(self.coalescer.flush())
+
+    def feed(self, mode: str, payload) -> list:
+        """
+        Encodes one LangGraph stream chunk.
+        Args:
+            mode (str): Stream mode of the chunk.
+            payload: Chunk payload.
+        Returns:
+            list: SSE frames to send (possibly empty).
+        """
+        if mode == "messages":
+            message, metadata = payload
+            node = metadata.get("langgraph_node")
+            text = message.content if isinstance(message.content, str) else ""
+            # Messages returned in a node's state update repeat text already streamed
+            if not text or node in self._ended_nodes:
+                return []
+            self.token_count += 1
+            part = metadata.get("stream_part")
+            if part is not None:
+                # Sortie intermédiaire étiquetée par l'agent (opérations de patch) : jamais dans l'aperçu
+                return self._tokens(self.coalescer.add((node, part), text))
+            if node in SPLIT_NODES:
+                splitter = self._splitters.setdefault(node, PlanHtmlSplitter())
+                return self._tokens(self._split_tokens(node, splitter.feed(text)))
+            if self.preview is not None and node in ARTIFACT_NODES:
+                self.preview.feed(text)
+            return self._tokens(self.coalescer.add(node, text))
+        if mode == "custom" and isinstance(payload, dict) and payload.get("event") in ("node_start", "node_end"):
+            frames = self._tokens(self.coalescer.flush())
+            data = {"node": payload["node"], "t_ms": self._elapsed_ms()}
+            if payload["event"] == "node_end":
+                if payload["node"] in self._splitters:
+                    # Texte retenu en fin de sortie (marqueur incomplet)
+                    pieces = self._splitters.pop(payload["node"]).close()
+                    frames += self._tokens(self._split_tokens(payload["node"], pieces) + self.coalescer.flush())
+                data["duration_ms"] = payload["duration_ms"]
+                self._ended_nodes.add(payload["node"])
+            else:
+                self._ended_nodes.discard(payload["node"])
+                if self.preview is not None and payload["node"] in ARTIFACT_NODES:
+                    self.preview.begin()
+            frames.append(self._frame(payload["event"], data))
+            return frames
+        if mode == "custom" and isinstance(payload, dict) and payload.get("event") == "generation_restart":
+            # Patch rejeté : la page complète est générée dans le même nœud, l'aperçu repart de zéro
+            if self.preview is not None and payload["node"] in ARTIFACT_NODES:
+                self.preview.begin()
+            return []
+        if mode == "updates":
+            frames = []
+            for node, update in (payload or {}).items():
+                if node in ARTIFACT_NODES and update and update.get("final_html_content") is not None:
+                    current = get_session_page_store(self.session_id).current
+                    artifact = {
+                        "kind": "page",
+                        "url": f"/page?session_id={self.session_id}",
+                        "version": current.version,
+                        "etag": current.etag,
+                        "bytes": len(current.body),
+                    }
+                    if self.preview is not None:
+                        self.preview.finish(artifact)
+                    frames.append(self._frame("artifact", {"node": node, **artifact}))
+                elif update and update.get("next"):
+                    frames.append(self._frame("route", {"node": node, "next": update["next"]}))
+            return frames
+        return []
+
+    async def aencode(self, stream):
+        """
+        Encodes a LangGraph async stream into SSE frames. When coalescing is
+        enabled the stream is consumed by a pump task so that a pending batch
+        is flushed as soon as its time window expires, even if the model stalls.
+        Args:
+            stream: Async iterator of (mode, payload) chunks.
+        Yields:
+            bytes: SSE frames.
+        """
+        if not self.coalescer.enabled:
+            async for mode, payload in stream:
+                for frame in self.feed(mode, payload):
+                    yield frame
+            return
+        queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for chunk in stream:
+                    await queue.put(chunk)
+                await queue.put(_END)
+            except Exception as e:
+                await queue.put(e)
+
+        pump_task = asyncio.create_task(pump())
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=self.coalescer.time_left())
+                except asyncio.TimeoutError:
+                    for frame in self.flush():
+                        yield frame
+                    continue
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                for frame in self.feed(*item):
+                    yield frame
+        finally:
+            pump_task.cancel()
@@ -0,0 +1,58 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from utils.patch_engine import PatchError, parse_patch, apply_patch
+
+PAGE = "<html>\n<body>\n<h1>Hello</h1>\n<p>Text</p>\n</body>\n</html>\n"
+
+
+def test_parse_skips_fences():
+    ops = parse_patch("```diff\n@@ REPLACE 3\n<h1>Hi</h1>\n@@ END\n```")
+    assert [(op.kind, op.start, op.end, op.lines) for op in ops] == [("REPLACE", 3, 3, ["<h1>Hi</h1>"])]
+
+
+def test_parse_strips_copied_line_numbers():
+    ops = parse_patch("@@ REPLACE 3-4\n00003: <h1>Hi</h1>\n00004: <p>New</p>")
+    assert ops[0].lines == ["<h1>Hi</h1>", "<p>New</p>"]
+
+
+def test_parse_rejects_malformed_header_and_stray_content():
+    with pytest.raises(PatchError):
+        parse_patch("@@ MOVE 3")
+    with pytest.raises(PatchError):
+        parse_patch("<p>no header</p>\n@@ REPLACE 3\n<h1>Hi</h1>")
+    with pytest.raises(PatchError):
+        parse_patch("@@ REPLACE\n<h1>Hi</h1>")
+    with pytest.raises(PatchError):
+        parse_patch("```\n```")
+
+
+def test_apply_replace_and_delete():
+    patched = apply_patch(PAGE, parse_patch("@@ REPLACE 3\n<h1>Hi</h1>\n@@ DELETE 4"))
+    assert patched == "<html>\n<body>\n<h1>Hi</h1>\n</body>\n</html>\n"
+
+
+def test_apply_insert_at_top_and_end_of_file():
+    patched = apply_patch(PAGE, parse_patch("@@ INSERT 0\n<!DOCTYPE html>\n@@ INSERT 6\n<!-- end -->"))
+    assert patched.splitlines()[0] == "<!DOCTYPE html>"
+    assert patched.splitlines()[-1] == "<!-- end -->"
+    assert patched.endswith("\n")
+
+
+def test_apply_insert_next_to_replaced_line():
+    patched = apply_patch(PAGE, parse_patch("@@ REPLACE 3\n<h1>Hi</h1>\n@@ INSERT 3\n<h2>Sub</h2>"))
+    assert patched.splitlines()[2:4] == ["<h1>Hi</h1>", "<h2>Sub</h2>"]
+
+
+def test_apply_rejects_overlaps_and_out_of_bounds():
+    with pytest.raises(PatchError):
+        apply_patch(PAGE, parse_patch("@@ REPLACE 2-4\n<body>\n@@ DELETE 4-5"))
+    with pytest.raises(PatchError):
+        apply_patch(PAGE, parse_patch("@@ REPLACE 2-4\n<body>\n@@ INSERT 3\n<p>inside</p>"))
+    with pytest.raises(PatchError):
+        apply_patch(PAGE, parse_patch("@@ INSERT 7\n<p>after EOF</p>"))
+    with pytest.raises(PatchError):
+        apply_patch(PAGE, parse_patch("@@ REPLACE 6-7\n</html>"))
+    with pytest.raises(PatchError):
+        apply_patch(PAGE, parse_patch("@@ DELETE 3\n<h1>Hello</h1>"))
@@ -0,0 +1,46 @@
+import os
+import sys
+from functools import lru_cache
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tiktoken
+
+
+# Approximation utilisée quand l'encodage tiktoken n'est pas disponible (ex: hors-ligne)
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model_name: str):
+    """
+    Returns the tiktoken encoding for a model (cl100k_base for unknown models),
+    or None when the encoding files cannot be loaded.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model_name: str = "gpt-3.5-turbo") -> int:
+    """
+    Counts the tokens of a text with the model's tokenizer
+    (approximated from its length when the tokenizer is unavailable).
+    Args:
+        text (str): The text to measure.
+        model_name (str): Model whose tokenizer is used.
+    Returns:
+        int: Number of tokens.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+if __name__ == "__main__":
+    print("==> [INFO]:", count_tokens("<html><body><h1>Hello, world!</h1></body></html>"))
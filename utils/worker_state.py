@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Registre partagé des workers (un processus par ligne), lu par /stats de chaque worker
+WORKER_STATE_PATH = os.getenv(
+    "WORKER_STATE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "workers.sqlite")
+)
+# Un worker dont le dernier battement est plus ancien est considéré comme arrêté
+WORKER_STALE_SECONDS = 10.0
+
+# Durée de chaque phase de démarrage (ms), dans l'ordre ; héritée par les workers forkés
+_PHASES = {}
+_STARTED_AT = time.time()
+_LOCK = threading.Lock()
+_CONN = {}
+
+
+@contextmanager
+def startup_phase(name: str):
+    """
+    Times one startup phase (imports, prompt loading, graph compilation...).
+    Args:
+        name (str): Phase name; a phase timed twice accumulates.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        with _LOCK:
+            _PHASES[name] = _PHASES.get(name, 0.0) + elapsed
+
+
+def record_startup_phase(name: str, elapsed_ms: float) -> None:
+    """
+    Records a phase timed outside of startup_phase (e.g. module imports).
+    Args:
+        name (str): Phase name.
+        elapsed_ms (float): Duration in milliseconds.
+    """
+    with _LOCK:
+        _PHASES[name] = _PHASES.get(name, 0.0) + elapsed_ms
+
+
+def get_startup_stats() -> dict:
+    """
+    Returns the startup phase durations of this process (ms), including the
+    phases run by the launcher before the worker was forked.
+    """
+    with _LOCK:
+        phases = {name: round(ms, 1) for name, ms in _PHASES.items()}
+    return {"phases_ms": phases, "total_ms": round(sum(phases.values()), 1)}
+
+
+def _connection() -> sqlite3.Connection:
+    conn = _CONN.get("conn")
+    if conn is None:
+        os.makedirs(os.path.dirname(WORKER_STATE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(WORKER_STATE_PATH, check_same_thread=False, isolation_level=None, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            "pid INTEGER PRIMARY KEY, worker_index INTEGER NOT NULL, started_at REAL NOT NULL, "
+            "ready_ms REAL NOT NULL, heartbeat_at REAL NOT NULL, requests INTEGER NOT NULL DEFAULT 0, "
+            "in_flight INTEGER NOT NULL DEFAULT 0, cpu_seconds REAL NOT NULL DEFAULT 0, rss_kb INTEGER NOT NULL DEFAULT 0)"
+        )
+        _CONN["conn"] = conn
+    return conn
+
+
+def _close_before_fork() -> None:
+    # Une connexion SQLite ne doit pas traverser un fork : le lanceur la referme, chacun rouvre la sienne
+    conn = _CONN.pop("conn", None)
+    if conn is not None:
+        conn.close()
+
+
+def _reset_after_fork() -> None:
+    global _STARTED_AT
+    _STARTED_AT = time.time()
+
+
+os.register_at_fork(before=_close_before_fork, after_in_child=_reset_after_fork)
+
+
+def _rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def register_worker(worker_index: int) -> None:
+    """
+    Registers the calling process in the shared worker registry.
+    Args:
+        worker_index (int): Worker slot (0..N-1) assigned by the launcher.
+    """
+    now = time.time()
+    with _LOCK:
+        _connection().execute(
+            "INSERT OR REPLACE INTO workers (pid, worker_index, started_at, ready_ms, heartbeat_at, rss_kb) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (os.getpid(), worker_index, _STARTED_AT, (now - _STARTED_AT) * 1000, now, _rss_kb())
+        )
+
+
+def heartbeat(requests: int, in_flight: int) -> None:
+    """
+    Publishes the load of the calling worker.
+    Args:
+        requests (int): Requests served since the worker started.
+        in_flight (int): Chat runs currently in flight.
+    """
+    times = os.times()
+    with _LOCK:
+        _connection().execute(
+            "UPDATE workers SET heartbeat_at = ?, requests = ?, in_flight = ?, cpu_seconds = ?, rss_kb = ? WHERE pid = ?",
+            (time.time(), requests, in_flight, times.user + times.system, _rss_kb(), os.getpid())
+        )
+
+
+def unregister_worker(pid: int = None) -> None:
+    """
+    Removes a worker from the registry (on shutdown, or by the launcher when a worker died).
+    Args:
+        pid (int): Worker pid, defaults to the calling process.
+    """
+    with _LOCK:
+        _connection().execute("DELETE FROM workers WHERE pid = ?", (pid or os.getpid(),))
+
+
+def clear_workers() -> None:
+    """
+    Empties the registry (launcher start: rows left by a previous run are stale).
+    """
+    with _LOCK:
+        _connection().execute("DELETE FROM workers")
+
+
+def get_worker_stats() -> dict:
+    """
+    Returns the load of every live worker (heartbeat within WORKER_STALE_SECONDS).
+    Returns:
+        dict: Calling pid and one entry per worker ordered by worker index.
+    """
+    now = time.time()
+    with _LOCK:
+        rows = _connection().execute(
+            "SELECT pid, worker_index, started_at, ready_ms, heartbeat_at, requests, in_flight, cpu_seconds, rss_kb "
+            "FROM workers WHERE heartbeat_at >= ? ORDER BY worker_index",
+            (now - WORKER_STALE_SECONDS,)
+        ).fetchall()
+    return {
+        "pid": os.getpid(),
+        "workers": [
+            {
+                "pid": pid,
+                "index": index,
+                "uptime_s": round(now - started_at, 1),
+                "ready_ms": round(ready_ms, 1),
+                "heartbeat_age_s": round(now - heartbeat_at, 1),
+                "requests": requests,
+                "in_flight": in_flight,
+                "cpu_seconds": round(cpu_seconds, 2),
+                "rss_kb": rss_kb,
+            }
+            for pid, index, started_at, ready_ms, heartbeat_at, requests, in_flight, cpu_seconds, rss_kb in rows
+        ],
+    }